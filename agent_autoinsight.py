@@ -6,24 +6,28 @@ Usa funções de eda_agent para estatísticas e plots.
 """
 
 import json
-import uuid
-import time
 
+from corr_engine import CorrelationStats, dataset_stats
 from eda_agent import (
     quick_summary,
+    load_dataset_summary,
     detect_outliers_iqr,
+    load_column_sketch,
     histogram_plot,
-    correlation_heatmap,
-    DB_CONN,
+    save_insights,
 )
+from llm_cache import LLM_CACHE
 
 try:
-    from call_gemini import call_gemini
+    from call_gemini import generate_text, shorten_answer
 except Exception:
 
-    def call_gemini(prompt: str) -> str:
+    def generate_text(prompt: str) -> str:
         return f"[Stub LLM] (autoinsight) {prompt[:300]}..."
 
+    def shorten_answer(text: str) -> str:
+        return text
+
 
 def generate_insights(dataset_id: str, df):
     """
@@ -31,7 +35,8 @@ def generate_insights(dataset_id: str, df):
     Salva insights no DB (tabela insights).
     Retorna {"insights": [...], "plots": {...}}
     """
-    summary = quick_summary(df)
+    # resumo pré-calculado no upload, se existir
+    summary = load_dataset_summary(dataset_id) or quick_summary(df)
     numeric_cols = [c for c in df.columns if df[c].dtype.kind in "if"]
     insights = []
     plots = {}
@@ -54,7 +59,10 @@ def generate_insights(dataset_id: str, df):
     # 2) Outliers info (IQR)
     for col in numeric_cols[:3]:
         try:
-            oi = detect_outliers_iqr(df[col].dropna())
+            # quartis do sketch gravado no upload, quando existir
+            sketch = load_column_sketch(dataset_id, col)
+            quartiles = sketch.quantile([0.25, 0.75]) if sketch else None
+            oi = detect_outliers_iqr(df[col].dropna(), quartiles=quartiles)
             if oi["count"] > 0:
                 insights.append(
                     f"A coluna '{col}' possui {oi['count']} outliers (limites {oi['lower']:.2f} / {oi['upper']:.2f})."
@@ -65,23 +73,14 @@ def generate_insights(dataset_id: str, df):
     # 3) Correlação: top pair
     if len(numeric_cols) >= 2:
         try:
-            _, corr_dict = correlation_heatmap(df, numeric_cols[:6])
-            # find max abs corr pair
-            import numpy as np
-            import pandas as pd
-
-            corr_df = pd.DataFrame(corr_dict)
-            abs_corr = corr_df.abs()
-            # zero diagonal and lower triangle
-            arr = abs_corr.values.copy()
-            arr[np.tril_indices_from(arr)] = 0
-            idx = arr.argmax()
-            i, j = divmod(idx, arr.shape[0])
-            maxval = arr[i, j]
-            if maxval > 0:
-                colnames = list(corr_df.columns)
+            # par mais forte entre todas as colunas numéricas, do cache de correlação
+            stats = dataset_stats(dataset_id, df=df)
+            if stats is None:
+                stats = CorrelationStats.from_frame(df, numeric_cols)
+            top = stats.top_pairs(1)
+            if top and top[0]["r"] != 0:
                 insights.append(
-                    f"As colunas '{colnames[i]}' e '{colnames[j]}' têm correlação absoluta alta (r={maxval:.2f})."
+                    f"As colunas '{top[0]['a']}' e '{top[0]['b']}' têm correlação absoluta alta (r={abs(top[0]['r']):.2f})."
                 )
         except Exception:
             pass
@@ -107,28 +106,17 @@ Contexto disponível:
 Gere a resposta em formato de texto estruturado com marcadores.
 """
 
-        llm_text = call_gemini(prompt)
+        llm_text, _ = LLM_CACHE.call(prompt, generate_text, dataset_id)
+        llm_text = shorten_answer(llm_text)
         insights.insert(0, f"Narrativa LLM: {llm_text}")
     except Exception as e:
         insights.insert(
             0, f"[LLM-fallback] não foi possível gerar narrativa: {str(e)[:200]}"
         )
 
-    # 5) Persistir insights no DB
+    # 5) Persistir insights no DB (um único executemany)
     try:
-        cur = DB_CONN.cursor()
-        for text in insights:
-            cur.execute(
-                "INSERT INTO insights VALUES (?,?,?,?,?)",
-                (
-                    str(uuid.uuid4()),
-                    dataset_id,
-                    time.strftime("%Y-%m-%d %H:%M:%S"),
-                    text,
-                    0,
-                ),
-            )
-        DB_CONN.commit()
+        save_insights(dataset_id, insights)
     except Exception:
         # non-fatal; continue
         pass
@@ -2,24 +2,255 @@
 agent_memory.py
 
 Utilities to load/save conversational memory for a given dataset.
-Uses DB_CONN from eda_agent (SQLite).
+Uses the shared Database from eda_agent (SQLite, see persistence.py).
+
+search_memory() ranks the past questions of a dataset (table queries, from
+save_memory and save_query) by TF-IDF cosine similarity to a new question.
+Each dataset keeps an in-memory index of hashed word unigrams and bigrams
+(scikit-learn HashingVectorizer, so adding a question never refits a
+vocabulary); rows inserted since the last search are appended before ranking,
+including rows written by other processes.
 """
+import os
+import re
+import threading
 import time
 import uuid
+from collections import OrderedDict
 from typing import List, Tuple
-from eda_agent import DB_CONN
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+from dataset_store import dataset_dtypes
+from eda_agent import DB, QUERY_SUMMARY_CHARS
+from llm_cache import ERROR_PREFIXES
+from query_engine import normalize, tokenize
+
+# How many dataset indexes to keep in memory
+MEMORY_CACHE_SIZE = int(os.environ.get("EDA_MEMORY_CACHE_SIZE", "32"))
+# Similarity from which a new question reuses a past answer (find_duplicate)
+DEDUP_THRESHOLD = float(os.environ.get("EDA_DEDUP_THRESHOLD", "0.9"))
+# EDA_DEDUP=0 turns the duplicate-question short-circuit off
+DEDUP_ENABLED = os.environ.get("EDA_DEDUP", "1") != "0"
+
+# sources whose answers can be reused (local answers are cheap to recompute)
+DEDUP_SOURCES = ("llm", "memory")
+# candidates checked for an exact match
+DEDUP_CANDIDATES = 5
+
+# hashed feature space: plenty for short questions, small idf vectors
+MEMORY_FEATURES = 2 ** 16
+
+# articles and prepositions, dropped before the bigrams ("media do valor" ~ "media de valor")
+MEMORY_STOPWORDS = [
+    "a", "o", "e", "de", "da", "do", "das", "dos", "em", "no", "na", "nos", "nas",
+    "os", "as", "um", "uma", "the", "of", "in", "on", "to", "for", "an",
+]
+
+VECTORIZER = HashingVectorizer(
+    n_features=MEMORY_FEATURES,
+    preprocessor=normalize,
+    # single characters count: "top 5" and "top 3", "mes 1" and "mes 9" differ
+    token_pattern=r"(?u)\b\w+\b",
+    stop_words=MEMORY_STOPWORDS,
+    ngram_range=(1, 2),
+    alternate_sign=False,
+    norm=None,
+)
+
+
+def question_key(question: str) -> str:
+    """
+    Canonical form of a question for exact matches: no accents, case or punctuation.
+    """
+    return " ".join(re.findall(r"\w+", normalize(question)))
+
+
+def question_numbers(question: str) -> List[str]:
+    """
+    Numbers cited in a question, sorted ("1,5" and "1.5" are the same number).
+    """
+    return sorted(n.replace(",", ".") for n in re.findall(r"\d+(?:[.,]\d+)?", question))
+
+
+def question_columns(question: str, columns: List[str]) -> set:
+    """
+    Dataset columns cited in a question (exact or approximate names, as in query_engine).
+    """
+    return {value for kind, value in tokenize(question, columns) if kind == "col"}
+
 
 def save_memory(dataset_id: str, question: str, answer: str):
-    cur = DB_CONN.cursor()
     qid = str(uuid.uuid4())
-    cur.execute("INSERT INTO queries VALUES (?,?,?,?,?,?,?)", (
-        qid, dataset_id, question, (answer[:2000] if answer else ""), (answer[:2000] if answer else ""), time.strftime("%Y-%m-%d %H:%M:%S"), "memory"
+    now = time.time()
+    DB.write("INSERT INTO queries (query_id, dataset_id, question, response_summary, raw_response, created_at, source, created_ts, full_response) VALUES (?,?,?,?,?,?,?,?,?)", (
+        qid, dataset_id, question, (answer[:QUERY_SUMMARY_CHARS] if answer else ""), (answer[:QUERY_SUMMARY_CHARS] if answer else ""), time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)), "memory", now, answer or ""
     ))
-    DB_CONN.commit()
     return qid
 
 def load_memory(dataset_id: str, limit: int = 5):
-    cur = DB_CONN.cursor()
-    rows = cur.execute("SELECT question, response_summary FROM queries WHERE dataset_id=? ORDER BY created_at DESC LIMIT ?", (dataset_id, limit)).fetchall()
+    rows = DB.query("SELECT question, response_summary FROM queries WHERE dataset_id=? ORDER BY created_ts DESC LIMIT ?", (dataset_id, limit))
     rows = rows[::-1]
     return [(r[0], r[1]) for r in rows]
+
+
+class MemoryIndex:
+    """
+    TF-IDF index of the questions asked about one dataset.
+    Term counts are appended in blocks; idf weights and row norms are
+    recomputed lazily on the next search after an append.
+    """
+
+    def __init__(self, dataset_id: str):
+        self.dataset_id = dataset_id
+        self.lock = threading.Lock()
+        self.entries = []
+        self.last_rowid = 0
+        self._blocks = []
+        self._weighted = None
+        self._tfidf = None
+
+    def _append(self, rows):
+        rows = [r for r in rows if r[2] and r[3] and not r[3].startswith(ERROR_PREFIXES)]
+        if not rows:
+            return 0
+        # one transform for the whole batch; questions without any token are dropped
+        counts = VECTORIZER.transform([r[2] for r in rows])
+        keep = np.flatnonzero(np.diff(counts.indptr))
+        if not len(keep):
+            return 0
+        self._blocks.append(counts[keep])
+        for i in keep:
+            _, qid, question, answer, source, created_at, created_ts, truncated = rows[i]
+            self.entries.append(
+                {
+                    "query_id": qid,
+                    "question": question,
+                    "answer": answer,
+                    "source": source,
+                    "created_at": created_at,
+                    "created_ts": created_ts,
+                    "truncated": bool(truncated),
+                }
+            )
+        self._weighted = None
+        return len(keep)
+
+    def sync(self):
+        """
+        Append the rows inserted since the last sync (rowid only grows,
+        unlike timestamps written by other processes). Rows written before
+        full_response existed only have the summary, cut at QUERY_SUMMARY_CHARS;
+        a summary of that length is flagged as truncated.
+        """
+        rows = DB.query(
+            "SELECT rowid, query_id, question, COALESCE(full_response, response_summary), "
+            "source, created_at, created_ts, "
+            "full_response IS NULL AND length(response_summary) >= ? "
+            "FROM queries WHERE dataset_id=? AND rowid > ? ORDER BY rowid",
+            (QUERY_SUMMARY_CHARS, self.dataset_id, self.last_rowid),
+        )
+        if rows:
+            self.last_rowid = rows[-1][0]
+        return self._append(rows)
+
+    def _matrix(self):
+        if self._weighted is None:
+            if len(self._blocks) > 1:
+                self._blocks = [sp.vstack(self._blocks, format="csr")]
+            counts = self._blocks[0]
+            self._tfidf = TfidfTransformer(sublinear_tf=True).fit(counts)
+            self._weighted = self._tfidf.transform(counts)
+        return self._weighted
+
+    def search(self, question: str, k: int = 5, min_score: float = 0.0):
+        """
+        Up to k past questions most similar to `question` (cosine in [0, 1]),
+        one per distinct question (the most recent answer), best first.
+        """
+        with self.lock:
+            self.sync()
+            if not self.entries:
+                return []
+            matrix = self._matrix()
+            query = self._tfidf.transform(VECTORIZER.transform([question]))
+            if not query.nnz:
+                return []
+            scores = (matrix @ query.T).toarray().ravel()
+            candidates = np.flatnonzero((scores > 0) & (scores >= min_score))
+            # best first; ties: the most recent
+            order = candidates[np.lexsort((-candidates, -scores[candidates]))]
+            results, seen = [], set()
+            for i in order:
+                entry = self.entries[i]
+                key = question_key(entry["question"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                results.append({**entry, "score": round(float(min(scores[i], 1.0)), 4)})
+                if len(results) >= k:
+                    break
+            return results
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def memory_index(dataset_id: str) -> MemoryIndex:
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(dataset_id)
+        if index is None:
+            index = _INDEXES[dataset_id] = MemoryIndex(dataset_id)
+        _INDEXES.move_to_end(dataset_id)
+        while len(_INDEXES) > MEMORY_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+        return index
+
+
+def search_memory(dataset_id: str, question: str, k: int = 5, min_score: float = 0.0) -> List[dict]:
+    """
+    Past Q&A of the dataset ranked by similarity to the question
+    (dicts with query_id, question, answer, source, created_at, score and
+    truncated, True for old rows that only kept the first QUERY_SUMMARY_CHARS).
+    """
+    return memory_index(dataset_id).search(question, k=k, min_score=min_score)
+
+
+def find_duplicate(dataset_id: str, question: str, threshold: float = DEDUP_THRESHOLD):
+    """
+    Past LLM/memory answer to the same question (same question_key, match
+    "exact") or to a near duplicate (similarity >= threshold, match "similar"),
+    as a search_memory() result plus "match"; None if there is none.
+    Answers stored truncated are never replayed, and a near duplicate must
+    cite the same numbers and columns ("top 5" is not "top 3").
+    """
+    if not DEDUP_ENABLED:
+        return None
+    key = question_key(question)
+    if not key:
+        return None
+    # an exact match scores ~1.0 even with threshold >= 1
+    results = search_memory(dataset_id, question, k=DEDUP_CANDIDATES, min_score=min(threshold, 0.99))
+    results = [r for r in results if r["source"] in DEDUP_SOURCES and not r["truncated"]]
+    for r in results:
+        if question_key(r["question"]) == key:
+            return {**r, "match": "exact"}
+    numbers = question_numbers(question)
+    dtypes = dataset_dtypes(dataset_id)
+    columns = list(dtypes.index) if dtypes is not None else []
+    cited = question_columns(question, columns)
+    for r in results:
+        if r["score"] < threshold:
+            break
+        if question_numbers(r["question"]) != numbers:
+            continue
+        if question_columns(r["question"], columns) != cited:
+            continue
+        return {**r, "match": "similar"}
+    return None
@@ -1,32 +1,106 @@
-from flask import Flask, request, jsonify, send_file
-import os, io, uuid, time
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+import os, uuid, time, threading
+from urllib.parse import urlencode
 import pandas as pd
 import json
-import re
 import numpy as np
-import base64
 import matplotlib.pyplot as plt
 from eda_agent import save_query, infer_schema
-from call_gemini import call_gemini
-from eda_agent import load_csv_bytes, quick_summary, save_dataset_metadata
+from call_gemini import generate_text, shorten_answer, stream_gemini
+from eda_agent import load_csv_file, quick_summary, save_dataset_metadata, spool_upload
+from eda_agent import load_dataset_metadata, load_dataset_summary, save_dataset_summary
+from eda_agent import PREVIEW_MIN_ROWS, load_insights, save_insights
+from eda_agent import mark_insights
+from eda_agent import build_column_sketches, load_column_sketch, save_column_sketches
+from dataset_store import (
+    DATA_DIR,
+    DF_CACHE,
+    dataset_dtypes,
+    dataset_exists,
+    export_csv,
+    load_dataset,
+    save_dataset,
+)
 
-from sklearn.cluster import KMeans
+from cluster_engine import (
+    CLUSTER_MAX_K,
+    CLUSTER_SWEEP_MAX_KS,
+    cluster_figure,
+    get_model,
+    plot_mode,
+    sweep,
+    sweep_figure,
+)
+from corr_engine import CORR_METHODS, dataset_stats
+from agent_memory import find_duplicate, search_memory
+from llm_cache import LLM_CACHE
+from llm_context import build_context
+from llm_gateway import GATEWAY
+from plot_cache import cached_plot, is_valid_key, plot_file, url_exists
+from plot_pool import histogram_figure, warm_up
+from query_engine import execute, format_result, is_numeric, parse_question
+from answer_index import (
+    build_index,
+    dataset_index,
+    index_answer,
+    index_categories,
+    save_index,
+)
+from jobs import JOBS
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 
 app = Flask(__name__)
-DATA_DIR = os.environ.get("EDA_DATA_DIR", "data")
-os.makedirs(DATA_DIR, exist_ok=True)
+
+# Acima de tantas colunas numéricas, o heatmap de /api/correlation mostra só as
+# colunas dos pares mais correlacionados
+CORR_HEATMAP_MAX_COLS = int(os.environ.get("EDA_CORR_HEATMAP_MAX_COLS", "30"))
+# Maior k aceito em /api/correlation/top
+CORR_TOP_MAX_K = 1000
+# Limites de /api/insights/batch
+INSIGHTS_MAX_DATASETS = 200
+INSIGHTS_MAX_LIMIT = 1000
+# Maior página de rótulos em /api/clusters/labels
+CLUSTER_LABELS_MAX_LIMIT = 100000
+# Maior k aceito em /api/memory
+MEMORY_MAX_K = 50
+
+
+def get_dataset_summary(dataset_id):
+    """
+    Retorna o resumo pré-calculado do dataset (gravado no upload).
+    Para datasets antigos, sem resumo salvo, calcula e persiste na primeira vez.
+    Retorna None se o dataset não existir.
+    """
+    summary = load_dataset_summary(dataset_id)
+    # os PNGs podem ter sido apagados do cache: nesse caso o resumo é refeito
+    if summary is not None and all(
+        url_exists(url) for url in summary.get("plots", {}).values()
+    ):
+        return summary
+    df = load_dataset(dataset_id)
+    if df is None:
+        return None
+    meta = load_dataset_metadata(dataset_id)
+    summary = quick_summary(
+        df, schema=meta["schema"] if meta else None, dataset_id=dataset_id
+    )
+    save_dataset_summary(dataset_id, summary)
+    return summary
 
 
 # Função utilitária para outliers (IQR)
-def detect_outliers_iqr(series):
+def detect_outliers_iqr(series, quartiles=None):
     """
     Detecta outliers em uma série numérica usando o método do IQR (Intervalo Interquartil).
+    `quartiles` (q1, q3) permite usar quartis já conhecidos (ex.: do sketch da coluna).
     Retorna um dicionário com contagem, limites e exemplos de outliers.
     """
-    q1 = series.quantile(0.25)
-    q3 = series.quantile(0.75)
+    if quartiles is None:
+        q1 = series.quantile(0.25)
+        q3 = series.quantile(0.75)
+    else:
+        q1, q3 = quartiles
     iqr = q3 - q1
     lower = q1 - 1.5 * iqr
     upper = q3 + 1.5 * iqr
@@ -41,18 +115,13 @@ def detect_outliers_iqr(series):
 
 def boxplot_plot(df, col):
     """
-    Gera um boxplot em base64 para a coluna informada do DataFrame.
+    Monta o boxplot da coluna informada do DataFrame.
     """
     fig, ax = plt.subplots()
     ax.boxplot(df[col].dropna(), vert=True)
     ax.set_title(f"Boxplot de {col}")
     ax.set_ylabel(col)
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-    return f"data:image/png;base64,{img_base64}"
+    return fig
 
 
 @app.route("/api/outliers", methods=["GET"])
@@ -60,28 +129,40 @@ def get_outliers():
     """
     Endpoint GET /api/outliers
     Retorna estatísticas de outliers e boxplot para uma coluna numérica do dataset.
+    Os quartis vêm do sketch gravado no upload; exact=1 recalcula sobre a coluna.
     """
     dataset_id = request.args.get("dataset_id")
     col = request.args.get("col")
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
+    dtypes = dataset_dtypes(dataset_id)
+    if dtypes is None:
         return jsonify({"error": "dataset não encontrado"}), 404
-    df = pd.read_csv(path)
-    if col not in df.columns:
+    if col not in dtypes.index:
         return jsonify({"error": "coluna não encontrada"}), 400
-    if not pd.api.types.is_numeric_dtype(df[col]):
+    if not pd.api.types.is_numeric_dtype(dtypes[col]):
         return jsonify({"error": "coluna não é numérica"}), 400
-    stats = detect_outliers_iqr(df[col].dropna())
-    box_b64 = boxplot_plot(df, col)
-    return jsonify({"stats": stats, "plot": box_b64})
+    exact = request.args.get("exact", "0").lower() in ("1", "true", "yes")
+    df = load_dataset(dataset_id, columns=[col])
+    series = df[col].dropna()
+    if exact:
+        stats = detect_outliers_iqr(series)
+    else:
+        sketch = load_column_sketch(dataset_id, col)
+        if sketch is None:
+            # dataset anterior aos sketches: constrói e grava na primeira consulta
+            sketch = build_column_sketches(df)[col]
+            save_column_sketches(dataset_id, {col: sketch})
+        stats = detect_outliers_iqr(series, quartiles=sketch.quantile([0.25, 0.75]))
+    stats["method"] = "exact" if exact else "sketch"
+    box_url = cached_plot(
+        dataset_id, "outliers_box", [col], None, lambda: boxplot_plot(df, col)
+    )
+    return jsonify({"stats": stats, "plot": box_url})
 
 
-def correlation_heatmap(df, cols):
+def correlation_heatmap(corr, cols):
     """
-    Gera um heatmap de correlação entre as colunas numéricas informadas.
-    Retorna a imagem em base64 e o dicionário de correlação.
+    Monta o heatmap de correlação entre as colunas numéricas informadas.
     """
-    corr = df[cols].corr()
     fig, ax = plt.subplots()
     im = ax.imshow(corr, cmap="coolwarm")
     ax.set_xticks(range(len(cols)))
@@ -90,12 +171,7 @@ def correlation_heatmap(df, cols):
     ax.set_yticklabels(cols)
     fig.colorbar(im)
     ax.set_title("Heatmap de Correlação")
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-    return f"data:image/png;base64,{img_base64}", corr.to_dict()
+    return fig
 
 
 @app.route("/api/correlation", methods=["GET"])
@@ -105,71 +181,230 @@ def get_correlation():
     Retorna matriz de correlação, heatmap e insight automático das colunas mais correlacionadas.
     """
     dataset_id = request.args.get("dataset_id")
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
+    # estatísticas suficientes em cache: a matriz sai sem reler o dataset
+    stats = dataset_stats(dataset_id)
+    if stats is None:
         return jsonify({"error": "dataset não encontrado"}), 404
-    df = pd.read_csv(path)
-    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    numeric_cols = stats.cols
     if len(numeric_cols) < 2:
         return jsonify({"error": "dados insuficientes"}), 400
-    plot_b64, corr_dict = correlation_heatmap(df, numeric_cols)
-    # Insight automático
-    corr_matrix = df[numeric_cols].corr().abs()
-    arr = corr_matrix.values
-    arr[np.tril_indices_from(arr)] = 0
-    max_idx = np.unravel_index(np.argmax(arr), arr.shape)
-    max_val = arr[max_idx]
-    insight = f"Colunas {numeric_cols[max_idx[0]]} e {numeric_cols[max_idx[1]]} têm a maior correlação (r={max_val:.2f})"
-    return jsonify({"corr": corr_dict, "plot": plot_b64, "insight": insight})
+    corr = stats.corr()
+    corr_dict = corr.to_dict()
+    top = stats.top_pairs(CORR_HEATMAP_MAX_COLS)
+    heatmap_cols = numeric_cols
+    if len(numeric_cols) > CORR_HEATMAP_MAX_COLS:
+        # tabela larga: o heatmap mostra só as colunas dos pares mais fortes
+        in_top = {c for p in top for c in (p["a"], p["b"])}
+        heatmap_cols = [c for c in numeric_cols if c in in_top][:CORR_HEATMAP_MAX_COLS]
+    plot_url = cached_plot(
+        dataset_id,
+        "corr_heatmap_full",
+        heatmap_cols,
+        None,
+        lambda: correlation_heatmap(stats.corr(heatmap_cols), heatmap_cols),
+    )
+    # Insight automático: par com a maior correlação absoluta
+    insight = ""
+    if top:
+        insight = f"Colunas {top[0]['a']} e {top[0]['b']} têm a maior correlação (r={abs(top[0]['r']):.2f})"
+    return jsonify(
+        {
+            "corr": corr_dict,
+            "plot": plot_url,
+            "heatmap_cols": heatmap_cols,
+            "insight": insight,
+        }
+    )
 
 
-@app.route("/api/clusters", methods=["GET"])
-def get_clusters():
+@app.route("/api/correlation/top", methods=["GET"])
+def get_correlation_top():
     """
-    Endpoint GET /api/clusters
-    Realiza clustering KMeans em duas colunas numéricas e retorna o gráfico e os clusters.
+    Endpoint GET /api/correlation/top
+    Retorna os k pares de colunas com maior correlação absoluta
+    (method=pearson ou spearman), sem montar nem serializar a matriz inteira.
     """
     dataset_id = request.args.get("dataset_id")
-    cols = request.args.get("cols")
-    k = int(request.args.get("k", 3))
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
+    method = request.args.get("method", "pearson").lower()
+    if method not in CORR_METHODS:
+        return jsonify({"error": "method deve ser pearson ou spearman"}), 400
+    try:
+        k = int(request.args.get("k", 10))
+    except ValueError:
+        return jsonify({"error": "k inválido"}), 400
+    if not 1 <= k <= CORR_TOP_MAX_K:
+        return jsonify({"error": f"k deve estar entre 1 e {CORR_TOP_MAX_K}"}), 400
+    stats = dataset_stats(dataset_id, method=method)
+    if stats is None:
         return jsonify({"error": "dataset não encontrado"}), 404
-    df = pd.read_csv(path)
+    if len(stats.cols) < 2:
+        return jsonify({"error": "dados insuficientes"}), 400
+    return jsonify(
+        {
+            "method": method,
+            "k": k,
+            "n_cols": len(stats.cols),
+            "pairs": stats.top_pairs(k),
+        }
+    )
+
+
+def parse_cluster_args():
+    """
+    Lê e valida dataset_id, cols (duas ou mais colunas numéricas) e k dos parâmetros.
+    Retorna (dataset_id, colunas, k, None) ou (None, None, None, resposta de erro).
+    """
+    dataset_id = request.args.get("dataset_id")
+    cols = request.args.get("cols")
+    try:
+        k = int(request.args.get("k", 3))
+    except ValueError:
+        return None, None, None, (jsonify({"error": "k inválido"}), 400)
+    dtypes = dataset_dtypes(dataset_id)
+    if dtypes is None:
+        return None, None, None, (jsonify({"error": "dataset não encontrado"}), 404)
     if not cols:
-        return jsonify({"error": "parâmetro 'cols' é obrigatório"}), 400
+        return None, None, None, (
+            jsonify({"error": "parâmetro 'cols' é obrigatório"}),
+            400,
+        )
     col_list = cols.split(",")
-    if len(col_list) != 2 or not all(c in df.columns for c in col_list):
-        return jsonify({"error": "colunas inválidas"}), 400
-    sub = df[col_list].dropna()
-    if sub.shape[0] < k:
-        return jsonify({"error": "dados insuficientes para clustering"}), 400
-    km = KMeans(n_clusters=k, n_init=10, random_state=42).fit(sub)
-    sub["cluster"] = km.labels_
-    fig, ax = plt.subplots()
-    colors = plt.cm.get_cmap("tab10", k)
-    for label in range(k):
-        cluster_data = sub[sub["cluster"] == label]
-        ax.scatter(
-            cluster_data[col_list[0]],
-            cluster_data[col_list[1]],
-            label=f"Cluster {label}",
-            color=colors(label),
+    if (
+        len(col_list) < 2
+        or len(set(col_list)) != len(col_list)
+        or not all(c in dtypes.index for c in col_list)
+        or not all(pd.api.types.is_numeric_dtype(dtypes[c]) for c in col_list)
+    ):
+        return None, None, None, (jsonify({"error": "colunas inválidas"}), 400)
+    if not 2 <= k <= CLUSTER_MAX_K:
+        return None, None, None, (
+            jsonify({"error": f"k deve estar entre 2 e {CLUSTER_MAX_K}"}),
+            400,
         )
-    ax.set_xlabel(col_list[0])
-    ax.set_ylabel(col_list[1])
-    ax.legend()
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    buf.seek(0)
-    b64 = base64.b64encode(buf.read()).decode()
-    plt.close(fig)
-    insight = f"Foram identificados {k} clusters distintos no espaço ({col_list[0]},{col_list[1]})."
+    return dataset_id, col_list, k, None
+
+
+@app.route("/api/clusters", methods=["GET"])
+def get_clusters():
+    """
+    Endpoint GET /api/clusters
+    Realiza clustering KMeans em duas ou mais colunas numéricas e retorna o gráfico,
+    o resumo dos clusters e o link para os rótulos (/api/clusters/labels).
+    Modelos ajustados ficam em cache; datasets grandes usam MiniBatchKMeans.
+    """
+    dataset_id, col_list, k, error = parse_cluster_args()
+    if error:
+        return error
+    try:
+        model = get_model(dataset_id, col_list, k)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    plot_url = cached_plot(
+        dataset_id,
+        "clusters",
+        col_list,
+        {"k": k, "mode": plot_mode(model)},
+        lambda: cluster_figure(dataset_id, model),
+    )
+    insight = f"Foram identificados {k} clusters distintos no espaço ({','.join(col_list)})."
+    params = urlencode({"dataset_id": dataset_id, "cols": ",".join(col_list), "k": k})
+    labels_url = f"/api/clusters/labels?{params}"
     return jsonify(
         {
-            "clusters": sub["cluster"].tolist(),
-            "plot": f"data:image/png;base64,{b64}",
+            **model.summary(),
+            "plot": plot_url,
             "insight": insight,
+            "labels_url": labels_url,
+        }
+    )
+
+
+@app.route("/api/clusters/sweep", methods=["GET"])
+def get_clusters_sweep():
+    """
+    Endpoint GET /api/clusters/sweep
+    Ajusta KMeans para k de k_min a k_max em paralelo, pontua cada um por inércia
+    e silhueta (numa amostra) e recomenda um k. Os modelos ficam em cache, então
+    /api/clusters com qualquer k da varredura responde sem reajustar.
+    """
+    dataset_id, col_list, _, error = parse_cluster_args()
+    if error:
+        return error
+    try:
+        k_min = int(request.args.get("k_min", 2))
+        k_max = int(request.args.get("k_max", 10))
+    except ValueError:
+        return jsonify({"error": "k_min/k_max inválidos"}), 400
+    if not 2 <= k_min <= k_max <= CLUSTER_MAX_K or k_max - k_min >= CLUSTER_SWEEP_MAX_KS:
+        return jsonify(
+            {
+                "error": f"use 2 <= k_min <= k_max <= {CLUSTER_MAX_K}, "
+                f"com no máximo {CLUSTER_SWEEP_MAX_KS} valores de k"
+            }
+        ), 400
+    try:
+        result = sweep(dataset_id, col_list, list(range(k_min, k_max + 1)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result["plot"] = cached_plot(
+        dataset_id,
+        "cluster_sweep",
+        col_list,
+        {"k_min": k_min, "k_max": k_max},
+        lambda: sweep_figure(result),
+    )
+    return jsonify(result)
+
+
+@app.route("/api/clusters/labels", methods=["GET"])
+def get_cluster_labels():
+    """
+    Endpoint GET /api/clusters/labels
+    Rótulos de cluster por linha do dataset (-1 = linha com valor faltante),
+    paginados com offset/limit, ou o arquivo inteiro com format=csv.
+    """
+    dataset_id, col_list, k, error = parse_cluster_args()
+    if error:
+        return error
+    try:
+        model = get_model(dataset_id, col_list, k)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    labels = model.labels
+
+    if request.args.get("format") == "csv":
+
+        def generate():
+            yield "row,cluster\n"
+            for start in range(0, labels.size, CLUSTER_LABELS_MAX_LIMIT):
+                block = labels[start : start + CLUSTER_LABELS_MAX_LIMIT]
+                rows = np.arange(start, start + block.size)
+                yield "".join(f"{r},{c}\n" for r, c in zip(rows.tolist(), block.tolist()))
+
+        return Response(
+            generate(),
+            mimetype="text/csv",
+            headers={
+                "Content-Disposition": f"attachment; filename={dataset_id}_clusters_k{k}.csv"
+            },
+        )
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", 1000))
+    except ValueError:
+        return jsonify({"error": "offset/limit inválidos"}), 400
+    if offset < 0 or not 1 <= limit <= CLUSTER_LABELS_MAX_LIMIT:
+        return jsonify(
+            {"error": f"offset >= 0 e limit entre 1 e {CLUSTER_LABELS_MAX_LIMIT}"}
+        ), 400
+    return jsonify(
+        {
+            "offset": offset,
+            "limit": limit,
+            "total": int(labels.size),
+            "labels": labels[offset : offset + limit].tolist(),
         }
     )
 
@@ -181,11 +416,9 @@ def get_report():
     Gera e retorna um relatório PDF consolidado do dataset, incluindo insights salvos.
     """
     dataset_id = request.args.get("dataset_id")
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
+    summary = get_dataset_summary(dataset_id)
+    if summary is None:
         return jsonify({"error": "dataset não encontrado"}), 404
-    df = pd.read_csv(path)
-    summary = quick_summary(df)
     pdf_path = os.path.join(DATA_DIR, f"{dataset_id}_report.pdf")
     doc = SimpleDocTemplate(pdf_path)
     styles = getSampleStyleSheet()
@@ -193,20 +426,18 @@ def get_report():
     flow.append(Paragraph(f"Relatório do Dataset {dataset_id}", styles["Title"]))
     flow.append(Spacer(1, 12))
     flow.append(
-        Paragraph(f"Linhas: {df.shape[0]}, Colunas: {df.shape[1]}", styles["Normal"])
+        Paragraph(
+            f"Linhas: {summary['n_rows']}, Colunas: {summary['n_cols']}",
+            styles["Normal"],
+        )
     )
     flow.append(Paragraph("Esquema:", styles["Heading2"]))
     flow.append(Paragraph(str(summary["schema"]), styles["Code"]))
     # incluir insights salvos
-    from eda_agent import DB_CONN
-
-    cur = DB_CONN.cursor()
-    rows = cur.execute(
-        "SELECT text, important FROM insights WHERE dataset_id=?", (dataset_id,)
-    ).fetchall()
+    items, _ = load_insights([dataset_id])
     flow.append(Paragraph("Insights:", styles["Heading2"]))
-    for r in rows:
-        txt = "⭐ " + r[0] if r[1] else r[0]
+    for ins in items:
+        txt = "⭐ " + ins["text"] if ins["important"] else ins["text"]
         flow.append(Paragraph(txt, styles["Normal"]))
     doc.build(flow)
     return send_file(pdf_path, as_attachment=True)
@@ -220,34 +451,72 @@ def get_insights():
     Retorna todos os insights salvos para o dataset informado.
     """
     dataset_id = request.args.get("dataset_id")
-    from eda_agent import DB_CONN
-
-    cur = DB_CONN.cursor()
-    rows = cur.execute(
-        "SELECT insight_id, text, important, created_at FROM insights WHERE dataset_id=?",
-        (dataset_id,),
-    ).fetchall()
+    items, _ = load_insights([dataset_id])
     insights = [
-        {"id": r[0], "text": r[1], "important": bool(r[2]), "created_at": r[3]}
-        for r in rows
+        {k: ins[k] for k in ("id", "text", "important", "created_at")} for ins in items
     ]
     return jsonify(insights)
 
 
+@app.route("/api/insights/batch", methods=["GET"])
+def get_insights_batch():
+    """
+    Endpoint GET /api/insights/batch
+    Insights de vários datasets de uma vez (dataset_ids separados por vírgula),
+    paginados com offset/limit; important=1/0 filtra pelos marcados.
+    """
+    dataset_ids = [d for d in request.args.get("dataset_ids", "").split(",") if d]
+    if not dataset_ids:
+        return jsonify({"error": "parâmetro 'dataset_ids' é obrigatório"}), 400
+    if len(dataset_ids) > INSIGHTS_MAX_DATASETS:
+        return jsonify(
+            {"error": f"no máximo {INSIGHTS_MAX_DATASETS} datasets por chamada"}
+        ), 400
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"error": "offset/limit inválidos"}), 400
+    if offset < 0 or not 1 <= limit <= INSIGHTS_MAX_LIMIT:
+        return jsonify(
+            {"error": f"offset >= 0 e limit entre 1 e {INSIGHTS_MAX_LIMIT}"}
+        ), 400
+    important = request.args.get("important")
+    if important is not None:
+        important = important.lower() in ("1", "true", "yes")
+    items, total = load_insights(
+        dataset_ids, offset=offset, limit=limit, important=important
+    )
+    next_offset = offset + len(items) if offset + len(items) < total else None
+    return jsonify(
+        {
+            "items": items,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset,
+        }
+    )
+
+
 @app.route("/api/insights/mark", methods=["POST"])
 def mark_insight():
     """
     Endpoint POST /api/insights/mark
-    Marca um insight como importante no banco de dados.
+    Marca insights como importantes no banco de dados.
+    Aceita {"insight_id": id} ou, em lote, {"mark": [ids], "unmark": [ids]};
+    tudo é gravado numa única transação.
     """
-    data = request.get_json()
-    iid = data.get("insight_id")
-    from eda_agent import DB_CONN
-
-    cur = DB_CONN.cursor()
-    cur.execute("UPDATE insights SET important=1 WHERE insight_id=?", (iid,))
-    DB_CONN.commit()
-    return jsonify({"status": "ok"})
+    data = request.get_json() or {}
+    mark = data.get("mark") or []
+    unmark = data.get("unmark") or []
+    if not isinstance(mark, list) or not isinstance(unmark, list):
+        return jsonify({"error": "mark/unmark devem ser listas de ids"}), 400
+    if data.get("insight_id"):
+        mark = mark + [data["insight_id"]]
+    # marcar e desmarcar no mesmo executemany: uma única escrita na fila
+    updated = mark_insights(mark, unmark) if mark or unmark else 0
+    return jsonify({"status": "ok", "updated": updated})
 
 
 @app.route("/api/summary", methods=["GET"])
@@ -259,17 +528,16 @@ def get_summary():
     dataset_id = request.args.get("dataset_id")
     if not dataset_id:
         return jsonify({"error": "dataset_id é obrigatório"}), 400
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
+    summary = get_dataset_summary(dataset_id)
+    if summary is None:
         return jsonify({"error": "dataset_id não encontrado"}), 404
-    df = pd.read_csv(path)
-    summary = quick_summary(df)
     return (
         jsonify(
             {
                 "dataset_id": dataset_id,
-                "n_rows": df.shape[0],
-                "n_cols": df.shape[1],
+                "n_rows": summary["n_rows"],
+                "n_cols": summary["n_cols"],
+                "exact": summary.get("exact", True),
                 "schema": summary["schema"],
                 "plots": summary["plots"],
             }
@@ -278,11 +546,142 @@ def get_summary():
     )
 
 
+def generate_basic_insights(df, schema):
+    """
+    Gera insights automáticos simples a partir do DataFrame e do esquema inferido.
+    """
+    insights = []
+    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    # Tendências
+    for col in numeric_cols[:3]:
+        mean_val = df[col].mean()
+        min_val = df[col].min()
+        max_val = df[col].max()
+        insights.append(f"A média da coluna '{col}' é {mean_val:.2f}.")
+        insights.append(
+            f"O valor mínimo de '{col}' é {min_val:.2f} e o máximo é {max_val:.2f}."
+        )
+        # Distribuição desbalanceada
+        if abs(mean_val - min_val) < 0.1 * (max_val - min_val):
+            insights.append(f"A coluna '{col}' possui distribuição desbalanceada.")
+    # Riscos/limitações
+    for col, info in schema.items():
+        if info.get("missing", 0) > 0:
+            insights.append(
+                f"A coluna '{col}' possui {info['missing']} valores ausentes."
+            )
+        if info.get("outliers", 0) > 0:
+            insights.append(
+                f"A coluna '{col}' possui {info['outliers']} outliers detectados."
+            )
+    if not insights:
+        insights.append("Não foi possível gerar insights automáticos para este dataset.")
+    return insights
+
+
+def run_upload_pipeline(job, uploads):
+    """
+    Pipeline do upload, executado em segundo plano (jobs.JOBS).
+    `uploads` é uma lista de (nome do arquivo, caminho temporário já gravado em disco).
+    Cada etapa fica registrada no job com seu tempo; o retorno é o resumo do dataset.
+    """
+    try:
+        dfs = []
+        filenames = []
+        ingest = []
+        with job.stage("parse"):
+            for filename, tmp_path in uploads:
+                try:
+                    df, info = load_csv_file(tmp_path)
+                except Exception as e:
+                    raise ValueError(f"Falha ao ler {filename}: {str(e)}")
+                df.columns = df.columns.str.strip()
+                dfs.append(df)
+                filenames.append(filename)
+                ingest.append({"file": filename, **info})
+
+        with job.stage("merge"):
+            if len(dfs) == 1:
+                df_combined = dfs[0]
+            else:
+                common = set(dfs[0].columns)
+                for d in dfs[1:]:
+                    common = common.intersection(set(d.columns))
+                if common:
+                    key = list(common)[0]
+                    df_combined = dfs[0]
+                    for d in dfs[1:]:
+                        df_combined = df_combined.merge(d, on=key, how="outer")
+                else:
+                    df_combined = pd.concat(dfs, axis=0, ignore_index=True, sort=False)
+            del dfs
+
+        dataset_id = str(uuid.uuid4())
+        with job.stage("write"):
+            path = save_dataset(dataset_id, df_combined)
+        job.set_partial(
+            dataset_id=dataset_id,
+            n_rows=df_combined.shape[0],
+            n_cols=df_combined.shape[1],
+        )
+
+        if df_combined.shape[0] >= PREVIEW_MIN_ROWS:
+            # dataset grande: publica logo uma prévia amostrada (aproximada);
+            # as etapas seguintes calculam e gravam o resumo exato por cima
+            with job.stage("preview"):
+                preview = quick_summary(
+                    df_combined, dataset_id=dataset_id, preview=True
+                )
+                save_dataset_summary(dataset_id, preview)
+                job.set_partial(summary=preview)
+
+        with job.stage("schema"):
+            schema = infer_schema(df_combined)
+            save_dataset_metadata(
+                dataset_id, ",".join(filenames), df_combined, path, schema=schema
+            )
+
+        with job.stage("sketches"):
+            save_column_sketches(dataset_id, build_column_sketches(df_combined))
+
+        with job.stage("index"):
+            save_index(dataset_id, build_index(df_combined))
+
+        with job.stage("plots"):
+            summary = quick_summary(df_combined, schema=schema, dataset_id=dataset_id)
+            save_dataset_summary(dataset_id, summary)
+
+        # --- Geração automática de insights ---
+        with job.stage("insights"):
+            auto_insights = generate_basic_insights(df_combined, summary["schema"])
+            save_insights(dataset_id, auto_insights)
+
+        return {
+            "dataset_id": dataset_id,
+            "n_rows": df_combined.shape[0],
+            "n_cols": df_combined.shape[1],
+            "schema": summary["schema"],
+            "plots": summary["plots"],
+            "plot_timings": summary["plot_timings"],
+            "render": summary["render"],
+            "ingest": ingest,
+        }
+    finally:
+        for _, tmp_path in uploads:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload_csv():
     """
     Endpoint POST /api/upload
-    Realiza upload de um ou mais arquivos CSV, combina os dados e gera insights automáticos.
+    Recebe um ou mais arquivos CSV (gravados em disco em blocos) e agenda o
+    pipeline de processamento em segundo plano. Retorna 202 com o job_id;
+    o andamento e o resultado ficam em GET /api/jobs/<job_id>.
+    Com ?sync=1, processa na própria requisição e retorna o resumo.
     """
     if "files" not in request.files:
         return (
@@ -290,195 +689,345 @@ def upload_csv():
             400,
         )
     files = request.files.getlist("files")
-    dfs = []
-    filenames = []
+    uploads = []
     for f in files:
         try:
-            content = f.read()
-            df = load_csv_bytes(content)
-            df.columns = df.columns.str.strip()
-            dfs.append(df)
-            filenames.append(f.filename)
+            tmp_path, _ = spool_upload(f.stream)
         except Exception as e:
-            return jsonify({"error": f"Falha ao ler {f.filename}: {str(e)}"}), 400
+            for _, p in uploads:
+                os.remove(p)
+            return jsonify({"error": f"Falha ao receber {f.filename}: {str(e)}"}), 400
+        uploads.append((f.filename, tmp_path))
 
-    if len(dfs) == 1:
-        df_combined = dfs[0]
-    else:
-        common = set(dfs[0].columns)
-        for d in dfs[1:]:
-            common = common.intersection(set(d.columns))
-        if common:
-            key = list(common)[0]
-            df_combined = dfs[0]
-            for d in dfs[1:]:
-                df_combined = df_combined.merge(d, on=key, how="outer")
-        else:
-            df_combined = pd.concat(dfs, axis=0, ignore_index=True, sort=False)
-
-    dataset_id = str(uuid.uuid4())
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    df_combined.to_csv(path, index=False)
-
-    save_dataset_metadata(dataset_id, ",".join(filenames), df_combined, path)
-
-    summary = quick_summary(df_combined)
-
-    # --- Geração automática de insights ---
-    def generate_basic_insights(df, schema):
-        """
-        Gera insights automáticos simples a partir do DataFrame e do esquema inferido.
-        """
-        insights = []
-        numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-        # Tendências
-        for col in numeric_cols[:3]:
-            mean_val = df[col].mean()
-            min_val = df[col].min()
-            max_val = df[col].max()
-            insights.append(f"A média da coluna '{col}' é {mean_val:.2f}.")
-            insights.append(
-                f"O valor mínimo de '{col}' é {min_val:.2f} e o máximo é {max_val:.2f}."
-            )
-            # Distribuição desbalanceada
-            if abs(mean_val - min_val) < 0.1 * (max_val - min_val):
-                insights.append(f"A coluna '{col}' possui distribuição desbalanceada.")
-        # Riscos/limitações
-        for col, info in schema.items():
-            if info.get("missing", 0) > 0:
-                insights.append(
-                    f"A coluna '{col}' possui {info['missing']} valores ausentes."
-                )
-            if info.get("outliers", 0) > 0:
-                insights.append(
-                    f"A coluna '{col}' possui {info['outliers']} outliers detectados."
-                )
-        if not insights:
-            insights.append(
-                "Não foi possível gerar insights automáticos para este dataset."
-            )
-        return insights
+    if request.args.get("sync") == "1":
+        job = JOBS.run_inline("upload", run_upload_pipeline, uploads)
+        if job.status == "error":
+            return jsonify({"error": job.error, "job_id": job.job_id}), 400
+        return jsonify(job.result), 200
 
-    auto_insights = generate_basic_insights(df_combined, summary["schema"])
-    from eda_agent import DB_CONN
+    job = JOBS.submit("upload", run_upload_pipeline, uploads)
+    return (
+        jsonify(
+            {
+                "job_id": job.job_id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.job_id}",
+            }
+        ),
+        202,
+    )
 
-    cur = DB_CONN.cursor()
-    for text in auto_insights:
-        cur.execute(
-            "INSERT INTO insights VALUES (?,?,?,?,?)",
-            (
-                str(uuid.uuid4()),
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Endpoint GET /api/jobs/<job_id>
+    Retorna o status do job, as etapas com seus tempos e, ao final, o resultado.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "job não encontrado"}), 404
+    return jsonify(job.to_dict())
+
+
+
+def pandas_answer(dataset_id, question):
+    """
+    Resposta local (query_engine: agregações, filtros, agrupamentos, top-n),
+    com o histograma da coluna numérica consultada, já registrada no histórico.
+    Planos cobertos pelo índice de respostas (answer_index) não leem os dados;
+    os demais leem só as colunas do plano.
+    Retorna o payload da resposta, ou None se a pergunta não couber na gramática.
+    """
+    index = dataset_index(dataset_id)
+    dtypes = dataset_dtypes(dataset_id)
+    plan = parse_question(question, dtypes, index_categories(index))
+    if plan is None:
+        return None
+    value = index_answer(index, plan)
+    indexed = value is not None
+    if not indexed:
+        # ausentes "em todas as colunas" é o único plano que precisa de todas
+        cols = None if plan.op == "missing" and plan.column is None else plan.columns()
+        try:
+            value = execute(plan, load_dataset(dataset_id, columns=cols))
+        except (TypeError, ValueError, KeyError):
+            return None
+        if value is None:
+            return None
+    answer = f"A resposta para sua pergunta é: {format_result(value)} ({plan.describe()})"
+    plots = {}
+    col = plan.column
+    if col and is_numeric(dtypes[col]):
+        try:
+            # mesmo gráfico (e mesma chave de cache) do histograma do resumo
+            plots[f"hist_{col}"] = cached_plot(
                 dataset_id,
-                time.strftime("%Y-%m-%d %H:%M:%S"),
-                text,
-                0,
-            ),
-        )
-    DB_CONN.commit()
-
-    response = {
-        "dataset_id": dataset_id,
-        "n_rows": df_combined.shape[0],
-        "n_cols": df_combined.shape[1],
-        "schema": summary["schema"],
-        "plots": summary["plots"],
+                "hist",
+                [col],
+                None,
+                lambda: histogram_figure(
+                    load_dataset(dataset_id, columns=[col])[col]
+                    .dropna()
+                    .to_numpy(dtype="float64"),
+                    col,
+                ),
+            )
+        except Exception:
+            pass
+    save_query(dataset_id, question, answer, answer, "pandas")
+    return {
+        "answer": answer,
+        "source": "pandas",
+        "plots": plots,
+        "plan": plan.to_dict(),
+        "indexed": indexed,
     }
-    return jsonify(response), 200
 
 
-if __name__ == "__main__":
-    print("Rodando Flask app: python agente_mvp.py")
-    app.run(host="0.0.0.0", port=8000)
+def memory_answer(dataset_id, question):
+    """
+    Resposta já dada pelo LLM à mesma pergunta (ou a uma quase igual, ver
+    agent_memory.find_duplicate) sobre o dataset, com a origem em "cache".
+    Não chama o LLM nem grava outra linha no histórico. None se não houver.
+    """
+    hit = find_duplicate(dataset_id, question)
+    if hit is None:
+        return None
+    return {
+        "answer": hit["answer"],
+        "source": "memory",
+        "plots": {},
+        "cached": True,
+        "cache": {
+            "type": "dedup",
+            "match": hit["match"],
+            "score": hit["score"],
+            "query_id": hit["query_id"],
+            "question": hit["question"],
+            "source": hit["source"],
+            "created_at": hit["created_at"],
+        },
+    }
 
 
-def try_answer_with_pandas(df, question: str):
+def llm_prompt(dataset_id, question):
     """
-    Tenta responder perguntas simples sobre o DataFrame usando expressões regulares e Pandas.
-    Retorna resposta, fonte e coluna, ou None se não encontrar correspondência.
+    Prompt do LLM: pergunta + contexto do dataset (llm_context, dentro do
+    orçamento de tokens). Retorna (prompt, info do contexto).
     """
-    patterns = {
-        "mean": r"(m[eé]dia|m[eé]dio) da coluna (\w+)",
-        "max": r"(maior|m[aá]ximo) da coluna (\w+)",
-        "min": r"(menor|m[ií]nimo) da coluna (\w+)",
-        "sum": r"(soma|total) da coluna (\w+)",
-        "count": r"(quantidade|contagem|n[úu]mero de) (\w+)",
-    }
-    for op, pat in patterns.items():
-        m = re.search(pat, question, flags=re.IGNORECASE)
-        if m:
-            col = m.group(len(m.groups()))
-            if col in df.columns and np.issubdtype(df[col].dtype, np.number):
-                if op == "mean":
-                    return float(df[col].mean()), "pandas", col
-                if op == "max":
-                    return float(df[col].max()), "pandas", col
-                if op == "min":
-                    return float(df[col].min()), "pandas", col
-                if op == "sum":
-                    return float(df[col].sum()), "pandas", col
-                if op == "count":
-                    return int(df[col].count()), "pandas", col
-    return None, None, None
-
-
-def plot_histogram(df, col):
-    """
-    Gera um histograma em base64 para a coluna informada do DataFrame.
+    context, info = build_context(dataset_id, question)
+    prompt = f"""
+    Você é um analista de dados. Responda a pergunta do usuário com base nos dados abaixo.\nPergunta: {question}\nContexto:\n{context}
     """
-    fig, ax = plt.subplots()
-    df[col].hist(ax=ax)
-    ax.set_title(f"Histograma de {col}")
-    ax.set_xlabel(col)
-    ax.set_ylabel("Frequência")
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-    return f"data:image/png;base64,{img_base64}"
+    return prompt, info
 
 
-@app.route("/api/query", methods=["POST"])
-def query():
+def parse_query_request():
     """
-    Endpoint POST /api/query
-    Responde perguntas em linguagem natural sobre o dataset, usando Pandas ou LLM.
+    Valida o corpo de /api/query e /api/query/stream.
+    Retorna (dataset_id, question, None) ou (None, None, resposta de erro).
     """
     data = request.get_json()
     if not data or "dataset_id" not in data or "question" not in data:
-        return jsonify({"error": "Campos dataset_id e question são obrigatórios"}), 400
+        return None, None, (
+            jsonify({"error": "Campos dataset_id e question são obrigatórios"}),
+            400,
+        )
+    if not dataset_exists(data["dataset_id"]):
+        return None, None, (jsonify({"error": "dataset_id não encontrado"}), 404)
+    return data["dataset_id"], data["question"], None
 
-    dataset_id = data["dataset_id"]
-    question = data["question"]
-    path = os.path.join(DATA_DIR, f"{dataset_id}.csv")
-    if not os.path.exists(path):
-        return jsonify({"error": "dataset_id não encontrado"}), 404
-    df = pd.read_csv(path)
 
-    # 1. Tentar responder com pandas
-    ans, source, col = try_answer_with_pandas(df, question)
-    if ans is not None:
-        answer = f"A resposta para sua pergunta é: {ans}"
-        plots = {}
-        if col:
-            try:
-                plots[f"hist_{col}"] = plot_histogram(df, col)
-            except Exception:
-                pass
-        save_query(dataset_id, question, answer, answer, source)
-        return jsonify({"answer": answer, "source": source, "plots": plots})
-
-    # 2. Se não deu match → usar LLM
-    schema = infer_schema(df)
-    sample = df.sample(min(20, len(df))).to_dict(orient="records")
-    stats = df.describe(include="all").to_dict()
-    context = {"schema": schema, "sample": sample, "stats": stats}
-    prompt = f"""
-    Você é um analista de dados. Responda a pergunta do usuário com base nos dados abaixo.\nPergunta: {question}\nContexto: {json.dumps(context)[:4000]}
+@app.route("/api/query", methods=["POST"])
+def query():
+    """
+    Endpoint POST /api/query
+    Responde perguntas em linguagem natural sobre o dataset, usando Pandas,
+    uma resposta anterior do LLM à mesma pergunta (memória) ou o LLM.
     """
+    dataset_id, question, error = parse_query_request()
+    if error:
+        return error
+
+    # 1. Tentar responder com pandas
+    payload = pandas_answer(dataset_id, question)
+    if payload is not None:
+        return jsonify(payload)
+
+    # 2. Mesma pergunta (ou quase) já respondida pelo LLM → resposta guardada
+    payload = memory_answer(dataset_id, question)
+    if payload is not None:
+        # o histórico guarda a resposta inteira; aqui vai cortada, como a do LLM
+        payload["answer"] = shorten_answer(payload["answer"])
+        return jsonify(payload)
+
+    # 3. Se não deu match → usar LLM
+    prompt, context = llm_prompt(dataset_id, question)
     try:
-        llm_answer = call_gemini(prompt)
+        llm_answer, cached = LLM_CACHE.call(prompt, generate_text, dataset_id)
         save_query(dataset_id, question, llm_answer, llm_answer, "llm")
-        return jsonify({"answer": llm_answer, "source": "llm", "plots": {}})
+        return jsonify(
+            {
+                "answer": shorten_answer(llm_answer),
+                "source": "llm",
+                "plots": {},
+                "cached": cached,
+                "context": context,
+            }
+        )
     except Exception as e:
         return jsonify({"error": f"Falha ao chamar LLM: {str(e)}"}), 500
+
+
+def sse_event(data, event=None):
+    """
+    Um evento server-sent events com payload JSON.
+    """
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+@app.route("/api/query/stream", methods=["POST"])
+def query_stream():
+    """
+    Endpoint POST /api/query/stream
+    Como /api/query, mas a resposta chega por server-sent events: eventos
+    sem nome com {"delta": "..."} à medida que o LLM gera o texto, e por fim
+    "done" com o payload completo de /api/query (ou "error" com {"error": ...}).
+    A resposta completa é registrada no histórico ao final.
+    """
+    dataset_id, question, error = parse_query_request()
+    if error:
+        return error
+
+    payload = pandas_answer(dataset_id, question)
+    if payload is None:
+        payload = memory_answer(dataset_id, question)
+    prompt, context = llm_prompt(dataset_id, question) if payload is None else (None, None)
+
+    def events():
+        if payload is not None:
+            yield sse_event({"delta": payload["answer"]})
+            yield sse_event(payload, "done")
+            return
+        parts = []
+        try:
+            chunks, cached = LLM_CACHE.stream(prompt, stream_gemini, dataset_id)
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({"delta": chunk})
+        except Exception as e:
+            yield sse_event({"error": f"Falha ao chamar LLM: {str(e)}"}, "error")
+            return
+        llm_answer = "".join(parts)
+        save_query(dataset_id, question, llm_answer, llm_answer, "llm")
+        yield sse_event(
+            {
+                "answer": llm_answer,
+                "source": "llm",
+                "plots": {},
+                "cached": cached,
+                "context": context,
+            },
+            "done",
+        )
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        # sem buffer em proxies (nginx) nem cache
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/memory", methods=["GET"])
+def get_memory():
+    """
+    Endpoint GET /api/memory
+    Perguntas já feitas sobre o dataset mais parecidas com q (similaridade
+    TF-IDF de 0 a 1, ver agent_memory.py), com as respostas dadas.
+    Parâmetros: dataset_id, q, k (padrão 5) e min_score (padrão 0).
+    """
+    dataset_id = request.args.get("dataset_id")
+    question = request.args.get("q", "")
+    if not dataset_id or not question.strip():
+        return jsonify({"error": "Parâmetros dataset_id e q são obrigatórios"}), 400
+    try:
+        k = int(request.args.get("k", 5))
+        min_score = float(request.args.get("min_score", 0))
+    except ValueError:
+        return jsonify({"error": "k/min_score inválidos"}), 400
+    if not 1 <= k <= MEMORY_MAX_K:
+        return jsonify({"error": f"k deve estar entre 1 e {MEMORY_MAX_K}"}), 400
+    if not dataset_exists(dataset_id):
+        return jsonify({"error": "dataset_id não encontrado"}), 404
+    t0 = time.perf_counter()
+    results = search_memory(dataset_id, question, k=k, min_score=min_score)
+    return jsonify(
+        {
+            "k": k,
+            "results": results,
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+    )
+
+
+@app.route("/api/plots/<key>.png", methods=["GET"])
+def get_plot(key):
+    """
+    Endpoint GET /api/plots/<hash>.png
+    Serve um gráfico do cache em disco. O hash identifica o conteúdo, então
+    ele é usado como ETag e a resposta pode ser guardada indefinidamente.
+    """
+    if not is_valid_key(key) or not os.path.exists(plot_file(key)):
+        return jsonify({"error": "gráfico não encontrado"}), 404
+    return send_file(
+        plot_file(key), mimetype="image/png", etag=key, max_age=31536000
+    )
+
+
+@app.route("/api/export/csv", methods=["GET"])
+def export_dataset_csv():
+    """
+    Endpoint GET /api/export/csv
+    Exporta o dataset em CSV (gerado sob demanda a partir do arquivo colunar).
+    """
+    dataset_id = request.args.get("dataset_id")
+    path = export_csv(dataset_id)
+    if path is None:
+        return jsonify({"error": "dataset não encontrado"}), 404
+    return send_file(path, as_attachment=True, download_name=f"{dataset_id}.csv")
+
+
+@app.route("/api/cache", methods=["GET"])
+def get_cache_stats():
+    """
+    Endpoint GET /api/cache
+    Retorna as estatísticas do cache de DataFrames (hits, misses, bytes em uso).
+    """
+    return jsonify(DF_CACHE.stats())
+
+
+@app.route("/api/llm/stats", methods=["GET"])
+def get_llm_stats():
+    """
+    Endpoint GET /api/llm/stats
+    Retorna as estatísticas do cache de respostas do LLM (acertos, entradas, bytes)
+    e do gateway (chamadas, retries, latência, tokens).
+    """
+    return jsonify({"cache": LLM_CACHE.stats(), "gateway": GATEWAY.stats()})
+
+
+def main():
+    """
+    Sobe o servidor de desenvolvimento (use `python server.py`: rodar este
+    arquivo direto faz os workers de plot_pool reimportarem todo o backend).
+    """
+    print("Rodando Flask app: python server.py")
+    threading.Thread(target=warm_up, daemon=True).start()
+    app.run(host="0.0.0.0", port=8000)
+
+
+if __name__ == "__main__":
+    main()
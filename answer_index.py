@@ -0,0 +1,232 @@
+"""
+answer_index.py
+
+Índice de respostas prontas de um dataset, montado no upload:
+- agregados por coluna: contagem, ausentes, distintos e, nas numéricas, média,
+  mediana, soma, mínimo, máximo, desvio padrão, alguns quantis e os maiores e
+  menores valores;
+- contagem de valores das colunas com poucas categorias;
+- agregados por categoria (coluna categórica x coluna numérica).
+Os planos do query_engine sem filtro que o índice cobre são respondidos direto
+dele, sem ler os dados (e as categorias do índice servem ao próprio parser);
+os demais caem em query_engine.execute(). Fica em EDA_INDEX_DIR/<dataset_id>.json,
+com o mtime do arquivo de dados, e em memória (LRU), como as estatísticas de
+correlação.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from dataset_store import DATA_DIR, dataset_mtime, load_dataset
+from query_engine import (
+    QUERY_MAX_CATEGORIES,
+    group_result,
+    is_categorical,
+    is_numeric,
+    python_value,
+    value_counts_result,
+)
+
+INDEX_DIR = os.environ.get("EDA_INDEX_DIR", os.path.join(DATA_DIR, "index"))
+os.makedirs(INDEX_DIR, exist_ok=True)
+
+# Colunas categóricas com até quantas categorias entram nos agregados por grupo
+INDEX_GROUP_MAX_CATEGORIES = int(os.environ.get("EDA_INDEX_GROUP_MAX_CATEGORIES", "200"))
+# Quantas colunas numéricas entram nos agregados por grupo
+INDEX_GROUP_MAX_COLS = int(os.environ.get("EDA_INDEX_GROUP_MAX_COLS", "20"))
+# Quantos índices manter em memória
+INDEX_CACHE_SIZE = int(os.environ.get("EDA_INDEX_CACHE_SIZE", "32"))
+
+# Incrementar quando o formato mudar, para recalcular os índices gravados
+INDEX_VERSION = 1
+INDEX_QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+INDEX_TOP_VALUES = 10
+GROUP_AGGS = ("mean", "median", "sum", "min", "max", "std", "count")
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _json_value(value):
+    value = python_value(value)
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def quantile_key(q):
+    return f"{q:g}"
+
+
+def build_index(df):
+    """
+    Monta o índice (dict serializável em JSON) a partir do DataFrame completo.
+    """
+    columns = {}
+    categories = {}
+    category_keys = {}
+    numeric = []
+    for col in df.columns:
+        s = df[col]
+        info = {"count": int(s.count()), "missing": int(s.isna().sum())}
+        if is_numeric(s.dtype):
+            numeric.append(col)
+            for op in ("mean", "median", "sum", "min", "max", "std"):
+                info[op] = python_value(s.agg(op))
+            qs = s.quantile(list(INDEX_QUANTILES))
+            info["quantiles"] = {quantile_key(q): python_value(v) for q, v in qs.items()}
+            info["largest"] = [python_value(v) for v in s.nlargest(INDEX_TOP_VALUES)]
+            info["smallest"] = [python_value(v) for v in s.nsmallest(INDEX_TOP_VALUES)]
+            info["nunique"] = int(s.nunique())
+        elif is_categorical(s.dtype):
+            counts = s.value_counts()
+            info["nunique"] = int(len(counts))
+            if len(counts) <= QUERY_MAX_CATEGORIES:
+                categories[col] = [[_json_value(k), int(v)] for k, v in counts.items()]
+                category_keys[col] = counts.index
+        else:
+            info["nunique"] = int(s.nunique())
+        columns[col] = info
+
+    groups = {}
+    group_cols = numeric[:INDEX_GROUP_MAX_COLS]
+    for col, keys in category_keys.items():
+        if not group_cols or len(keys) > INDEX_GROUP_MAX_CATEGORIES:
+            continue
+        agg = df.groupby(col, observed=True, sort=False)[group_cols].agg(list(GROUP_AGGS))
+        # mesma ordem das categorias (mais frequentes primeiro)
+        agg = agg.reindex(keys)
+        groups[col] = {
+            num: {op: [python_value(v) for v in agg[(num, op)]] for op in GROUP_AGGS}
+            for num in group_cols
+        }
+
+    return {
+        "version": INDEX_VERSION,
+        "n_rows": int(len(df)),
+        "columns": columns,
+        "categories": categories,
+        "groups": groups,
+    }
+
+
+def index_file(dataset_id):
+    return os.path.join(INDEX_DIR, f"{dataset_id}.json")
+
+
+def _remember(dataset_id, index):
+    with _CACHE_LOCK:
+        _CACHE[dataset_id] = index
+        _CACHE.move_to_end(dataset_id)
+        while len(_CACHE) > INDEX_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def save_index(dataset_id, index):
+    """
+    Grava o índice (escrita atômica), marcado com o mtime atual dos dados.
+    """
+    index["mtime"] = dataset_mtime(dataset_id)
+    path = index_file(dataset_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(index, fh)
+    os.replace(tmp, path)
+    _remember(dataset_id, index)
+    return index
+
+
+def dataset_index(dataset_id, df=None):
+    """
+    Índice do dataset: do cache em memória, do arquivo ou, na falta (datasets
+    anteriores ao índice), calculado a partir dos dados. None se o dataset não existir.
+    """
+    mtime = dataset_mtime(dataset_id)
+    if mtime is None:
+        return None
+    with _CACHE_LOCK:
+        index = _CACHE.get(dataset_id)
+        if index is not None and index.get("mtime") == mtime:
+            _CACHE.move_to_end(dataset_id)
+            return index
+
+    index = None
+    path = index_file(dataset_id)
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                index = json.load(fh)
+        except (OSError, ValueError):
+            index = None
+        if index is not None and (
+            index.get("version") != INDEX_VERSION or index.get("mtime") != mtime
+        ):
+            index = None
+    if index is None:
+        if df is None:
+            df = load_dataset(dataset_id)
+        return save_index(dataset_id, build_index(df))
+    _remember(dataset_id, index)
+    return index
+
+
+def index_categories(index):
+    """
+    Função coluna -> valores de categoria (None se a coluna tiver categorias
+    demais), no formato esperado por query_engine.parse_question().
+    """
+    cache = {}
+
+    def categories(col):
+        if col not in cache:
+            pairs = index["categories"].get(col)
+            cache[col] = [v for v, _ in pairs] if pairs is not None else None
+        return cache[col]
+
+    return categories
+
+
+def index_answer(index, plan):
+    """
+    Resposta do plano a partir do índice (mesmo formato de query_engine.execute),
+    ou None se o índice não a cobrir (filtros, quantis não guardados etc.).
+    """
+    if index is None or plan.filters:
+        return None
+    col = plan.column
+    if plan.group_by:
+        pairs = index["categories"].get(plan.group_by)
+        if pairs is None:
+            return None
+        keys = [v for v, _ in pairs]
+        if plan.op == "count" and col is None:
+            values = [n for _, n in pairs]
+        else:
+            values = index["groups"].get(plan.group_by, {}).get(col, {}).get(plan.op)
+            if values is None:
+                return None
+        return group_result(pd.Series(values, index=keys), plan)
+
+    if plan.op == "count":
+        return index["n_rows"] if col is None else index["columns"][col]["count"]
+    if plan.op == "missing" and col is None:
+        return {c: i["missing"] for c, i in index["columns"].items() if i["missing"] > 0}
+    info = index["columns"].get(col)
+    if info is None:
+        return None
+    if plan.op == "quantile":
+        return info.get("quantiles", {}).get(quantile_key(plan.q))
+    if plan.op in ("top", "bottom"):
+        values = info.get("largest" if plan.op == "top" else "smallest")
+        if values is None or plan.top > INDEX_TOP_VALUES:
+            return None
+        return values[: plan.top]
+    if plan.op == "value_counts":
+        pairs = index["categories"].get(col)
+        if pairs is None:
+            return None
+        counts = pd.Series([n for _, n in pairs], index=[v for v, _ in pairs])
+        return value_counts_result(counts, plan)
+    return info.get(plan.op)
@@ -0,0 +1,132 @@
+"""
+bench_history_index.py
+
+Mede as consultas de histórico por dataset (insights do sidebar, insights do
+relatório e memória de conversa) num banco com um histórico grande, antes e
+depois da migração v1 (created_ts + índices (dataset_id, created_ts)).
+
+Uso: python benchmarks/bench_history_index.py --rows 1000000 --datasets 2000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# não tocar no banco real ao importar eda_agent
+BENCH_DIR = tempfile.mkdtemp()
+os.environ.setdefault("EDA_DB_PATH", os.path.join(BENCH_DIR, "app.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eda_agent import MIGRATIONS, create_tables
+from persistence import Database
+
+# (nome, SQL antes da migração, SQL depois)
+QUERIES = [
+    (
+        "insights (sidebar)",
+        "SELECT insight_id, text, important, created_at FROM insights WHERE dataset_id=?",
+        "SELECT insight_id, text, important, created_at FROM insights "
+        "WHERE dataset_id=? ORDER BY created_ts",
+    ),
+    (
+        "insights (relatório)",
+        "SELECT text, important FROM insights WHERE dataset_id=?",
+        "SELECT text, important FROM insights WHERE dataset_id=? ORDER BY created_ts",
+    ),
+    (
+        "memória (últimas 5)",
+        "SELECT question, response_summary FROM queries WHERE dataset_id=? "
+        "ORDER BY created_at DESC LIMIT 5",
+        "SELECT question, response_summary FROM queries WHERE dataset_id=? "
+        "ORDER BY created_ts DESC LIMIT 5",
+    ),
+]
+
+
+def fill(db, rows, datasets, seed=0):
+    """
+    Histórico sintético no esquema original (sem created_ts).
+    """
+    rng = random.Random(seed)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(datasets)]
+    start = time.time() - 365 * 86400
+    conn = db.connection()
+    for table, make in (
+        (
+            "queries",
+            lambda i, ds, ts: (str(uuid.uuid4()), ds, f"pergunta {i}", "resposta", "raw", ts, "llm"),
+        ),
+        (
+            "insights",
+            lambda i, ds, ts: (str(uuid.uuid4()), ds, ts, f"insight {i}", 0),
+        ),
+    ):
+        marks = ",".join("?" * len(make(0, "", "")))
+        batch = []
+        for i in range(rows):
+            ts = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(start + i * 365 * 86400 / rows)
+            )
+            batch.append(make(i, rng.choice(ids), ts))
+            if len(batch) == 50_000:
+                with conn:
+                    conn.executemany(f"INSERT INTO {table} VALUES ({marks})", batch)
+                batch = []
+        if batch:
+            with conn:
+                conn.executemany(f"INSERT INTO {table} VALUES ({marks})", batch)
+    return ids
+
+
+def measure(db, sql, ids, repeat):
+    conn = db.connection()
+    times = []
+    for ds in ids[:repeat]:
+        t0 = time.perf_counter()
+        conn.execute(sql, (ds,)).fetchall()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def plan(db, sql):
+    rows = db.connection().execute("EXPLAIN QUERY PLAN " + sql, ("x",)).fetchall()
+    return "; ".join(r[-1] for r in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--datasets", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    db = Database(os.path.join(BENCH_DIR, "history.db"))
+    create_tables(db)
+    t0 = time.perf_counter()
+    ids = fill(db, args.rows, args.datasets)
+    print(f"histórico: {args.rows} linhas em queries e em insights ({time.perf_counter() - t0:.1f}s)")
+    random.Random(1).shuffle(ids)
+
+    before = [measure(db, old, ids, args.repeat) for _, old, _ in QUERIES]
+    plans_before = [plan(db, old) for _, old, _ in QUERIES]
+    t0 = time.perf_counter()
+    db.migrate(MIGRATIONS)
+    print(f"migração v{db.user_version()}: {time.perf_counter() - t0:.1f}s\n")
+    after = [measure(db, new, ids, args.repeat) for _, _, new in QUERIES]
+    plans_after = [plan(db, new) for _, _, new in QUERIES]
+
+    print(f"{'consulta':<22} {'antes (ms)':>11} {'depois (ms)':>12} {'speedup':>9}")
+    for (name, _, _), b, a in zip(QUERIES, before, after):
+        print(f"{name:<22} {b:>11.2f} {a:>12.3f} {b / a:>8.0f}x")
+    print()
+    for (name, _, _), pb, pa in zip(QUERIES, plans_before, plans_after):
+        print(f"{name}:\n  antes:  {pb}\n  depois: {pa}")
+
+
+if __name__ == "__main__":
+    main()
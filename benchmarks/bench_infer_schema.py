@@ -0,0 +1,89 @@
+"""
+bench_infer_schema.py
+
+Compara o infer_schema vetorizado com a implementação original coluna a coluna
+(_infer_schema_columnwise) em tabelas largas sintéticas.
+
+Uso: python benchmarks/bench_infer_schema.py --rows 20000 --cols 50 200 500
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+# não tocar no banco real ao importar eda_agent
+os.environ.setdefault("EDA_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from eda_agent import _infer_schema_columnwise, infer_schema
+
+
+def make_frame(rows, cols, seed=0):
+    """
+    Tabela com ~90% colunas numéricas (10% de missing) e ~10% categóricas.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        if i % 10 == 9:
+            data[f"cat_{i}"] = rng.choice(["a", "b", "c", "d"], rows)
+        elif i % 2:
+            data[f"int_{i}"] = rng.integers(0, 1000, rows)
+        else:
+            values = rng.normal(size=rows)
+            values[rng.random(rows) < 0.1] = np.nan
+            data[f"num_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def best_of(fn, df, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def check_same(a, b):
+    """
+    Confere que as duas implementações concordam (exceto a amostra aleatória).
+    """
+    for col, info in a.items():
+        for key, value in info.items():
+            if key == "sample":
+                continue
+            other = b[col].get(key)
+            if isinstance(value, float) and isinstance(other, float):
+                if math.isnan(value) and math.isnan(other):
+                    continue
+                if math.isclose(value, other, rel_tol=1e-9, abs_tol=1e-12):
+                    continue
+            if value != other:
+                raise AssertionError(f"{col}.{key}: {value} != {other}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cols", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>8} {'colunas':>8} {'original (s)':>13} {'vetorizado (s)':>15} {'speedup':>8}")
+    for cols in args.cols:
+        df = make_frame(args.rows, cols)
+        check_same(_infer_schema_columnwise(df), infer_schema(df))
+        t_old = best_of(_infer_schema_columnwise, df, args.repeat)
+        t_new = best_of(infer_schema, df, args.repeat)
+        print(f"{args.rows:>8} {cols:>8} {t_old:>13.3f} {t_new:>15.3f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
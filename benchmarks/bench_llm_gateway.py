@@ -0,0 +1,68 @@
+"""
+bench_llm_gateway.py
+
+Vazão e latência do gateway do LLM com o backend fake (sem rede): N threads
+fazendo chamadas simultâneas, com diferentes limites de concorrência e taxas
+de falha transitória (que o gateway repete com backoff).
+
+Uso: python benchmarks/bench_llm_gateway.py --calls 200 --threads 16 --concurrency 1 4 16
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_gateway import FakeBackend, LLMGateway
+
+
+def run(gateway, calls, threads):
+    def one(i):
+        try:
+            gateway.generate(f"pergunta {i}")
+            return True
+        except Exception:
+            return False
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        ok = sum(pool.map(one, range(calls)))
+    return time.perf_counter() - t0, ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--fail-rate", type=float, nargs="+", default=[0.0, 0.2])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(
+        f"{'limite':>7} {'falhas':>7} {'tempo (s)':>10} {'chamadas/s':>11} {'ok':>5} "
+        f"{'retries':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'em voo':>7}"
+    )
+    for fail_rate in args.fail_rate:
+        for limit in args.concurrency:
+            gateway = LLMGateway(
+                max_concurrency=limit,
+                timeout_s=5,
+                retries=3,
+                backoff_s=0.01,
+                backend=FakeBackend(args.latency_ms, fail_rate, seed=0),
+            )
+            elapsed, ok = run(gateway, args.calls, args.threads)
+            s = gateway.stats()
+            print(
+                f"{limit:>7} {fail_rate:>7.2f} {elapsed:>10.2f} {args.calls / elapsed:>11.1f} "
+                f"{ok:>5} {s['retries']:>8} {s['latency_p50_ms']:>9.1f} "
+                f"{s['latency_p95_ms']:>9.1f} {s['max_in_flight']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+bench_outlier_sketch.py
+
+Compara os limites de outliers (IQR) calculados com quantis exatos e com o
+sketch de quantis gravado no upload: tempo de construção do sketch (pago uma vez,
+na ingestão), tempo por consulta (incluindo a desserialização do JSON) e erro
+de posto dos quartis / diferença na contagem de outliers.
+
+Uso: python benchmarks/bench_outlier_sketch.py --rows 100000 1000000 --k 100 200 400
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from sketches import QuantileSketch, build_sketch
+
+
+def iqr_bounds(q1, q3):
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--k", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'linhas':>10} {'k':>5} {'itens':>6} {'build (s)':>10} {'exato (ms)':>11} "
+        f"{'sketch (ms)':>12} {'erro posto q1/q3':>17} {'outliers exato/sketch':>22}"
+    )
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        # distribuição assimétrica, com cauda: o caso em que o IQR importa
+        series = pd.Series(rng.lognormal(size=rows))
+        values = series.to_numpy()
+        sorted_values = np.sort(values)
+        t_exact, (q1, q3) = best_of(
+            lambda: (series.quantile(0.25), series.quantile(0.75)), args.repeat
+        )
+        lower, upper = iqr_bounds(q1, q3)
+        n_exact = int(((values < lower) | (values > upper)).sum())
+        for k in args.k:
+            t0 = time.perf_counter()
+            sketch = build_sketch(values, k=k)
+            t_build = time.perf_counter() - t0
+            stored = json.dumps(sketch.to_dict())
+            t_sketch, (s1, s3) = best_of(
+                lambda: QuantileSketch.from_dict(json.loads(stored)).quantile(
+                    [0.25, 0.75]
+                ),
+                args.repeat,
+            )
+            # erro de posto: distância entre a posição real do quartil estimado e a desejada
+            err1 = abs(np.searchsorted(sorted_values, s1, side="right") / rows - 0.25)
+            err3 = abs(np.searchsorted(sorted_values, s3, side="right") / rows - 0.75)
+            s_lower, s_upper = iqr_bounds(s1, s3)
+            n_sketch = int(((values < s_lower) | (values > s_upper)).sum())
+            print(
+                f"{rows:>10} {k:>5} {sketch.size():>6} {t_build:>10.3f} {t_exact * 1000:>11.2f} "
+                f"{t_sketch * 1000:>12.2f} {err1:>8.4f}/{err3:<8.4f} {n_exact:>11}/{n_sketch:<10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
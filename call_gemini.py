@@ -1,24 +1,61 @@
 """
-call_gemini.py (v1.2)
+call_gemini.py (v1.4)
 ---------------------
 Integração híbrida:
 - Usa Google Gemini 1.5 Flash se GEMINI_API_KEY estiver definida.
 - Caso contrário, retorna uma resposta simulada (stub) para desenvolvimento local.
+As chamadas passam pelo gateway (llm_gateway.py): cliente reaproveitado,
+concorrência limitada, timeout e retry com backoff. stream_gemini() entrega
+a resposta em pedaços, sem o corte de call_gemini(); o cache guarda sempre
+o texto inteiro (generate_text) e o corte é feito na saída.
 """
 
-import os
 import textwrap
 
-def call_gemini(prompt: str) -> str:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return f"[Stub LLM] Resposta simulada (modo offline) para o prompt: {prompt[:300]}..."
+from llm_gateway import GATEWAY
+
+
+def model_name() -> str:
+    """
+    Nome do modelo que vai responder: o Gemini, "stub" (modo offline) ou "fake".
+    """
+    return GATEWAY.model_name()
+
 
+def generate_text(prompt: str) -> str:
+    """
+    Resposta inteira do modelo (é a que vai para o cache, llm_cache.py),
+    ou a mensagem de fallback se a chamada falhar.
+    """
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return textwrap.shorten(response.text.strip(), width=1200, placeholder="...")
+        return GATEWAY.generate(prompt)
     except Exception as e:
         return f"[Stub Fallback] Erro ao chamar LLM real: {str(e)[:150]}"
+
+
+def shorten_answer(text: str) -> str:
+    """
+    Corte aplicado às respostas de /api/query (não às do streaming).
+    """
+    return textwrap.shorten(text, width=1200, placeholder="...")
+
+
+def call_gemini(prompt: str) -> str:
+    return shorten_answer(generate_text(prompt))
+
+
+def stream_gemini(prompt: str):
+    """
+    Gerador com os pedaços da resposta à medida que o modelo os produz.
+    Se a chamada falhar antes do primeiro pedaço, entrega a mensagem de
+    fallback, como call_gemini(); uma falha no meio da resposta é levantada.
+    """
+    started = False
+    try:
+        for chunk in GATEWAY.stream(prompt):
+            started = True
+            yield chunk
+    except Exception as e:
+        if started:
+            raise
+        yield f"[Stub Fallback] Erro ao chamar LLM real: {str(e)[:150]}"
@@ -0,0 +1,334 @@
+"""
+cluster_engine.py
+
+Clusterização KMeans escalável para /api/clusters.
+Até EDA_CLUSTER_MINIBATCH_ROWS linhas usa o KMeans completo (n_init=10); acima
+disso, MiniBatchKMeans iniciado com os centros de um KMeans sobre uma amostra.
+Aceita duas ou mais colunas (o gráfico usa PCA quando há mais de duas) e, com
+muitos pontos, desenha um mapa de densidade (hexbin) em vez de um ponto por linha.
+
+Os modelos ajustados ficam num cache LRU por (dataset, mtime, colunas, k), com
+os rótulos de cada linha (-1 onde falta valor), servidos paginados ou em CSV
+por /api/clusters/labels.
+
+sweep() ajusta vários k em paralelo (joblib, um processo por k), pontua cada um
+por inércia e silhueta numa amostra e guarda todos os modelos no cache, então
+escolher outro k da varredura em /api/clusters não reajusta nada.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score
+
+from dataset_store import dataset_path, load_dataset
+
+CLUSTER_MINIBATCH_ROWS = int(os.environ.get("EDA_CLUSTER_MINIBATCH_ROWS", "100000"))
+# Tamanho da amostra usada para iniciar os centros do MiniBatchKMeans
+CLUSTER_INIT_SAMPLE = int(os.environ.get("EDA_CLUSTER_INIT_SAMPLE", "20000"))
+# Acima de tantos pontos o gráfico vira mapa de densidade
+CLUSTER_PLOT_POINTS = int(os.environ.get("EDA_CLUSTER_PLOT_POINTS", "20000"))
+# Quantos modelos ajustados manter em memória
+CLUSTER_CACHE_SIZE = int(os.environ.get("EDA_CLUSTER_CACHE_SIZE", "32"))
+# Varredura de k: processos em paralelo e tamanho da amostra da silhueta
+CLUSTER_SWEEP_WORKERS = int(
+    os.environ.get("EDA_CLUSTER_SWEEP_WORKERS", str(min(8, os.cpu_count() or 1)))
+)
+CLUSTER_SILHOUETTE_SAMPLE = int(os.environ.get("EDA_CLUSTER_SILHOUETTE_SAMPLE", "5000"))
+
+# k <= CLUSTER_MAX_K cabe em int8, o que barateia os rótulos em cache
+CLUSTER_MAX_K = 50
+CLUSTER_SWEEP_MAX_KS = 15
+RANDOM_STATE = 42
+
+_MODELS = OrderedDict()
+_MODELS_LOCK = threading.Lock()
+
+
+class ClusterModel:
+    """
+    Resultado de um ajuste: modelo, rótulos por linha e resumo dos clusters.
+    """
+
+    def __init__(self, cols, k, model, labels, algorithm, seconds):
+        self.cols = list(cols)
+        self.k = k
+        self.model = model
+        self.labels = labels
+        self.algorithm = algorithm
+        self.seconds = seconds
+        valid = labels[labels >= 0]
+        self.n_rows = int(valid.size)
+        self.sizes = np.bincount(valid, minlength=k).tolist()
+        self.centers = model.cluster_centers_
+        self.inertia = float(model.inertia_)
+        # silhueta na amostra da varredura (determinística), calculada uma vez
+        self.silhouette = None
+
+    def summary(self):
+        return {
+            "cols": self.cols,
+            "k": self.k,
+            "algorithm": self.algorithm,
+            "n_rows": self.n_rows,
+            "sizes": self.sizes,
+            "centers": self.centers.tolist(),
+            "inertia": self.inertia,
+            "fit_seconds": round(self.seconds, 4),
+        }
+
+
+def fit_kmeans(X, k):
+    """
+    Ajusta o KMeans em X (sem NaN). Retorna (modelo, nome do algoritmo).
+    """
+    if X.shape[0] <= CLUSTER_MINIBATCH_ROWS:
+        model = KMeans(n_clusters=k, n_init=10, random_state=RANDOM_STATE).fit(X)
+        return model, "kmeans"
+    rng = np.random.default_rng(RANDOM_STATE)
+    sample = X[rng.choice(X.shape[0], min(X.shape[0], CLUSTER_INIT_SAMPLE), replace=False)]
+    init = KMeans(n_clusters=k, n_init=3, random_state=RANDOM_STATE).fit(sample)
+    model = MiniBatchKMeans(
+        n_clusters=k,
+        init=init.cluster_centers_,
+        n_init=1,
+        batch_size=4096,
+        random_state=RANDOM_STATE,
+    ).fit(X)
+    return model, "minibatch"
+
+
+def load_matrix(dataset_id, cols):
+    """
+    Lê as colunas como matriz float64 e a máscara das linhas completas.
+    """
+    df = load_dataset(dataset_id, columns=list(cols))
+    X = np.column_stack(
+        [df[c].to_numpy(dtype="float64", na_value=np.nan) for c in cols]
+    )
+    return X, ~np.isnan(X).any(axis=1)
+
+
+def _cache_key(dataset_id, cols, k):
+    path = dataset_path(dataset_id)
+    if path is None:
+        return None
+    return (dataset_id, os.path.getmtime(path), tuple(cols), k)
+
+
+def cached_model(dataset_id, cols, k):
+    """
+    Modelo já ajustado para (dataset, colunas, k), ou None.
+    """
+    key = _cache_key(dataset_id, cols, k)
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is not None:
+            _MODELS.move_to_end(key)
+        return model
+
+
+def store_model(dataset_id, model):
+    key = _cache_key(dataset_id, model.cols, model.k)
+    if key is None:
+        return
+    with _MODELS_LOCK:
+        # versões antigas do arquivo não servem mais
+        for old in [m for m in _MODELS if m[0] == dataset_id and m[1] != key[1]]:
+            del _MODELS[old]
+        _MODELS[key] = model
+        _MODELS.move_to_end(key)
+        while len(_MODELS) > CLUSTER_CACHE_SIZE:
+            _MODELS.popitem(last=False)
+
+
+def get_model(dataset_id, cols, k):
+    """
+    Retorna o ClusterModel de (dataset, colunas, k), ajustando só se não estiver
+    em cache. Levanta ValueError se não houver linhas completas suficientes.
+    """
+    model = cached_model(dataset_id, cols, k)
+    if model is not None:
+        return model
+    X, mask = load_matrix(dataset_id, cols)
+    if mask.sum() < k:
+        raise ValueError("dados insuficientes para clustering")
+    t0 = time.perf_counter()
+    fitted, algorithm = fit_kmeans(X[mask], k)
+    labels = np.full(X.shape[0], -1, dtype="int8")
+    labels[mask] = fitted.labels_
+    model = ClusterModel(
+        cols, k, fitted, labels, algorithm, time.perf_counter() - t0
+    )
+    store_model(dataset_id, model)
+    return model
+
+
+def _silhouette(X_sample, sample_labels):
+    if len(np.unique(sample_labels)) < 2:
+        return None
+    return float(silhouette_score(X_sample, sample_labels))
+
+
+def _fit_scored(X, k, sample_idx):
+    """
+    Ajusta um k da varredura (roda num worker do joblib) e calcula a silhueta
+    sobre as linhas da amostra.
+    """
+    t0 = time.perf_counter()
+    fitted, algorithm = fit_kmeans(X, k)
+    seconds = time.perf_counter() - t0
+    silhouette = _silhouette(X[sample_idx], fitted.labels_[sample_idx])
+    return k, fitted, algorithm, seconds, silhouette
+
+
+def sweep(dataset_id, cols, ks):
+    """
+    Ajusta KMeans para cada k de `ks` em paralelo. Os k já em cache só são
+    pontuados. Retorna {"scores": [...], "recommended_k": k, ...}; o k
+    recomendado é o de maior silhueta (no empate, o menor).
+    Levanta ValueError se não houver linhas completas suficientes.
+    """
+    X, mask = load_matrix(dataset_id, cols)
+    labels_rows = np.flatnonzero(mask)
+    X = X[mask]
+    if X.shape[0] <= max(ks):
+        raise ValueError("dados insuficientes para clustering")
+    rng = np.random.default_rng(RANDOM_STATE)
+    sample_idx = np.sort(
+        rng.choice(X.shape[0], min(X.shape[0], CLUSTER_SILHOUETTE_SAMPLE), replace=False)
+    )
+
+    t0 = time.perf_counter()
+    results = {}
+    todo = []
+    for k in ks:
+        model = cached_model(dataset_id, cols, k)
+        if model is None:
+            todo.append(k)
+            continue
+        if model.silhouette is None:
+            model.silhouette = _silhouette(
+                X[sample_idx], model.labels[labels_rows[sample_idx]]
+            )
+        results[k] = (model, model.silhouette, True)
+
+    workers = max(1, min(CLUSTER_SWEEP_WORKERS, len(todo)))
+    if todo:
+        fitted = Parallel(n_jobs=workers)(
+            delayed(_fit_scored)(X, k, sample_idx) for k in todo
+        )
+        for k, km, algorithm, seconds, silhouette in fitted:
+            labels = np.full(mask.size, -1, dtype="int8")
+            labels[mask] = km.labels_
+            model = ClusterModel(cols, k, km, labels, algorithm, seconds)
+            model.silhouette = silhouette
+            store_model(dataset_id, model)
+            results[k] = (model, silhouette, False)
+
+    scores = []
+    for k in ks:
+        model, silhouette, cached = results[k]
+        scores.append(
+            {
+                "k": k,
+                "inertia": model.inertia,
+                "silhouette": silhouette,
+                "fit_seconds": round(model.seconds, 4),
+                "cached": cached,
+            }
+        )
+    scored = [s for s in scores if s["silhouette"] is not None]
+    recommended = (
+        max(scored, key=lambda s: (s["silhouette"], -s["k"]))["k"] if scored else None
+    )
+    return {
+        "cols": list(cols),
+        "n_rows": int(X.shape[0]),
+        "silhouette_sample": int(sample_idx.size),
+        "workers": workers,
+        "seconds": round(time.perf_counter() - t0, 4),
+        "scores": scores,
+        "recommended_k": recommended,
+    }
+
+
+def sweep_figure(result):
+    """
+    Inércia (cotovelo) e silhueta por k, com o k recomendado destacado.
+    """
+    ks = [s["k"] for s in result["scores"]]
+    fig, ax = plt.subplots()
+    ax.plot(ks, [s["inertia"] for s in result["scores"]], "o-", color="tab:blue")
+    ax.set_xlabel("k")
+    ax.set_ylabel("Inércia", color="tab:blue")
+    ax2 = ax.twinx()
+    silhouettes = [
+        s["silhouette"] if s["silhouette"] is not None else np.nan
+        for s in result["scores"]
+    ]
+    ax2.plot(ks, silhouettes, "s--", color="tab:orange")
+    ax2.set_ylabel("Silhueta (amostra)", color="tab:orange")
+    if result["recommended_k"] is not None:
+        ax.axvline(result["recommended_k"], color="gray", linestyle=":")
+    ax.set_title("Escolha de k")
+    return fig
+
+
+def cluster_figure(dataset_id, model):
+    """
+    Gráfico dos clusters: dispersão colorida até CLUSTER_PLOT_POINTS pontos,
+    senão densidade (hexbin) com os centros marcados. Com mais de duas colunas,
+    os pontos são projetados nos dois primeiros componentes principais.
+    """
+    X, mask = load_matrix(dataset_id, model.cols)
+    X = X[mask]
+    labels = model.labels[mask]
+    centers = model.centers
+    xlabel, ylabel = model.cols[0], model.cols[1]
+    if len(model.cols) > 2:
+        rng = np.random.default_rng(RANDOM_STATE)
+        fit_rows = rng.choice(X.shape[0], min(X.shape[0], CLUSTER_INIT_SAMPLE), replace=False)
+        pca = PCA(n_components=2, random_state=RANDOM_STATE).fit(X[fit_rows])
+        X, centers = pca.transform(X), pca.transform(centers)
+        xlabel, ylabel = "PC1", "PC2"
+
+    fig, ax = plt.subplots()
+    colors = plt.get_cmap("tab10", model.k)
+    if X.shape[0] <= CLUSTER_PLOT_POINTS:
+        for label in range(model.k):
+            points = X[labels == label]
+            ax.scatter(
+                points[:, 0], points[:, 1], label=f"Cluster {label}", color=colors(label)
+            )
+    else:
+        hb = ax.hexbin(X[:, 0], X[:, 1], gridsize=60, bins="log", cmap="Greys")
+        fig.colorbar(hb, ax=ax, label="pontos (log)")
+        for label in range(model.k):
+            ax.scatter(
+                centers[label, 0],
+                centers[label, 1],
+                marker="X",
+                s=120,
+                edgecolor="black",
+                label=f"Cluster {label}",
+                color=colors(label),
+            )
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend()
+    return fig
+
+
+def plot_mode(model):
+    return "scatter" if model.n_rows <= CLUSTER_PLOT_POINTS else "density"
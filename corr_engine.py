@@ -0,0 +1,315 @@
+"""
+corr_engine.py
+
+Matriz de correlação de Pearson a partir de estatísticas suficientes.
+Para cada par de colunas (i, j), considerando só as linhas em que ambas têm
+valor (como o df.corr() do pandas), acumula contagem, somas, somas de quadrados
+e produtos cruzados. Com X0 = valores (NaN -> 0) e M = máscara de presença:
+
+    N = MᵀM    Sx = X0ᵀM    Sxx = (X0²)ᵀM    P = X0ᵀX0
+
+As somas são acumuladas por blocos de linhas (multiplicações de matrizes com
+memória limitada), então novas linhas entram com update() sem recalcular tudo,
+e a correlação de qualquer subconjunto de colunas sai das mesmas matrizes.
+top_pairs() acha os pares mais correlacionados varrendo a matriz em faixas,
+sem montá-la inteira; Spearman usa as mesmas contas sobre os postos.
+As estatísticas de cada dataset ficam em cache (memória + arquivo .npz em
+EDA_CORR_DIR) e são compartilhadas por /api/correlation, quick_summary e
+agent_autoinsight.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import DATA_DIR, dataset_dtypes, dataset_path, load_dataset
+
+CORR_DIR = os.environ.get("EDA_CORR_DIR", os.path.join(DATA_DIR, "stats"))
+os.makedirs(CORR_DIR, exist_ok=True)
+
+# Memória máxima (MB) dos blocos de linhas convertidos para float64
+CORR_BLOCK_MB = float(os.environ.get("EDA_CORR_BLOCK_MB", "128"))
+# Células por faixa da matriz em top_pairs (limita a memória da busca)
+CORR_TOP_BLOCK_CELLS = int(os.environ.get("EDA_CORR_TOP_BLOCK_CELLS", "4000000"))
+# Quantos datasets manter em memória
+CORR_CACHE_SIZE = int(os.environ.get("EDA_CORR_CACHE_SIZE", "16"))
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def numeric_columns(dtypes):
+    """
+    Colunas numéricas a partir de uma Series coluna -> dtype.
+    """
+    return [c for c, t in dtypes.items() if pd.api.types.is_numeric_dtype(t)]
+
+
+def _as_matrix(df, cols):
+    if not cols:
+        return np.empty((len(df), 0))
+    return np.column_stack(
+        [df[c].to_numpy(dtype="float64", na_value=np.nan) for c in cols]
+    )
+
+
+class CorrelationStats:
+    """
+    Estatísticas suficientes (pareadas) para a correlação de Pearson.
+    """
+
+    def __init__(self, cols):
+        k = len(cols)
+        self.cols = list(cols)
+        self.index = {c: i for i, c in enumerate(self.cols)}
+        self.n_rows = 0
+        self.mtime = None
+        # deslocamento fixo por coluna (média do primeiro bloco): evita perda
+        # de precisão nas somas quando os valores têm média grande
+        self.shift = None
+        self.N = np.zeros((k, k))
+        self.Sx = np.zeros((k, k))
+        self.Sxx = np.zeros((k, k))
+        self.P = np.zeros((k, k))
+
+    @classmethod
+    def from_frame(cls, df, cols=None):
+        """
+        Calcula as estatísticas de um DataFrame (por padrão, das colunas numéricas).
+        """
+        stats = cls(cols if cols is not None else numeric_columns(df.dtypes))
+        return stats.update(df)
+
+    def block_rows(self):
+        """
+        Linhas por bloco para caber em CORR_BLOCK_MB (X0, máscara e quadrados).
+        """
+        per_row = 8 * 3 * max(1, len(self.cols))
+        return max(1, int(CORR_BLOCK_MB * 1024 * 1024 // per_row))
+
+    def update(self, df):
+        """
+        Acumula as linhas de df (novas linhas do dataset). Retorna o próprio objeto.
+        """
+        step = self.block_rows()
+        for start in range(0, len(df), step):
+            self._update_block(_as_matrix(df.iloc[start : start + step], self.cols))
+        return self
+
+    def _update_block(self, X):
+        if X.shape[0] == 0:
+            return
+        mask = ~np.isnan(X)
+        if self.shift is None:
+            counts = mask.sum(axis=0)
+            sums = np.where(mask, X, 0.0).sum(axis=0)
+            self.shift = np.divide(
+                sums, counts, out=np.zeros(X.shape[1]), where=counts > 0
+            )
+        X0 = np.where(mask, X - self.shift, 0.0)
+        self.P += X0.T @ X0
+        if mask.all():
+            # bloco sem missing: as somas pareadas são as somas de cada coluna
+            self.N += X.shape[0]
+            self.Sx += X0.sum(axis=0)[:, None]
+            self.Sxx += (X0 * X0).sum(axis=0)[:, None]
+        else:
+            M = mask.astype("float64")
+            self.N += M.T @ M
+            self.Sx += X0.T @ M
+            self.Sxx += (X0 * X0).T @ M
+        self.n_rows += X.shape[0]
+
+    def merge(self, other):
+        """
+        Soma as estatísticas de outro bloco de linhas com as mesmas colunas.
+        """
+        if other.cols != self.cols:
+            raise ValueError("colunas diferentes")
+        if self.shift is None:
+            self.shift = other.shift
+        elif other.shift is not None and not np.array_equal(self.shift, other.shift):
+            raise ValueError("deslocamentos diferentes")
+        for name in ("N", "Sx", "Sxx", "P"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.n_rows += other.n_rows
+        return self
+
+    def _corr_block(self, rows, cols):
+        """
+        Bloco r[rows, cols] da matriz de correlação (índices inteiros).
+        """
+        sel = np.ix_(rows, cols)
+        selT = np.ix_(cols, rows)
+        N, Sx, Sxx, P = self.N[sel], self.Sx[sel], self.Sxx[sel], self.P[sel]
+        # Sx[i, j] é a soma de x_i nas linhas em que x_i e x_j existem
+        SxT = self.Sx[selT].T
+        cov = N * P - Sx * SxT
+        var_a = np.clip(N * Sxx - Sx * Sx, 0.0, None)
+        var_b = np.clip(N * self.Sxx[selT].T - SxT * SxT, 0.0, None)
+        denom = np.sqrt(var_a * var_b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(denom > 0, cov / denom, np.nan)
+        return np.clip(r, -1.0, 1.0)
+
+    def corr(self, cols=None):
+        """
+        Matriz de correlação (DataFrame) das colunas pedidas, sem reler os dados.
+        """
+        cols = self.cols if cols is None else list(cols)
+        idx = np.array([self.index[c] for c in cols], dtype=int)
+        r = self._corr_block(idx, idx)
+        diag = np.arange(len(cols))
+        r[diag, diag] = np.where(np.isnan(r[diag, diag]), np.nan, 1.0)
+        return pd.DataFrame(r, index=cols, columns=cols)
+
+    def top_pairs(self, k=10, block=None):
+        """
+        Os k pares de colunas com maior correlação absoluta.
+        Percorre a matriz em faixas de `block` linhas (só o triângulo superior),
+        guardando apenas os k melhores candidatos: a memória fica em
+        O(block x colunas) e a matriz inteira nunca é montada.
+        Retorna lista de dicts {a, b, r, n}, do par mais forte ao mais fraco.
+        """
+        n_cols = len(self.cols)
+        if block is None:
+            block = max(1, CORR_TOP_BLOCK_CELLS // max(1, n_cols))
+        best_r = np.empty(0)
+        best_i = np.empty(0, dtype=int)
+        best_j = np.empty(0, dtype=int)
+        for start in range(0, n_cols - 1, block):
+            rows = np.arange(start, min(start + block, n_cols - 1))
+            cols = np.arange(start + 1, n_cols)
+            r = self._corr_block(rows, cols)
+            # só j > i (triângulo superior, sem a diagonal)
+            r[rows[:, None] >= cols[None, :]] = np.nan
+            score = np.nan_to_num(np.abs(r), nan=-1.0).ravel()
+            take = min(k, score.size)
+            cand = np.argpartition(score, score.size - take)[score.size - take :]
+            cand = cand[score[cand] >= 0]
+            ii, jj = np.divmod(cand, cols.size)
+            best_r = np.concatenate([best_r, r.ravel()[cand]])
+            best_i = np.concatenate([best_i, rows[ii]])
+            best_j = np.concatenate([best_j, cols[jj]])
+            if best_r.size > k:
+                keep = np.argpartition(np.abs(best_r), best_r.size - k)[best_r.size - k :]
+                best_r, best_i, best_j = best_r[keep], best_i[keep], best_j[keep]
+        order = np.argsort(-np.abs(best_r), kind="stable")
+        return [
+            {
+                "a": self.cols[best_i[o]],
+                "b": self.cols[best_j[o]],
+                "r": float(best_r[o]),
+                "n": int(self.N[best_i[o], best_j[o]]),
+            }
+            for o in order
+        ]
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            cols=np.array(self.cols, dtype=str),
+            n_rows=self.n_rows,
+            mtime=self.mtime if self.mtime is not None else np.nan,
+            shift=self.shift if self.shift is not None else np.zeros(len(self.cols)),
+            N=self.N,
+            Sx=self.Sx,
+            Sxx=self.Sxx,
+            P=self.P,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            stats = cls(data["cols"].tolist())
+            stats.n_rows = int(data["n_rows"])
+            stats.mtime = float(data["mtime"])
+            stats.shift = data["shift"]
+            stats.N, stats.Sx, stats.Sxx, stats.P = (
+                data["N"],
+                data["Sx"],
+                data["Sxx"],
+                data["P"],
+            )
+        return stats
+
+
+# método -> sufixo do arquivo .npz
+CORR_METHODS = {"pearson": "corr", "spearman": "spearman"}
+
+
+def rank_frame(df, cols):
+    """
+    Postos (média nos empates) de cada coluna, ignorando os NaN: a correlação
+    de Pearson dos postos é a de Spearman. Com missing, o posto é calculado
+    sobre todos os valores da coluna, não só sobre as linhas do par (pequena
+    diferença em relação ao df.corr(method="spearman")).
+    """
+    return pd.DataFrame({c: df[c].rank() for c in cols})
+
+
+def stats_file(dataset_id, method="pearson"):
+    return os.path.join(CORR_DIR, f"{dataset_id}.{CORR_METHODS[method]}.npz")
+
+
+def dataset_stats(dataset_id, df=None, method="pearson"):
+    """
+    Estatísticas de correlação (pearson ou spearman) das colunas numéricas
+    de um dataset. Procura no cache em memória, depois no .npz; só então lê
+    os dados (ou usa `df`, se já carregado). Retorna None se o dataset não existir.
+    """
+    path = dataset_path(dataset_id)
+    if path is None:
+        return None
+    mtime = os.path.getmtime(path)
+    key = (dataset_id, method)
+    with _CACHE_LOCK:
+        stats = _CACHE.get(key)
+        if stats is not None and stats.mtime == mtime:
+            _CACHE.move_to_end(key)
+            return stats
+
+    stats = None
+    sidecar = stats_file(dataset_id, method)
+    if os.path.exists(sidecar):
+        try:
+            stats = CorrelationStats.load(sidecar)
+        except Exception:
+            stats = None
+        if stats is not None and stats.mtime != mtime:
+            # o arquivo de dados foi regravado depois do cálculo
+            stats = None
+    if stats is None:
+        if df is None:
+            cols = numeric_columns(dataset_dtypes(dataset_id))
+            df = load_dataset(dataset_id, columns=cols)
+        else:
+            cols = numeric_columns(df.dtypes)
+        if method == "spearman":
+            df = rank_frame(df, cols)
+        stats = CorrelationStats.from_frame(df, cols)
+        stats.mtime = mtime
+        stats.save(sidecar)
+
+    with _CACHE_LOCK:
+        _CACHE[key] = stats
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CORR_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return stats
+
+
+def dataset_corr(dataset_id, cols=None, df=None):
+    """
+    Matriz de correlação (DataFrame) de um dataset, opcionalmente de um
+    subconjunto de colunas numéricas. Retorna None se o dataset não existir.
+    """
+    stats = dataset_stats(dataset_id, df=df)
+    if stats is None:
+        return None
+    return stats.corr(cols)
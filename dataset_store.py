@@ -0,0 +1,383 @@
+"""
+dataset_store.py
+
+Acesso aos datasets salvos em DATA_DIR.
+Os uploads são gravados em formato colunar tipado (Parquet por padrão, ou Feather),
+o que permite ler só as colunas que cada endpoint precisa. O CSV continua
+disponível sob demanda via export_csv(). Datasets antigos em .csv são migrados
+na primeira leitura ou em lote com `python dataset_store.py --migrate`.
+
+Mantém um cache LRU em memória de DataFrames já lidos, limitado por bytes,
+chaveado por dataset_id + mtime do arquivo (um arquivo reescrito invalida a entrada).
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_ARROW = True
+except Exception:
+    HAS_ARROW = False
+
+DATA_DIR = os.environ.get("EDA_DATA_DIR", "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Limite do cache de DataFrames em MB (0 desativa o cache)
+CACHE_MAX_MB = float(os.environ.get("EDA_CACHE_MAX_MB", "512"))
+
+# Formato de armazenamento dos uploads: parquet, feather ou csv
+STORAGE_FORMAT = os.environ.get("EDA_STORAGE_FORMAT", "parquet").lower()
+
+COLUMNAR_EXTS = {"parquet": ".parquet", "feather": ".feather"}
+
+
+class DataFrameCache:
+    """
+    Cache LRU de DataFrames limitado pelo uso de memória (bytes).
+    Os DataFrames devolvidos são compartilhados: trate-os como somente leitura.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def lookup(self, keys):
+        """
+        Procura a primeira chave presente em `keys` (conta um único hit ou miss).
+        Retorna (chave encontrada, DataFrame) ou (None, None).
+        """
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return key, entry[0]
+            self.misses += 1
+            return None, None
+
+    def put(self, key, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            # maior que o cache inteiro: não vale a pena guardar
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (df, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, size) = self._entries.popitem(last=False)
+                self.current_bytes -= size
+                self.evictions += 1
+
+    def invalidate(self, dataset_id, keep_mtime=None):
+        """
+        Remove as entradas de um dataset (exceto as da versão keep_mtime, se informada).
+        """
+        with self._lock:
+            for key in [
+                k
+                for k in self._entries
+                if k[0] == dataset_id and (keep_mtime is None or k[1] != keep_mtime)
+            ]:
+                _, size = self._entries.pop(key)
+                self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+DF_CACHE = DataFrameCache(CACHE_MAX_MB * 1024 * 1024)
+
+
+def csv_path(dataset_id):
+    """
+    Caminho do CSV de um dataset (legado ou exportado).
+    """
+    return os.path.join(DATA_DIR, f"{dataset_id}.csv")
+
+
+def _columnar_path(dataset_id):
+    """
+    Caminho do arquivo colunar existente de um dataset, ou None.
+    """
+    for ext in COLUMNAR_EXTS.values():
+        path = os.path.join(DATA_DIR, f"{dataset_id}{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def dataset_path(dataset_id):
+    """
+    Caminho do arquivo de dados de um dataset (colunar se houver, senão CSV).
+    Retorna None se o dataset não existir.
+    """
+    if not dataset_id:
+        return None
+    path = _columnar_path(dataset_id)
+    if path:
+        return path
+    path = csv_path(dataset_id)
+    return path if os.path.exists(path) else None
+
+
+def dataset_exists(dataset_id):
+    return dataset_path(dataset_id) is not None
+
+
+def dataset_mtime(dataset_id):
+    """
+    mtime do arquivo de dados (versão do dataset), ou None se não existir.
+    """
+    path = dataset_path(dataset_id)
+    return os.path.getmtime(path) if path else None
+
+
+def _write_frame(df, dataset_id, fmt, csv_fallback=True):
+    """
+    Grava o DataFrame no formato pedido e retorna o caminho.
+    Se o formato colunar falhar, grava CSV (ou, com csv_fallback=False,
+    retorna None sem gravar nada).
+    """
+    if fmt in COLUMNAR_EXTS and HAS_ARROW:
+        path = os.path.join(DATA_DIR, f"{dataset_id}{COLUMNAR_EXTS[fmt]}")
+        tmp = path + ".tmp"
+        try:
+            if fmt == "parquet":
+                df.to_parquet(tmp, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(tmp)
+            os.replace(tmp, path)
+            return path
+        except Exception:
+            # tipos mistos em colunas object etc.: cai para CSV
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if not csv_fallback:
+                return None
+    path = csv_path(dataset_id)
+    df.to_csv(path, index=False)
+    return path
+
+
+def save_dataset(dataset_id, df):
+    """
+    Salva um dataset no formato de armazenamento configurado e já o coloca no cache.
+    Retorna o caminho do arquivo gravado.
+    """
+    path = _write_frame(df, dataset_id, STORAGE_FORMAT)
+    if not path.endswith(".csv"):
+        # a exportação CSV antiga (se houver) ficou desatualizada
+        if os.path.exists(csv_path(dataset_id)):
+            os.remove(csv_path(dataset_id))
+    df = df.reset_index(drop=True)
+    mtime = os.path.getmtime(path)
+    DF_CACHE.invalidate(dataset_id)
+    DF_CACHE.put((dataset_id, mtime, None), df)
+    return path
+
+
+def _failed_migration_path(dataset_id):
+    return os.path.join(DATA_DIR, f"{dataset_id}.nomigrate")
+
+
+def _migration_failed(dataset_id):
+    """
+    True se a migração deste CSV (mesmo mtime) já falhou antes.
+    """
+    try:
+        with open(_failed_migration_path(dataset_id), encoding="utf-8") as fh:
+            return fh.read() == repr(os.path.getmtime(csv_path(dataset_id)))
+    except OSError:
+        return False
+
+
+def migrate_dataset(dataset_id):
+    """
+    Converte um dataset legado (.csv) para o formato colunar.
+    O CSV original é mantido e passa a servir como exportação.
+    Se a conversão falhar (tipos mistos etc.), o CSV não é tocado e a falha
+    fica registrada em <dataset_id>.nomigrate (com o mtime do CSV), para que
+    as leituras seguintes não tentem de novo até o CSV mudar.
+    Retorna o novo caminho, ou None se não havia o que migrar.
+    """
+    if STORAGE_FORMAT not in COLUMNAR_EXTS or not HAS_ARROW:
+        return None
+    if _columnar_path(dataset_id) or not os.path.exists(csv_path(dataset_id)):
+        return None
+    if _migration_failed(dataset_id):
+        return None
+    mtime = os.path.getmtime(csv_path(dataset_id))
+    df = pd.read_csv(csv_path(dataset_id))
+    path = _write_frame(df, dataset_id, STORAGE_FORMAT, csv_fallback=False)
+    if path is None:
+        with open(_failed_migration_path(dataset_id), "w", encoding="utf-8") as fh:
+            fh.write(repr(mtime))
+        return None
+    if os.path.exists(_failed_migration_path(dataset_id)):
+        os.remove(_failed_migration_path(dataset_id))
+    # mantém o CSV com mtime >= ao do arquivo colunar para continuar valendo como export
+    os.utime(csv_path(dataset_id))
+    return path
+
+
+def migrate_data_dir():
+    """
+    Migra todos os datasets .csv de DATA_DIR para o formato colunar.
+    Retorna a lista de dataset_ids migrados.
+    """
+    migrated = []
+    for name in sorted(os.listdir(DATA_DIR)):
+        if not name.endswith(".csv"):
+            continue
+        dataset_id = name[: -len(".csv")]
+        try:
+            if migrate_dataset(dataset_id):
+                migrated.append(dataset_id)
+        except Exception as e:
+            print(f"Falha ao migrar {dataset_id}: {e}")
+    return migrated
+
+
+def widen_frame(df):
+    """
+    Devolve as colunas numéricas estreitas (int8/16/32, float32) a int64/float64,
+    para que as contas sobre elas (ex.: v * v) não estourem nem percam precisão.
+    """
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or not pd.api.types.is_numeric_dtype(s):
+            continue
+        if s.dtype.itemsize >= 8:
+            continue
+        nullable = pd.api.types.is_extension_array_dtype(s)
+        if pd.api.types.is_integer_dtype(s):
+            df[col] = s.astype("Int64" if nullable else "int64")
+        elif pd.api.types.is_float_dtype(s):
+            df[col] = s.astype("Float64" if nullable else "float64")
+    return df
+
+
+def _read_frame(path, columns=None):
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+    elif path.endswith(".feather"):
+        df = pd.read_feather(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    # arquivos gravados quando a ingestão guardava os tipos reduzidos
+    return widen_frame(df)
+
+
+def dataset_dtypes(dataset_id):
+    """
+    Retorna uma Series coluna -> dtype do dataset sem ler os dados
+    (para arquivos colunares basta o esquema do arquivo). None se não existir.
+    """
+    path = dataset_path(dataset_id)
+    if path is None:
+        return None
+    if path.endswith(".csv") and migrate_dataset(dataset_id):
+        path = dataset_path(dataset_id)
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).empty_table().to_pandas().dtypes
+    if path.endswith(".feather"):
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+        return schema.empty_table().to_pandas().dtypes
+    return load_dataset(dataset_id).dtypes
+
+
+def load_dataset(dataset_id, columns=None):
+    """
+    Lê o DataFrame de um dataset passando pelo cache LRU.
+    Com `columns`, lê apenas essas colunas do arquivo colunar.
+    Retorna None se o dataset não existir.
+    """
+    path = dataset_path(dataset_id)
+    if path is None:
+        return None
+    if path.endswith(".csv") and migrate_dataset(dataset_id):
+        path = dataset_path(dataset_id)
+    mtime = os.path.getmtime(path)
+    cols_key = tuple(columns) if columns is not None else None
+    key = (dataset_id, mtime, cols_key)
+    # um DataFrame completo já em cache atende qualquer subconjunto de colunas
+    found, df = DF_CACHE.lookup([key, (dataset_id, mtime, None)])
+    if found is not None and found != key:
+        return df[list(cols_key)]
+    if df is None:
+        df = _read_frame(path, columns=list(cols_key) if cols_key else None)
+        # versões antigas do arquivo (mtime diferente) não servem mais
+        DF_CACHE.invalidate(dataset_id, keep_mtime=mtime)
+        DF_CACHE.put(key, df)
+    return df
+
+
+def export_csv(dataset_id):
+    """
+    Gera (ou reaproveita) a exportação CSV de um dataset e retorna o caminho.
+    Retorna None se o dataset não existir.
+    """
+    path = dataset_path(dataset_id)
+    if path is None:
+        return None
+    out = csv_path(dataset_id)
+    if path == out:
+        return out
+    if not os.path.exists(out) or os.path.getmtime(out) < os.path.getmtime(path):
+        tmp = out + ".tmp"
+        load_dataset(dataset_id).to_csv(tmp, index=False)
+        os.replace(tmp, out)
+    return out
+
+
+if __name__ == "__main__":
+    if "--migrate" in sys.argv:
+        done = migrate_data_dir()
+        print(f"{len(done)} dataset(s) migrado(s) para {STORAGE_FORMAT}.")
+    else:
+        print("Uso: python dataset_store.py --migrate")
@@ -4,7 +4,8 @@ import time
 import json
 import base64
 import uuid
-import sqlite3
+import tempfile
+import numpy as np
 import pandas as pd
 import matplotlib
 
@@ -12,66 +13,184 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
 
+from persistence import DB_PATH, Database
+from corr_engine import CorrelationStats, dataset_corr
+from sketches import QuantileSketch, build_sketch
+from dataset_store import widen_frame
+from plot_cache import fig_to_png, plot_key, plot_file, plot_url, store_png
+from plot_pool import (
+    PLOT_WORKERS,
+    boxplot_figure,
+    correlation_figure,
+    histogram_figure,
+    render_many,
+)
 
-# Caminho do banco de dados SQLite (persistência dos metadados e histórico)
-DB_PATH = os.environ.get("EDA_DB_PATH", "db/memory.db")
-os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
 
+# Ingestão de CSV: tamanho dos blocos de cópia/leitura e diretório temporário
+INGEST_BLOCK_BYTES = 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+INGEST_CHUNK_ROWS = int(os.environ.get("EDA_INGEST_CHUNK_ROWS", "200000"))
+INGEST_TMP_DIR = os.environ.get("EDA_INGEST_TMP_DIR") or None
 
-def init_db(db_path=DB_PATH):
+# Memória máxima (bytes) usada por bloco de colunas em infer_schema
+SCHEMA_BLOCK_BYTES = int(os.environ.get("EDA_SCHEMA_BLOCK_MB", "256")) * 1024 * 1024
+
+# Prévia amostrada para datasets grandes: a partir de quantas linhas, tamanho
+# máximo da amostra (em células = linhas x colunas) e orçamento de tempo em segundos
+PREVIEW_MIN_ROWS = int(os.environ.get("EDA_PREVIEW_MIN_ROWS", "1000000"))
+PREVIEW_SAMPLE_CELLS = int(os.environ.get("EDA_PREVIEW_SAMPLE_CELLS", "5000000"))
+PREVIEW_BUDGET_S = float(os.environ.get("EDA_PREVIEW_BUDGET_S", "2.0"))
+
+# Caracteres da resposta guardados no resumo do histórico (a inteira vai em full_response)
+QUERY_SUMMARY_CHARS = 2000
+
+
+def create_tables(db):
     """
-    Inicializa o banco SQLite e garante as tabelas necessárias.
+    Cria as tabelas na forma original (versão 0 do esquema); as mudanças
+    posteriores ficam em MIGRATIONS.
     """
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    cur = conn.cursor()
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS datasets (
-        dataset_id TEXT PRIMARY KEY,
-        name TEXT,
-        uploaded_at TEXT,
-        n_rows INTEGER,
-        n_cols INTEGER,
-        filepath TEXT,
-        schema_json TEXT
-    )"""
-    )
-    cur.execute(
+    with db.transaction() as conn:
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS datasets (
+            dataset_id TEXT PRIMARY KEY,
+            name TEXT,
+            uploaded_at TEXT,
+            n_rows INTEGER,
+            n_cols INTEGER,
+            filepath TEXT,
+            schema_json TEXT
+        )"""
+        )
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS queries (
+            query_id TEXT PRIMARY KEY,
+            dataset_id TEXT,
+            question TEXT,
+            response_summary TEXT,
+            raw_response TEXT,
+            created_at TEXT,
+            source TEXT
+        )"""
+        )
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS insights (
+            insight_id TEXT PRIMARY KEY,
+            dataset_id TEXT,
+            created_at TEXT,
+            text TEXT,
+            important INTEGER DEFAULT 0
+        )"""
+        )
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS dataset_summaries (
+            dataset_id TEXT PRIMARY KEY,
+            created_at TEXT,
+            summary_json TEXT
+        )"""
+        )
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS column_sketches (
+            dataset_id TEXT,
+            col TEXT,
+            sketch_json TEXT,
+            PRIMARY KEY (dataset_id, col)
+        )"""
+        )
+
+
+def _add_column(conn, table, column, decl):
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migrate_created_ts(conn):
+    """
+    v1: created_ts (segundos desde 1970, REAL) em queries e insights, preenchido
+    a partir do created_at em texto (hora local), e índices (dataset_id, created_ts)
+    para as listagens por dataset ordenadas por data.
+    """
+    for table in ("queries", "insights"):
+        _add_column(conn, table, "created_ts", "REAL")
+        conn.execute(
+            f"UPDATE {table} SET created_ts = CAST(strftime('%s', created_at, 'utc') AS REAL) "
+            "WHERE created_ts IS NULL"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_dataset_ts ON {table} (dataset_id, created_ts)"
+        )
+
+
+def _migrate_llm_cache(conn):
+    """
+    v2: cache persistente das respostas do LLM (ver llm_cache.py), com índice
+    por último uso para a remoção das entradas menos usadas.
+    """
+    conn.execute(
         """
-    CREATE TABLE IF NOT EXISTS queries (
-        query_id TEXT PRIMARY KEY,
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
         dataset_id TEXT,
-        question TEXT,
-        response_summary TEXT,
-        raw_response TEXT,
-        created_at TEXT,
-        source TEXT
+        dataset_version TEXT,
+        response TEXT,
+        size INTEGER,
+        created_ts REAL,
+        last_hit_ts REAL,
+        hits INTEGER DEFAULT 0
     )"""
     )
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS insights (
-        insight_id TEXT PRIMARY KEY,
-        dataset_id TEXT,
-        created_at TEXT,
-        text TEXT,
-        important INTEGER DEFAULT 0
-    )"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit_ts)"
     )
-    conn.commit()
-    return conn
 
 
-DB_CONN = init_db()
+def _migrate_full_response(conn):
+    """
+    v3: full_response em queries, com a resposta inteira (response_summary e
+    raw_response guardam só QUERY_SUMMARY_CHARS caracteres); nas linhas antigas
+    fica NULL.
+    """
+    _add_column(conn, "queries", "full_response", "TEXT")
+
 
+# Migrações do esquema, aplicadas em ordem conforme o PRAGMA user_version
+MIGRATIONS = [
+    (1, _migrate_created_ts),
+    (2, _migrate_llm_cache),
+    (3, _migrate_full_response),
+]
 
-def save_dataset_metadata(dataset_id, name, df, filepath):
+
+def init_db(db_path=DB_PATH):
+    """
+    Inicializa o banco SQLite, garante as tabelas e aplica as migrações pendentes.
+    Retorna o Database (persistence) usado por todo o projeto.
+    """
+    db = Database(db_path)
+    create_tables(db)
+    db.migrate(MIGRATIONS)
+    return db
+
+
+DB = init_db()
+
+
+def save_dataset_metadata(dataset_id, name, df, filepath, schema=None):
     """
     Salva ou atualiza metadados do dataset na tabela datasets.
+    Aceita o esquema já calculado para não inferi-lo de novo.
     """
-    cur = DB_CONN.cursor()
-    schema = infer_schema(df)
-    cur.execute(
+    if schema is None:
+        schema = infer_schema(df)
+    DB.write(
         "REPLACE INTO datasets (dataset_id,name,uploaded_at,n_rows,n_cols,filepath,schema_json) VALUES (?,?,?,?,?,?,?)",
         (
             dataset_id,
@@ -83,34 +202,294 @@ def save_dataset_metadata(dataset_id, name, df, filepath):
             json.dumps(schema),
         ),
     )
-    DB_CONN.commit()
+
+
+def load_dataset_metadata(dataset_id):
+    """
+    Lê os metadados de um dataset (incluindo o esquema salvo no upload).
+    Retorna None se o dataset não estiver registrado.
+    """
+    row = DB.query_one(
+        "SELECT name, uploaded_at, n_rows, n_cols, filepath, schema_json FROM datasets WHERE dataset_id=?",
+        (dataset_id,),
+    )
+    if row is None:
+        return None
+    return {
+        "dataset_id": dataset_id,
+        "name": row[0],
+        "uploaded_at": row[1],
+        "n_rows": row[2],
+        "n_cols": row[3],
+        "filepath": row[4],
+        "schema": json.loads(row[5]) if row[5] else None,
+    }
+
+
+def save_dataset_summary(dataset_id, summary):
+    """
+    Persiste o resumo pré-calculado (esquema, gráficos, correlação) de um dataset.
+    """
+    DB.write(
+        "REPLACE INTO dataset_summaries (dataset_id, created_at, summary_json) VALUES (?,?,?)",
+        (dataset_id, time.strftime("%Y-%m-%d %H:%M:%S"), json.dumps(summary)),
+    )
+
+
+def load_dataset_summary(dataset_id):
+    """
+    Lê o resumo pré-calculado de um dataset, ou None se ainda não existir.
+    """
+    row = DB.query_one(
+        "SELECT summary_json FROM dataset_summaries WHERE dataset_id=?", (dataset_id,)
+    )
+    return json.loads(row[0]) if row else None
+
+
+def build_column_sketches(df):
+    """
+    Constrói um sketch de quantis para cada coluna numérica do DataFrame.
+    """
+    sketches = {}
+    for col in df.select_dtypes(include=[np.number]).columns:
+        sketches[col] = build_sketch(df[col].to_numpy(dtype="float64", na_value=np.nan))
+    return sketches
+
+
+def save_column_sketches(dataset_id, sketches):
+    """
+    Persiste os sketches de quantis ({coluna: QuantileSketch}) de um dataset.
+    """
+    DB.write_many(
+        "REPLACE INTO column_sketches (dataset_id, col, sketch_json) VALUES (?,?,?)",
+        [
+            (dataset_id, col, json.dumps(sketch.to_dict()))
+            for col, sketch in sketches.items()
+        ],
+    )
+
+
+def load_column_sketch(dataset_id, col):
+    """
+    Lê o sketch de quantis de uma coluna, ou None se não houver.
+    """
+    row = DB.query_one(
+        "SELECT sketch_json FROM column_sketches WHERE dataset_id=? AND col=?",
+        (dataset_id, col),
+    )
+    return QuantileSketch.from_dict(json.loads(row[0])) if row else None
+
+
+def save_insights(dataset_id, texts):
+    """
+    Grava vários insights de um dataset num único executemany (um commit).
+    Os created_ts crescem com a posição, preservando a ordem da lista.
+    Retorna os ids gerados.
+    """
+    now = time.time()
+    created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+    rows = [
+        (str(uuid.uuid4()), dataset_id, created_at, text, 0, now + i * 1e-6)
+        for i, text in enumerate(texts)
+    ]
+    if rows:
+        DB.write_many(
+            "INSERT INTO insights (insight_id, dataset_id, created_at, text, "
+            "important, created_ts) VALUES (?,?,?,?,?,?)",
+            rows,
+        )
+    return [r[0] for r in rows]
+
+
+def set_insights_important(insight_ids, important=True, wait=True):
+    """
+    Marca (ou desmarca) vários insights num único executemany.
+    Retorna quantos mudaram (ou o Future, com wait=False).
+    """
+    if important:
+        return mark_insights(insight_ids, (), wait=wait)
+    return mark_insights((), insight_ids, wait=wait)
+
+
+def mark_insights(mark, unmark, wait=True):
+    """
+    Marca os insights de `mark` e desmarca os de `unmark` num único
+    executemany: um só item da fila de escrita, logo uma só transação.
+    Retorna quantos mudaram (ou o Future, com wait=False).
+    """
+    rows = [(1, iid) for iid in mark] + [(0, iid) for iid in unmark]
+    return DB.write_many("UPDATE insights SET important=? WHERE insight_id=?", rows, wait=wait)
+
+
+def load_insights(dataset_ids, offset=0, limit=None, important=None):
+    """
+    Insights de um ou mais datasets, em ordem de criação, paginados.
+    Retorna (lista de dicts, total sem paginação).
+    """
+    marks = ",".join("?" * len(dataset_ids))
+    where = f"dataset_id IN ({marks})"
+    params = list(dataset_ids)
+    if important is not None:
+        where += " AND important=?"
+        params.append(int(bool(important)))
+    total = DB.query_one(f"SELECT COUNT(*) FROM insights WHERE {where}", params)[0]
+    rows = DB.query(
+        "SELECT insight_id, dataset_id, text, important, created_at FROM insights "
+        f"WHERE {where} ORDER BY created_ts, insight_id LIMIT ? OFFSET ?",
+        params + [-1 if limit is None else limit, offset],
+    )
+    items = [
+        {
+            "id": r[0],
+            "dataset_id": r[1],
+            "text": r[2],
+            "important": bool(r[3]),
+            "created_at": r[4],
+        }
+        for r in rows
+    ]
+    return items, total
 
 
 def save_query(dataset_id, question, response, raw, source):
     """
     Salva uma pergunta e resposta no histórico (tabela queries).
     """
-    cur = DB_CONN.cursor()
     qid = str(uuid.uuid4())
-    cur.execute(
-        "INSERT INTO queries VALUES (?,?,?,?,?,?,?)",
+    now = time.time()
+    DB.write(
+        "INSERT INTO queries (query_id, dataset_id, question, response_summary, "
+        "raw_response, created_at, source, created_ts, full_response) "
+        "VALUES (?,?,?,?,?,?,?,?,?)",
         (
             qid,
             dataset_id,
             question,
-            response[:2000],
-            raw[:2000],
-            time.strftime("%Y-%m-%d %H:%M:%S"),
+            response[:QUERY_SUMMARY_CHARS],
+            raw[:QUERY_SUMMARY_CHARS],
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
             source,
+            now,
+            response,
         ),
     )
-    DB_CONN.commit()
     return qid
 
 
 def infer_schema(df):
     """
     Infere o esquema de um DataFrame: tipos, missing, amostras, estatísticas.
+    As colunas numéricas são processadas em lote, sobre blocos da matriz NumPy:
+    uma ordenação por bloco fornece min, max, mediana e únicos, e
+    média/desvio padrão saem de somas vetorizadas.
+    """
+    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    try:
+        numeric_info = _numeric_schema_block(df, numeric_cols)
+    except Exception:
+        return _infer_schema_columnwise(df)
+    missing = df.isna().sum()
+    schema = {}
+    for col in df.columns:
+        if col in numeric_info:
+            schema[col] = numeric_info[col]
+            continue
+        colseries = df[col]
+        nonnull = colseries.dropna()
+        colinfo = {
+            "dtype": str(colseries.dtype),
+            "missing": int(missing[col]),
+            "unique": int(nonnull.nunique()),
+            "sample": _sample_values(nonnull),
+        }
+        if pd.api.types.is_datetime64_any_dtype(colseries):
+            colinfo.update(
+                {
+                    "min": None if nonnull.empty else str(nonnull.min()),
+                    "max": None if nonnull.empty else str(nonnull.max()),
+                }
+            )
+        schema[col] = colinfo
+    return schema
+
+
+def _sample_values(nonnull, k=3):
+    """
+    Até k valores não nulos sorteados, como strings.
+    """
+    if nonnull.empty:
+        return []
+    pos = np.random.default_rng().choice(len(nonnull), min(k, len(nonnull)), replace=False)
+    return nonnull.iloc[pos].astype(str).tolist()
+
+
+def _numeric_schema_block(df, cols):
+    """
+    Estatísticas de todas as colunas numéricas, em blocos de colunas que
+    cabem em SCHEMA_BLOCK_BYTES. Retorna {coluna: colinfo}.
+    """
+    info = {}
+    if not cols:
+        return info
+    n = df.shape[0]
+    # ~três matrizes bloco x n vivas ao mesmo tempo (valores, ordenados, máscara)
+    width = max(1, int(SCHEMA_BLOCK_BYTES // (24 * max(n, 1))))
+    rng = np.random.default_rng()
+    for start in range(0, len(cols), width):
+        block_cols = cols[start : start + width]
+        # uma linha por coluna: a ordenação corre sobre memória contígua
+        values = np.ascontiguousarray(
+            df[block_cols].to_numpy(dtype="float64", na_value=np.nan).T
+        )
+        nan_mask = np.isnan(values)
+        counts = n - nan_mask.sum(axis=1)
+        srt = np.sort(values, axis=1)  # NaN vai para o fim
+        del values
+        idx = np.arange(len(block_cols))
+        if n:
+            valid = np.arange(n)[None, :] < counts[:, None]
+            mins = srt[:, 0]
+            maxs = srt[idx, np.maximum(counts - 1, 0)]
+            lo = srt[idx, np.maximum((counts - 1) // 2, 0)]
+            hi = srt[idx, np.minimum(counts // 2, n - 1)]
+            medians = (lo + hi) / 2
+            sums = np.where(valid, srt, 0.0).sum(axis=1)
+            means = sums / np.maximum(counts, 1)
+            dev = np.where(valid, srt - means[:, None], 0.0)
+            ss = np.einsum("ij,ij->i", dev, dev)
+            del dev
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stds = np.sqrt(ss / (counts - 1))
+            changes = (srt[:, 1:] != srt[:, :-1]) & valid[:, 1:]
+            uniques = np.where(counts > 0, 1 + changes.sum(axis=1), 0)
+            del changes, valid
+        for j, col in enumerate(block_cols):
+            c = int(counts[j])
+            samples = []
+            if c:
+                rows = np.flatnonzero(~nan_mask[j]) if c < n else n
+                pos = rng.choice(rows, min(3, c), replace=False)
+                samples = [str(v) for v in df[col].array[pos]]
+            info[col] = {
+                "dtype": str(df[col].dtype),
+                "missing": n - c,
+                "unique": int(uniques[j]) if c else 0,
+                "sample": samples,
+                "min": float(mins[j]) if c else None,
+                "max": float(maxs[j]) if c else None,
+                "mean": float(means[j]) if c else None,
+                "median": float(medians[j]) if c else None,
+                "std": float(stds[j]) if c else None,
+            }
+        del srt, nan_mask
+    return info
+
+
+def _infer_schema_columnwise(df):
+    """
+    Implementação original, coluna a coluna, de infer_schema.
+    Usada como fallback para tipos que o caminho vetorizado não cobre e como
+    referência no benchmark (benchmarks/bench_infer_schema.py).
     """
     schema = {}
     for col in df.columns:
@@ -159,42 +538,107 @@ def infer_schema(df):
     return schema
 
 
+def sample_rows(df, max_cells=None, seed=None):
+    """
+    Amostra aleatória simples de linhas (sem reposição, ordem original mantida),
+    com no máximo `max_cells` células (linhas x colunas) e pelo menos 1000 linhas.
+    """
+    max_cells = max_cells or PREVIEW_SAMPLE_CELLS
+    n = df.shape[0]
+    m = min(n, max(1000, max_cells // max(df.shape[1], 1)))
+    if m >= n:
+        return df
+    idx = np.sort(np.random.default_rng(seed).choice(n, m, replace=False))
+    return df.iloc[idx]
+
+
+def approximate_schema(df, sample):
+    """
+    Esquema estimado a partir de uma amostra de linhas de df, no mesmo formato
+    de infer_schema. Cada coluna ganha "accuracy": para cada estatística,
+    se é exata e, quando faz sentido, o intervalo de 95% (ci95) ou o sentido
+    do limite (bound) que o valor amostral representa.
+    """
+    n = df.shape[0]
+    m = sample.shape[0]
+    schema = infer_schema(sample)
+    if m >= n:
+        return schema
+    # correção para população finita
+    fpc = np.sqrt(max(0.0, 1 - m / n))
+    z = 1.96
+    for col, info in schema.items():
+        acc = {"dtype": {"exact": True}}
+        p = info["missing"] / m if m else 0.0
+        half = z * np.sqrt(p * (1 - p) / m) * fpc if m else 0.0
+        info["missing"] = int(round(p * n))
+        acc["missing"] = {
+            "exact": False,
+            "ci95": [max(0, int((p - half) * n)), min(n, int(np.ceil((p + half) * n)))],
+        }
+        # distintos na amostra: só um limite inferior para o total
+        acc["unique"] = {"exact": False, "bound": "lower"}
+        if info.get("mean") is not None:
+            c = m - round(p * m)
+            std = info.get("std")
+            if std is not None and not np.isnan(std) and c > 1:
+                se = std / np.sqrt(c) * fpc
+                acc["mean"] = {
+                    "exact": False,
+                    "ci95": [info["mean"] - z * se, info["mean"] + z * se],
+                }
+                se_std = std / np.sqrt(2 * (c - 1)) * fpc
+                acc["std"] = {
+                    "exact": False,
+                    "ci95": [max(0.0, std - z * se_std), std + z * se_std],
+                }
+            else:
+                acc["mean"] = {"exact": False}
+                acc["std"] = {"exact": False}
+            # IC da mediana por estatísticas de ordem da amostra
+            values = np.sort(_numeric_values(sample, col))
+            k = z * np.sqrt(len(values)) / 2
+            lo = int(max(0, np.floor(len(values) / 2 - k)))
+            hi = int(min(len(values) - 1, np.ceil(len(values) / 2 + k)))
+            acc["median"] = {
+                "exact": False,
+                "ci95": [float(values[lo]), float(values[hi])],
+            }
+        if info.get("min") is not None:
+            # o mínimo/máximo real é no máximo/no mínimo o valor amostral
+            acc["min"] = {"exact": False, "bound": "upper"}
+            acc["max"] = {"exact": False, "bound": "lower"}
+        info["accuracy"] = acc
+    return schema
+
+
 def plot_to_base64(fig):
     """
     Converte um matplotlib figure para string base64 (para frontend).
     """
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    buf.seek(0)
-    b64 = base64.b64encode(buf.read()).decode("utf-8")
-    plt.close(fig)
+    b64 = base64.b64encode(fig_to_png(fig)).decode("utf-8")
     return f"data:image/png;base64,{b64}"
 
 
+def _numeric_values(df, col):
+    """
+    Valores não nulos de uma coluna como array float (entrada dos renderizadores).
+    """
+    return df[col].dropna().to_numpy(dtype="float64")
+
+
 def histogram_plot(df, col):
     """
     Gera histograma em base64 para uma coluna numérica.
     """
-    fig, ax = plt.subplots(figsize=(6, 4))
-    try:
-        df[col].dropna().astype(float).plot(kind="hist", bins=30, ax=ax)
-    except Exception:
-        df[col].dropna().plot(kind="hist", bins=30, ax=ax)
-    ax.set_title(f"Histograma: {col}")
-    return plot_to_base64(fig)
+    return plot_to_base64(histogram_figure(_numeric_values(df, col), col))
 
 
 def boxplot_plot(df, col):
     """
     Gera boxplot em base64 para uma coluna numérica.
     """
-    fig, ax = plt.subplots(figsize=(4, 3))
-    try:
-        df[col].dropna().astype(float).plot(kind="box", ax=ax)
-    except Exception:
-        df[col].dropna().plot(kind="box", ax=ax)
-    ax.set_title(f"Boxplot: {col}")
-    return plot_to_base64(fig)
+    return plot_to_base64(boxplot_figure(_numeric_values(df, col), col))
 
 
 def scatter_plot(df, x, y):
@@ -213,24 +657,20 @@ def correlation_heatmap(df, numeric_cols):
     """
     Gera heatmap de correlação e retorna matriz + imagem base64.
     """
-    corr = df[numeric_cols].corr()
-    fig, ax = plt.subplots(figsize=(6, 5))
-    cax = ax.matshow(corr)
-    fig.colorbar(cax)
-    ax.set_xticks(range(len(numeric_cols)))
-    ax.set_xticklabels(numeric_cols, rotation=90)
-    ax.set_yticks(range(len(numeric_cols)))
-    ax.set_yticklabels(numeric_cols)
-    ax.set_title("Matriz de Correlação")
-    return plot_to_base64(fig), corr.to_dict()
+    corr = CorrelationStats.from_frame(df, numeric_cols).corr()
+    return plot_to_base64(correlation_figure(corr, numeric_cols)), corr.to_dict()
 
 
-def detect_outliers_iqr(series):
+def detect_outliers_iqr(series, quartiles=None):
     """
     Detecta outliers em uma série numérica usando o método IQR.
+    `quartiles` (q1, q3) permite usar quartis já conhecidos (ex.: de um sketch).
     """
-    q1 = series.quantile(0.25)
-    q3 = series.quantile(0.75)
+    if quartiles is None:
+        q1 = series.quantile(0.25)
+        q3 = series.quantile(0.75)
+    else:
+        q1, q3 = quartiles
     iqr = q3 - q1
     lower = q1 - 1.5 * iqr
     upper = q3 + 1.5 * iqr
@@ -242,51 +682,305 @@ def detect_outliers_iqr(series):
     }
 
 
+def sniff_delimiter(prefix_bytes):
+    """
+    Infere o delimitador a partir de um prefixo limitado do arquivo.
+    """
+    sample = prefix_bytes.decode("utf-8", errors="ignore").splitlines()[:10]
+    # heurística básica: ponto e vírgula ou vírgula
+    if any(";" in line for line in sample):
+        return ";"
+    if any("\t" in line for line in sample):
+        return "\t"
+    return ","
+
+
+def spool_upload(stream, dest_dir=None):
+    """
+    Copia um upload para um arquivo temporário em blocos, sem manter tudo em memória.
+    Retorna (caminho, bytes copiados).
+    """
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=dest_dir or INGEST_TMP_DIR)
+    nbytes = 0
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = stream.read(INGEST_BLOCK_BYTES)
+            if not block:
+                break
+            out.write(block)
+            nbytes += len(block)
+    return path, nbytes
+
+
+def downcast_frame(df):
+    """
+    Reduz os tipos numéricos de um DataFrame sem perder informação:
+    inteiros para o menor inteiro que comporta os valores e floats para float32
+    apenas quando a conversão é exata. Só para os blocos mantidos durante a
+    leitura: o DataFrame final volta a int64/float64 (widen_frame).
+    """
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s):
+            continue
+        if pd.api.types.is_integer_dtype(s):
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s) and s.dtype != "float32":
+            s32 = s.astype("float32")
+            if ((s32.astype(s.dtype) == s) | s.isna()).all():
+                df[col] = s32
+    return df
+
+
+def _read_csv_chunks(path, sep, encoding, engine):
+    """
+    Lê o CSV em blocos, reduzindo os tipos de cada bloco assim que é lido.
+    Com o engine python, linhas malformadas (campos a mais) são puladas e contadas.
+    Retorna (blocos, bytes mantidos, pico estimado, linhas puladas).
+    """
+    chunks = []
+    kept_bytes = 0
+    peak = 0
+    bad_lines = 0
+
+    def skip_line(line):
+        nonlocal bad_lines
+        bad_lines += 1
+        # devolver None descarta a linha
+
+    if engine == "c":
+        options = {"low_memory": False}
+    else:
+        options = {"on_bad_lines": skip_line}
+    reader = pd.read_csv(
+        path,
+        sep=sep,
+        engine=engine,
+        chunksize=INGEST_CHUNK_ROWS,
+        encoding=encoding,
+        **options,
+    )
+    with reader:
+        for chunk in reader:
+            raw_bytes = int(chunk.memory_usage(deep=True).sum())
+            peak = max(peak, kept_bytes + raw_bytes)
+            chunk = downcast_frame(chunk)
+            kept_bytes += int(chunk.memory_usage(deep=True).sum())
+            chunks.append(chunk)
+    return chunks, kept_bytes, peak, bad_lines
+
+
+def _column_kind(s):
+    """
+    Tipo de uma coluna de um bloco para comparar blocos: num, bool, str
+    ou None (bloco todo vazio, compatível com qualquer tipo).
+    """
+    if s.isna().all():
+        return None
+    if pd.api.types.is_bool_dtype(s):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(s):
+        return "num"
+    return "str"
+
+
+def _reconcile_chunks(chunks):
+    """
+    Alinha os tipos das colunas entre blocos antes do concat. Blocos
+    totalmente vazios de uma coluna de texto passam a texto (senão o concat
+    gera object com float e str). Retorna as colunas cujo tipo muda entre
+    blocos (ex.: números no primeiro bloco e texto num posterior).
+    """
+    mixed = []
+    for col in chunks[0].columns:
+        kinds = [_column_kind(chunk[col]) for chunk in chunks]
+        found = set(kinds) - {None}
+        if len(found) > 1:
+            mixed.append(col)
+        elif found == {"str"} and None in kinds:
+            dtype = chunks[kinds.index("str")][col].dtype
+            for chunk, kind in zip(chunks, kinds):
+                if kind is None:
+                    chunk[col] = chunk[col].astype(dtype)
+    return mixed
+
+
+def load_csv_file(path):
+    """
+    Lê um CSV do disco em blocos de linhas (engine C), reduzindo os tipos a cada bloco.
+    Retorna (DataFrame, info) com delimitador, codificação, linhas, blocos,
+    linhas malformadas puladas, tempo e uma estimativa (pelo tamanho dos
+    blocos, não medida) do pico de memória usado durante a leitura.
+    """
+    t0 = time.time()
+    with open(path, "rb") as fh:
+        sep = sniff_delimiter(fh.read(SNIFF_BYTES))
+    for encoding in ("utf-8", "latin-1"):
+        try:
+            try:
+                engine = "c"
+                chunks, kept_bytes, peak, bad_lines = _read_csv_chunks(path, sep, encoding, engine)
+            except pd.errors.ParserError:
+                # linhas malformadas: o parser python é mais tolerante
+                engine = "python"
+                chunks, kept_bytes, peak, bad_lines = _read_csv_chunks(path, sep, encoding, engine)
+            break
+        except UnicodeDecodeError:
+            # latin-1 aceita qualquer byte: a segunda volta não cai aqui
+            continue
+    n_chunks = len(chunks)
+    if not chunks:
+        df = pd.read_csv(path, sep=sep, nrows=0, engine=engine, encoding=encoding)
+    elif len(chunks) == 1:
+        df = chunks[0]
+    else:
+        # durante o concat os blocos e o resultado coexistem
+        peak = max(peak, 2 * kept_bytes)
+        mixed = _reconcile_chunks(chunks)
+        df = pd.concat(chunks, ignore_index=True)
+        if mixed:
+            # como na leitura de uma vez só: a coluna inteira vira texto
+            # (sem misturar int e str, que o Parquet recusa)
+            text = pd.read_csv(
+                path, sep=sep, engine=engine, encoding=encoding, usecols=mixed, dtype=str
+            )
+            for col in mixed:
+                df[col] = text[col]
+            del text
+    del chunks
+    # tipos reduzidos só durante a leitura: contas sobre int8/int16 estouram
+    df = widen_frame(df)
+    mem_bytes = int(df.memory_usage(deep=True).sum())
+    info = {
+        "sep": sep,
+        "encoding": encoding,
+        "engine": engine,
+        "rows": int(df.shape[0]),
+        "chunks": n_chunks,
+        "bad_lines": bad_lines,
+        "file_bytes": os.path.getsize(path),
+        "mem_bytes": mem_bytes,
+        "est_peak_mem_bytes": max(peak, mem_bytes),
+        "seconds": round(time.time() - t0, 4),
+    }
+    return df, info
+
+
+def load_csv_stream(stream):
+    """
+    Lê um CSV a partir de um stream (upload): grava em disco em blocos e
+    faz a leitura em blocos. Retorna (DataFrame, info).
+    """
+    path, _ = spool_upload(stream)
+    try:
+        return load_csv_file(path)
+    finally:
+        os.remove(path)
+
+
 def load_csv_bytes(content_bytes):
     """
     Lê bytes de CSV e tenta inferir o delimitador automaticamente.
     """
-    # Tentar inferir delimitador, retornar para vírgula
-    try:
-        sample = content_bytes.decode("utf-8", errors="ignore").splitlines()[:10]
-        # heurística básica: ponto e vírgula ou vírgula
-        if any(";" in line for line in sample):
-            sep = ";"
-        elif any("\t" in line for line in sample):
-            sep = "\t"
-        else:
-            sep = ","
-        df = pd.read_csv(io.BytesIO(content_bytes), sep=sep, engine="python")
-        return df
-    except Exception:
-        return pd.read_csv(io.BytesIO(content_bytes))
+    return load_csv_stream(io.BytesIO(content_bytes))[0]
 
 
-def quick_summary(df):
+def quick_summary(df, schema=None, dataset_id=None, preview=False):
     """
     Gera resumo rápido: esquema, gráficos principais, heatmap de correlação.
+    Aceita o esquema já calculado para não inferi-lo de novo.
+    Os gráficos são renderizados em paralelo (plot_pool) e o tempo de cada um
+    vai em "plot_timings". Com dataset_id, os gráficos vão para o cache em disco
+    e o resumo traz suas URLs (/api/plots/<hash>.png); sem ele, vêm em base64.
+    Com preview=True, tudo é calculado sobre uma amostra de linhas
+    (approximate_schema) e os gráficos só são gerados se ainda houver
+    tempo dentro de PREVIEW_BUDGET_S; "exact" indica qual foi o caso.
     """
+    t_start = time.perf_counter()
+    full_df = df
+    plot_params = None
+    if preview:
+        df = sample_rows(full_df)
+        preview = df.shape[0] < full_df.shape[0]
+    if preview:
+        schema = approximate_schema(full_df, df)
+        plot_params = {"sample_rows": df.shape[0]}
+    elif schema is None:
+        schema = infer_schema(df)
     numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-    schema = infer_schema(df)
-    plots = {}
+
+    # (nome, tipo, colunas, args): só os arrays necessários vão para os workers
+    specs = []
     for col in numeric_cols[:3]:
         try:
-            plots[f"hist_{col}"] = histogram_plot(df, col)
-            plots[f"box_{col}"] = boxplot_plot(df, col)
+            values = _numeric_values(df, col)
         except Exception:
             continue
-    corr_plot = None
+        specs.append((f"hist_{col}", "hist", [col], (values, col)))
+        specs.append((f"box_{col}", "box", [col], (values, col)))
     corr_json = {}
     if len(numeric_cols) >= 2:
         try:
-            corr_plot, corr_json = correlation_heatmap(df, numeric_cols[:6])
-            plots["corr_heatmap"] = corr_plot
+            corr_cols = numeric_cols[:6]
+            if dataset_id is not None and not preview:
+                # estatísticas de todas as colunas numéricas, reaproveitadas
+                # por /api/correlation e pelos insights
+                corr = dataset_corr(dataset_id, corr_cols, df=df)
+            else:
+                corr = CorrelationStats.from_frame(df, corr_cols).corr()
+            corr_json = corr.to_dict()
+            specs.append(
+                ("corr_heatmap", "corr_heatmap", corr_cols, (corr.to_numpy(), corr_cols))
+            )
         except Exception:
             pass
+
+    if preview and time.perf_counter() - t_start > PREVIEW_BUDGET_S / 2:
+        # a prévia já consumiu metade do orçamento: gráficos ficam para o resumo exato
+        specs = []
+
+    t0 = time.perf_counter()
+    urls = {}
+    tasks = {}
+    for name, kind, cols, args in specs:
+        key = (
+            plot_key(dataset_id, kind, cols, plot_params)
+            if dataset_id is not None
+            else None
+        )
+        if key is not None and os.path.exists(plot_file(key)):
+            urls[name] = plot_url(key)
+        else:
+            tasks[name] = (kind, args)
+    rendered = render_many(tasks)
+
+    plots = {}
+    plot_timings = {}
+    for name, kind, cols, _ in specs:
+        if name in urls:
+            plots[name] = urls[name]
+            plot_timings[name] = 0.0
+        elif name in rendered:
+            png, seconds = rendered[name]
+            if dataset_id is None:
+                b64 = base64.b64encode(png).decode("utf-8")
+                plots[name] = f"data:image/png;base64,{b64}"
+            else:
+                plots[name] = store_png(
+                    plot_key(dataset_id, kind, cols, plot_params), png
+                )
+            plot_timings[name] = round(seconds, 4)
     return {
-        "n_rows": df.shape[0],
-        "n_cols": df.shape[1],
+        "n_rows": full_df.shape[0],
+        "n_cols": full_df.shape[1],
+        "exact": not preview,
+        "sample_rows": df.shape[0],
         "schema": schema,
         "plots": plots,
         "corr": corr_json,
+        "plot_timings": plot_timings,
+        "render": {
+            "workers": PLOT_WORKERS if len(tasks) > 1 else 1,
+            "seconds": round(time.perf_counter() - t0, 4),
+        },
     }
@@ -2,9 +2,62 @@
 import streamlit as st
 import requests
 import os
+import json
+import time
+import pandas as pd
 
 API_BASE = os.environ.get("EDA_API_BASE", "http://localhost:8000")
 
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def fetch_plot(url):
+    """
+    Baixa um gráfico do cache do backend (/api/plots/<hash>.png).
+    O hash identifica o conteúdo, então o resultado pode ficar em cache aqui também.
+    """
+    resp = requests.get(f"{API_BASE}{url}", timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+
+def stream_answer(ds, question, result):
+    """
+    Gerador com os pedaços da resposta de /api/query/stream (para st.write_stream).
+    O payload final (fonte, gráficos) é copiado para `result`.
+    """
+    with requests.post(
+        f"{API_BASE}/api/query/stream",
+        json={"dataset_id": ds, "question": question},
+        stream=True,
+        timeout=(10, 120),
+    ) as resp:
+        if resp.status_code != 200:
+            raise RuntimeError(f"Erro: {resp.text}")
+        event = None
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+            elif line.startswith("event:"):
+                event = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:") :])
+                if event == "done":
+                    result.update(data)
+                elif event == "error":
+                    raise RuntimeError(data.get("error", "falha na consulta"))
+                else:
+                    yield data.get("delta", "")
+
+
+def show_plot(ref):
+    """
+    Exibe um gráfico vindo da API: URL do cache de gráficos ou data URI base64.
+    """
+    if ref.startswith("/api/plots/"):
+        ref = fetch_plot(ref)
+    st.image(ref, width="stretch")
+
+
 st.set_page_config(page_title="EDA Agent MVP", layout="wide")
 st.title("Agent E.D.A. — MVP")
 
@@ -12,54 +65,155 @@ st.sidebar.header("Envio de CSV")
 uploaded = st.sidebar.file_uploader(
     "Envie 1 ou mais CSVs", accept_multiple_files=True, type=["csv"]
 )
+UPLOAD_STAGES = ["parse", "merge", "write", "schema", "sketches", "index", "plots", "insights"]
+
+
+def stat_note(acc):
+    """
+    Precisão de uma estatística da prévia: intervalo de 95% ou sentido do limite.
+    """
+    if not acc or acc.get("exact", True):
+        return ""
+    if "ci95" in acc:
+        lo, hi = (f"{v:.2f}" if isinstance(v, float) else str(v) for v in acc["ci95"])
+        return f" (aprox.; IC 95%: {lo} – {hi})"
+    if acc.get("bound") == "lower":
+        return " (aprox.; pelo menos)"
+    if acc.get("bound") == "upper":
+        return " (aprox.; no máximo)"
+    return " (aprox.)"
+
+
+def show_summary(payload):
+    """
+    Linhas/colunas, esquema por coluna e gráficos de um resumo (final ou prévia).
+    """
+    st.markdown(
+        f"- Linhas: **{payload['n_rows']}**  \n- Colunas: **{payload['n_cols']}**"
+    )
+    st.markdown("**Esquema (amostra)**")
+
+    # Formatar o esquema de forma mais amigável
+    schema = payload["schema"]
+    for col_name, col_info in schema.items():
+        acc = col_info.get("accuracy", {})
+        with st.expander(f"📊 Coluna: {col_name}"):
+            st.write(f"**Tipo:** {col_info.get('dtype', 'N/A')}")
+            if "accuracy" in col_info:
+                st.caption("Estatísticas aproximadas (prévia por amostragem)")
+            for key, label in (
+                ("mean", "Média"),
+                ("median", "Mediana"),
+                ("min", "Mínimo"),
+                ("max", "Máximo"),
+                ("std", "Desvio Padrão"),
+            ):
+                value = col_info.get(key)
+                if isinstance(value, (int, float)):
+                    st.write(f"**{label}:** {value:.2f}{stat_note(acc.get(key))}")
+                elif value is not None:
+                    # datas: min/max como texto
+                    st.write(f"**{label}:** {value}")
+            if "missing" in col_info:
+                st.write(
+                    f"**Valores Ausentes:** {col_info['missing']}"
+                    f"{stat_note(acc.get('missing'))}"
+                )
+            if "unique" in col_info:
+                st.write(
+                    f"**Valores Únicos:** {col_info['unique']}"
+                    f"{stat_note(acc.get('unique'))}"
+                )
+            if "sample" in col_info:
+                st.write(f"**Amostra:** {', '.join(map(str, col_info['sample']))}")
+
+    if payload.get("plots"):
+        st.markdown("**Gráficos gerados automaticamente**")
+        for name, ref in payload["plots"].items():
+            show_plot(ref)
+
+
+def wait_for_job(job_id, progress, preview_slot):
+    """
+    Acompanha um job do backend (/api/jobs/<id>) até terminar, atualizando a barra.
+    Se o job publicar uma prévia do resumo (datasets grandes), ela é mostrada
+    em preview_slot enquanto o resumo exato é calculado, e some no fim.
+    """
+    shown_preview = False
+    while True:
+        resp = requests.get(f"{API_BASE}/api/jobs/{job_id}", timeout=20)
+        resp.raise_for_status()
+        job = resp.json()
+        done = [s["name"] for s in job["stages"] if s["status"] == "done"]
+        current = job["stages"][-1]["name"] if job["stages"] else "fila"
+        # a etapa de prévia só existe em datasets grandes
+        total = len(UPLOAD_STAGES) + any(s["name"] == "preview" for s in job["stages"])
+        progress.progress(min(len(done) / total, 1.0), text=f"Etapa: {current}")
+        if job["status"] in ("done", "error"):
+            preview_slot.empty()
+            return job
+        partial = job.get("partial") or {}
+        if not shown_preview and partial.get("summary"):
+            with preview_slot.container():
+                st.info("Prévia por amostragem: o resumo exato ainda está sendo calculado.")
+                show_summary({**partial, **partial["summary"]})
+            shown_preview = True
+        time.sleep(0.5)
+
+
+def save_important_insights(insights):
+    """
+    Envia de uma vez as marcações alteradas no formulário de insights.
+    """
+    mark, unmark = [], []
+    for ins in insights:
+        checked = st.session_state.get(f"imp_{ins['id']}", ins["important"])
+        if checked and not ins["important"]:
+            mark.append(ins["id"])
+        elif not checked and ins["important"]:
+            unmark.append(ins["id"])
+    if mark or unmark:
+        requests.post(
+            f"{API_BASE}/api/insights/mark",
+            json={"mark": mark, "unmark": unmark},
+            timeout=20,
+        )
+
+
 if uploaded:
     files = uploaded
-    with st.spinner("Enviando arquivos..."):
-        files_payload = [("files", (f.name, f.getvalue(), "text/csv")) for f in files]
+    # o Streamlit reexecuta o script a cada interação: só reenviar se os arquivos mudarem
+    upload_key = tuple((f.name, f.size) for f in files)
+    if st.session_state.get("upload_key") != upload_key:
+        with st.spinner("Enviando arquivos..."):
+            files_payload = [
+                ("files", (f.name, f.getvalue(), "text/csv")) for f in files
+            ]
+            try:
+                resp = requests.post(
+                    f"{API_BASE}/api/upload", files=files_payload, timeout=120
+                )
+                if resp.status_code == 202:
+                    job = wait_for_job(
+                        resp.json()["job_id"], st.progress(0.0), st.empty()
+                    )
+                    if job["status"] == "done":
+                        st.session_state["upload_key"] = upload_key
+                        st.session_state["upload_payload"] = job["result"]
+                    else:
+                        st.error(f"Erro no processamento: {job['error']}")
+                else:
+                    st.error(f"Erro no upload: {resp.status_code} {resp.text}")
+            except Exception as e:
+                st.error(f"Erro: {e}")
+    if st.session_state.get("upload_key") == upload_key:
+        payload = st.session_state["upload_payload"]
         try:
-            resp = requests.post(
-                f"{API_BASE}/api/upload", files=files_payload, timeout=120
-            )
-            if resp.status_code == 200:
-                payload = resp.json()
+            if payload:
                 st.success("Upload concluído")
                 st.session_state["dataset_id"] = payload["dataset_id"]
                 st.subheader("Resumo Inicial")
-                st.markdown(
-                    f"- Linhas: **{payload['n_rows']}**  \n- Colunas: **{payload['n_cols']}**"
-                )
-                st.markdown("**Esquema (amostra)**")
-
-                # Formatar o esquema de forma mais amigável
-                schema = payload["schema"]
-                for col_name, col_info in schema.items():
-                    with st.expander(f"📊 Coluna: {col_name}"):
-                        st.write(f"**Tipo:** {col_info.get('dtype', 'N/A')}")
-                        if "mean" in col_info:
-                            st.write(f"**Média:** {col_info['mean']:.2f}")
-                        if "median" in col_info:
-                            st.write(f"**Mediana:** {col_info['median']:.2f}")
-                        if "min" in col_info:
-                            st.write(f"**Mínimo:** {col_info['min']:.2f}")
-                        if "max" in col_info:
-                            st.write(f"**Máximo:** {col_info['max']:.2f}")
-                        if "std" in col_info:
-                            st.write(f"**Desvio Padrão:** {col_info['std']:.2f}")
-                        if "missing" in col_info:
-                            st.write(f"**Valores Ausentes:** {col_info['missing']}")
-                        if "unique" in col_info:
-                            st.write(f"**Valores Únicos:** {col_info['unique']}")
-                        if "sample" in col_info:
-                            st.write(
-                                f"**Amostra:** {', '.join(map(str, col_info['sample']))}"
-                            )
-
-                if payload.get("plots"):
-                    st.markdown("**Gráficos gerados automaticamente**")
-                    for name, b64 in payload["plots"].items():
-                        st.image(b64, width="stretch")
-            else:
-                st.error(f"Erro no upload: {resp.status_code} {resp.text}")
+                show_summary(payload)
         except Exception as e:
             st.error(f"Erro: {e}")
 
@@ -75,20 +229,20 @@ if "dataset_id" in st.session_state:
         )
         if resp.status_code == 200:
             insights = resp.json()
-            for ins in insights:
-                if ins["important"]:
-                    st.sidebar.markdown(
-                        f"<div style='background-color:#fffbe6;padding:4px;border-radius:4px;margin-bottom:2px'>✅ <b>{ins['text']}</b></div>",
-                        unsafe_allow_html=True,
+            with st.sidebar.form("insights_form"):
+                for ins in insights:
+                    st.checkbox(
+                        f"⭐ {ins['text']}" if ins["important"] else ins["text"],
+                        value=ins["important"],
+                        key=f"imp_{ins['id']}",
                     )
-                else:
-                    st.sidebar.write(f"- {ins['text']}")
-                    if st.sidebar.button(f"Marcar importante", key=f"mark_{ins['id']}"):
-                        requests.post(
-                            f"{API_BASE}/api/insights/mark",
-                            json={"insight_id": ins["id"]},
-                        )
-                        st.rerun()
+                # o callback roda antes do rerun do submit: uma única chamada
+                # em lote e a próxima execução já busca os insights atualizados
+                st.form_submit_button(
+                    "Salvar importantes",
+                    on_click=save_important_insights,
+                    args=(insights,),
+                )
         else:
             st.sidebar.error("Falha ao buscar insights")
     except Exception as e:
@@ -105,26 +259,26 @@ if "dataset_id" in st.session_state:
             if not question.strip():
                 st.warning("Digite uma pergunta.")
             else:
-                with st.spinner("Consultando..."):
-                    try:
-                        resp = requests.post(
-                            f"{API_BASE}/api/query",
-                            json={"dataset_id": ds, "question": question},
-                            timeout=60,
+                result = {}
+                try:
+                    st.markdown("**Resposta:**")
+                    # o texto aparece conforme o LLM gera (server-sent events)
+                    st.write_stream(stream_answer(ds, question, result))
+                    st.caption(
+                        f"Fonte: {result.get('source', '?')}"
+                        + (" (cache)" if result.get("cached") else "")
+                    )
+                    previous = result.get("cache")
+                    if previous:
+                        st.caption(
+                            f"Resposta dada em {previous['created_at']} para: "
+                            f"\"{previous['question']}\""
                         )
-                        if resp.status_code == 200:
-                            payload = resp.json()
-                            st.success(
-                                f"Resposta ({payload.get('source','?')}): {payload.get('answer','[sem resposta]')}"
-                            )
-                            if payload.get("plots"):
-                                for name, b64 in payload["plots"].items():
-                                    st.markdown(f"**{name}**")
-                                    st.image(b64, width="stretch")
-                        else:
-                            st.error(f"Erro: {resp.text}")
-                    except Exception as e:
-                        st.error(str(e))
+                    for name, ref in result.get("plots", {}).items():
+                        st.markdown(f"**{name}**")
+                        show_plot(ref)
+                except Exception as e:
+                    st.error(str(e))
 
     # Outliers
     with tabs[1]:
@@ -145,17 +299,25 @@ if "dataset_id" in st.session_state:
                     col = st.selectbox(
                         "Selecione a coluna numérica:", num_cols, key="outlier_col"
                     )
+                    exact = st.checkbox(
+                        "Quartis exatos (mais lento em datasets grandes)",
+                        key="outlier_exact",
+                    )
                     if st.button("Detectar Outliers", key="outliers_btn"):
                         try:
                             resp2 = requests.get(
                                 f"{API_BASE}/api/outliers",
-                                params={"dataset_id": ds, "col": col},
+                                params={
+                                    "dataset_id": ds,
+                                    "col": col,
+                                    "exact": int(exact),
+                                },
                                 timeout=30,
                             )
                             if resp2.status_code == 200:
                                 out = resp2.json()
                                 st.markdown(f"**Boxplot:**")
-                                st.image(out["plot"], width="stretch")
+                                show_plot(out["plot"])
                                 st.markdown(f"**Estatísticas:**")
                                 st.json(out["stats"])
                             else:
@@ -179,10 +341,27 @@ if "dataset_id" in st.session_state:
             if resp.status_code == 200:
                 payload = resp.json()
                 st.markdown("**Heatmap de Correlação:**")
-                st.image(payload["plot"], width="stretch")
-                st.markdown("**Matriz de Correlação:**")
-                st.json(payload["corr"])
+                show_plot(payload["plot"])
                 st.info(payload.get("insight", ""))
+                st.markdown("**Pares mais correlacionados:**")
+                c1, c2 = st.columns(2)
+                method = c1.selectbox(
+                    "Método", ["pearson", "spearman"], key="corr_method"
+                )
+                k = c2.number_input(
+                    "Quantidade de pares", 1, 100, 10, key="corr_top_k"
+                )
+                resp_top = requests.get(
+                    f"{API_BASE}/api/correlation/top",
+                    params={"dataset_id": ds, "k": int(k), "method": method},
+                    timeout=60,
+                )
+                if resp_top.status_code == 200:
+                    st.dataframe(pd.DataFrame(resp_top.json()["pairs"]))
+                else:
+                    st.error(resp_top.text)
+                with st.expander("Matriz de Correlação completa"):
+                    st.json(payload["corr"])
             elif resp.status_code == 400:
                 st.warning(
                     "Não há colunas numéricas suficientes para análise de correlação."
@@ -208,29 +387,105 @@ if "dataset_id" in st.session_state:
                     or v.get("dtype", "").startswith("int")
                 ]
                 if len(num_cols) >= 2:
-                    xcol = st.selectbox("Coluna X:", num_cols, key="cluster_x")
-                    ycol = st.selectbox("Coluna Y:", num_cols, key="cluster_y")
-                    k = st.slider("Número de clusters:", 2, 5, 3, key="cluster_k")
+                    sel_cols = st.multiselect(
+                        "Colunas (2 ou mais):",
+                        num_cols,
+                        default=num_cols[:2],
+                        key="cluster_cols",
+                    )
+                    if st.button("Sugerir k (varredura de 2 a 10)", key="cluster_sweep_btn"):
+                        if len(sel_cols) < 2:
+                            st.warning("Selecione pelo menos 2 colunas.")
+                            st.stop()
+                        with st.spinner("Testando valores de k em paralelo..."):
+                            resp_sw = requests.get(
+                                f"{API_BASE}/api/clusters/sweep",
+                                params={
+                                    "dataset_id": ds,
+                                    "cols": ",".join(sel_cols),
+                                    "k_min": 2,
+                                    "k_max": 10,
+                                },
+                                timeout=600,
+                            )
+                        if resp_sw.status_code == 200:
+                            st.session_state["cluster_sweep"] = resp_sw.json()
+                            if resp_sw.json()["recommended_k"]:
+                                # os modelos da varredura ficam em cache: escolher
+                                # outro k abaixo não reajusta nada
+                                st.session_state["cluster_k"] = resp_sw.json()[
+                                    "recommended_k"
+                                ]
+                        else:
+                            st.error(resp_sw.text)
+                    sw = st.session_state.get("cluster_sweep")
+                    if sw and sw["cols"] == sel_cols:
+                        show_plot(sw["plot"])
+                        st.dataframe(pd.DataFrame(sw["scores"]))
+                        st.caption(
+                            f"k recomendado: {sw['recommended_k']} (maior silhueta "
+                            f"em {sw['silhouette_sample']} linhas amostradas)"
+                        )
+                    k = st.slider("Número de clusters:", 2, 10, 3, key="cluster_k")
                     if st.button("Rodar Clustering", key="cluster_btn"):
+                        if len(sel_cols) < 2:
+                            st.warning("Selecione pelo menos 2 colunas.")
+                            st.stop()
                         try:
                             resp2 = requests.get(
                                 f"{API_BASE}/api/clusters",
                                 params={
                                     "dataset_id": ds,
-                                    "cols": f"{xcol},{ycol}",
+                                    "cols": ",".join(sel_cols),
                                     "k": k,
                                 },
-                                timeout=30,
+                                timeout=300,
                             )
                             if resp2.status_code == 200:
-                                cl = resp2.json()
-                                st.markdown("**Scatter plot dos clusters:**")
-                                st.image(cl["plot"], width="stretch")
-                                st.info(cl.get("insight", ""))
+                                # guardado para sobreviver ao rerun do botão de rótulos
+                                st.session_state["cluster_result"] = {
+                                    "ds": ds,
+                                    "cols": sel_cols,
+                                    "k": k,
+                                    "result": resp2.json(),
+                                }
+                                st.session_state.pop("cluster_labels_csv", None)
                             else:
                                 st.error(resp2.text)
                         except Exception as e:
                             st.error(str(e))
+                    run = st.session_state.get("cluster_result")
+                    if run and (run["ds"], run["cols"], run["k"]) == (ds, sel_cols, k):
+                        cl = run["result"]
+                        st.markdown("**Gráfico dos clusters:**")
+                        show_plot(cl["plot"])
+                        st.info(cl.get("insight", ""))
+                        st.caption(
+                            f"Algoritmo: {cl['algorithm']} · {cl['n_rows']} linhas · "
+                            f"ajuste em {cl['fit_seconds']}s"
+                        )
+                        st.dataframe(
+                            pd.DataFrame({"cluster": range(cl["k"]), "linhas": cl["sizes"]})
+                        )
+                        # os rótulos (um por linha) só são baixados se o usuário pedir
+                        if st.button("Preparar CSV dos rótulos", key="cluster_labels_btn"):
+                            with st.spinner("Baixando rótulos..."):
+                                labels_csv = requests.get(
+                                    f"{API_BASE}{cl['labels_url']}",
+                                    params={"format": "csv"},
+                                    timeout=300,
+                                )
+                            if labels_csv.status_code == 200:
+                                st.session_state["cluster_labels_csv"] = labels_csv.content
+                            else:
+                                st.error(labels_csv.text)
+                        if st.session_state.get("cluster_labels_csv") is not None:
+                            st.download_button(
+                                "Baixar rótulos (CSV)",
+                                data=st.session_state["cluster_labels_csv"],
+                                file_name=f"{ds}_clusters_k{k}.csv",
+                                mime="text/csv",
+                            )
                 else:
                     st.warning(
                         "É necessário pelo menos 2 colunas numéricas para clustering."
@@ -262,6 +517,27 @@ if "dataset_id" in st.session_state:
                 except Exception as e:
                     st.error(str(e))
 
+        st.subheader("Exportar dados em CSV")
+        if st.button("Exportar CSV", key="csv_btn"):
+            with st.spinner("Gerando CSV..."):
+                try:
+                    resp = requests.get(
+                        f"{API_BASE}/api/export/csv",
+                        params={"dataset_id": ds},
+                        timeout=120,
+                    )
+                    if resp.status_code == 200:
+                        st.download_button(
+                            "Baixar CSV",
+                            data=resp.content,
+                            file_name=f"{ds}.csv",
+                            mime="text/csv",
+                        )
+                    else:
+                        st.error("Erro ao exportar CSV")
+                except Exception as e:
+                    st.error(str(e))
+
     # Botão para recarregar resumo
     if st.sidebar.button("Recarregar resumo", key="reload_summary"):
         try:
@@ -277,7 +553,7 @@ if "dataset_id" in st.session_state:
                 st.json(payload["schema"])
                 if payload.get("plots"):
                     for name, b64 in payload["plots"].items():
-                        st.image(b64, width="stretch")
+                        show_plot(b64)
             else:
                 st.error("Falha ao obter resumo")
         except Exception as e:
@@ -0,0 +1,143 @@
+"""
+jobs.py
+
+Execução de tarefas longas (pipeline de upload) em um pool de threads de fundo.
+Cada job registra suas etapas com status e tempo, para ser consultado em
+GET /api/jobs/<job_id> enquanto roda.
+Os jobs ficam em memória do processo: com vários processos de servidor,
+a consulta precisa cair no mesmo processo que recebeu o upload.
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOB_WORKERS = int(os.environ.get("EDA_JOB_WORKERS", "2"))
+# Quantos jobs finalizados manter para consulta
+JOB_HISTORY = int(os.environ.get("EDA_JOB_HISTORY", "200"))
+
+
+class Job:
+    """
+    Estado de um job: status geral, etapas (com tempos), resultado ou erro.
+    """
+
+    def __init__(self, kind):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.stages = []
+        self.result = None
+        self.partial = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Marca uma etapa do pipeline: registra início, fim, duração e falha.
+        """
+        entry = {"name": name, "status": "running", "seconds": None}
+        with self._lock:
+            self.stages.append(entry)
+        t0 = time.perf_counter()
+        try:
+            yield entry
+        except Exception:
+            entry["status"] = "error"
+            raise
+        else:
+            entry["status"] = "done"
+        finally:
+            entry["seconds"] = round(time.perf_counter() - t0, 4)
+
+    def set_partial(self, **values):
+        """
+        Publica resultados intermediários (ex.: dataset_id) antes do fim do job.
+        """
+        with self._lock:
+            self.partial = {**(self.partial or {}), **values}
+
+    def to_dict(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            return {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "status": self.status,
+                "stages": [dict(s) for s in self.stages],
+                "elapsed": round(now - (self.started_at or now), 4),
+                "partial": self.partial,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Pool de threads que executa jobs e guarda seu estado para consulta.
+    """
+
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="eda-job"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Agenda fn(job, *args, **kwargs); o retorno vira job.result.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def run_inline(self, kind, fn, *args, **kwargs):
+        """
+        Executa o job na thread atual (modo síncrono), registrando-o normalmente.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._run(job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        if len(finished) <= JOB_HISTORY:
+            return
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[: len(finished) - JOB_HISTORY]:
+            del self._jobs[job.job_id]
+
+
+JOBS = JobManager(JOB_WORKERS)
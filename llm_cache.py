@@ -0,0 +1,222 @@
+"""
+llm_cache.py
+
+Cache persistente das respostas do LLM (tabela llm_cache do SQLite, migração v2).
+A chave é o sha256 do prompt normalizado + nome do modelo + versão do dataset
+(mtime do arquivo de dados): a mesma pergunta sobre o mesmo dataset não é paga
+nem esperada de novo, e um dataset regravado não reaproveita respostas antigas.
+As entradas expiram após EDA_LLM_CACHE_TTL_S; acima de EDA_LLM_CACHE_MAX_MB,
+as usadas há mais tempo são removidas. Respostas de erro ("[Stub Fallback]")
+nunca são gravadas; as do stub offline sim (modelo "stub", separado do Gemini).
+Guarda sempre o texto inteiro: call() e stream() compartilham as entradas, e
+quem precisa da resposta curta a corta depois (call_gemini.shorten_answer).
+"""
+
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+
+from call_gemini import model_name
+from dataset_store import dataset_mtime
+from eda_agent import DB
+
+# Validade das respostas em segundos (0 = sem expiração)
+LLM_CACHE_TTL_S = float(os.environ.get("EDA_LLM_CACHE_TTL_S", str(7 * 86400)))
+# Tamanho máximo (MB) das respostas guardadas
+LLM_CACHE_MAX_MB = float(os.environ.get("EDA_LLM_CACHE_MAX_MB", "64"))
+# EDA_LLM_CACHE=0 desliga o cache
+LLM_CACHE_ENABLED = os.environ.get("EDA_LLM_CACHE", "1") != "0"
+
+# respostas que indicam falha na chamada e não devem ser reaproveitadas
+ERROR_PREFIXES = ("[Stub Fallback]",)
+# linhas lidas por vez ao escolher entradas para remover
+EVICT_SCAN_ROWS = 256
+# entra na chave: as entradas antigas guardavam o texto já cortado por call_gemini
+KEY_SCHEME = "full-text"
+
+
+def normalize_prompt(prompt):
+    """
+    Forma canônica do prompt: Unicode NFKC, espaços colapsados, sem caixa.
+    """
+    text = unicodedata.normalize("NFKC", prompt)
+    return " ".join(text.split()).casefold()
+
+
+def dataset_version(dataset_id):
+    """
+    Versão do dataset usada na chave ("" sem dataset ou se ele não existir).
+    """
+    mtime = dataset_mtime(dataset_id) if dataset_id else None
+    return repr(mtime) if mtime is not None else ""
+
+
+def cache_key(prompt, model, version):
+    h = hashlib.sha256()
+    for part in (KEY_SCHEME, model, version, normalize_prompt(prompt)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Cache de respostas do LLM no banco, com TTL, limite de tamanho (LRU)
+    e contadores de acerto.
+    """
+
+    def __init__(self, db, ttl_s=LLM_CACHE_TTL_S, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024):
+        self.db = db
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, key):
+        """
+        Resposta guardada para a chave, ou None (ausente ou expirada).
+        """
+        row = self.db.query_one(
+            "SELECT response, created_ts FROM llm_cache WHERE key=?", (key,)
+        )
+        now = time.time()
+        if row is not None and self.ttl_s and now - row[1] > self.ttl_s:
+            self.db.write("DELETE FROM llm_cache WHERE key=?", (key,), wait=False)
+            self._count("expired")
+            row = None
+        if row is None:
+            self._count("misses")
+            return None
+        # o último uso não precisa esperar o commit
+        self.db.write(
+            "UPDATE llm_cache SET hits = hits + 1, last_hit_ts=? WHERE key=?",
+            (now, key),
+            wait=False,
+        )
+        self._count("hits")
+        return row[0]
+
+    def put(self, key, response, model, dataset_id=None, version=""):
+        """
+        Grava a resposta (exceto respostas de erro). Retorna True se gravou.
+        """
+        if not isinstance(response, str) or response.startswith(ERROR_PREFIXES):
+            self._count("skipped")
+            return False
+        now = time.time()
+        self.db.write(
+            "INSERT OR REPLACE INTO llm_cache (key, model, dataset_id, dataset_version, "
+            "response, size, created_ts, last_hit_ts, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, model, dataset_id, version, response, len(response.encode("utf-8")), now, now),
+        )
+        self._count("stores")
+        self.evict()
+        return True
+
+    def evict(self):
+        """
+        Remove as entradas expiradas e, se o total passar de max_bytes,
+        as usadas há mais tempo. Retorna quantas entradas saíram.
+        """
+        removed = 0
+        if self.ttl_s:
+            removed += self.db.write(
+                "DELETE FROM llm_cache WHERE created_ts < ?", (time.time() - self.ttl_s,)
+            )
+        excess = self.db.query_one("SELECT COALESCE(SUM(size), 0) FROM llm_cache")[0]
+        excess -= self.max_bytes
+        while excess > 0:
+            rows = self.db.query(
+                "SELECT key, size FROM llm_cache ORDER BY last_hit_ts LIMIT ?",
+                (EVICT_SCAN_ROWS,),
+            )
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                victims.append((key,))
+                excess -= size or 0
+            removed += self.db.write_many("DELETE FROM llm_cache WHERE key=?", victims)
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def call(self, prompt, fn, dataset_id=None, model=None):
+        """
+        Responde o prompt pelo cache ou chamando fn(prompt) (e guardando).
+        Retorna (resposta, veio_do_cache).
+        """
+        if not LLM_CACHE_ENABLED:
+            return fn(prompt), False
+        model = model or model_name()
+        version = dataset_version(dataset_id)
+        key = cache_key(prompt, model, version)
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        response = fn(prompt)
+        self.put(key, response, model, dataset_id, version)
+        return response, False
+
+    def stream(self, prompt, fn, dataset_id=None, model=None):
+        """
+        Versão em streaming de call(): fn(prompt) é um gerador de pedaços.
+        Retorna (iterador de pedaços, veio_do_cache); a resposta completa é
+        gravada quando o iterador termina sem erro.
+        """
+        if not LLM_CACHE_ENABLED:
+            return fn(prompt), False
+        model = model or model_name()
+        version = dataset_version(dataset_id)
+        key = cache_key(prompt, model, version)
+        cached = self.get(key)
+        if cached is not None:
+            return iter([cached]), True
+
+        def chunks():
+            parts = []
+            for part in fn(prompt):
+                parts.append(part)
+                yield part
+            self.put(key, "".join(parts), model, dataset_id, version)
+
+        return chunks(), False
+
+    def clear(self):
+        return self.db.write("DELETE FROM llm_cache")
+
+    def stats(self):
+        entries, size = self.db.query_one(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        )
+        total = self.hits + self.misses
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+LLM_CACHE = LLMCache(DB)
@@ -0,0 +1,237 @@
+"""
+llm_context.py
+
+Contexto do dataset enviado ao LLM em /api/query, dentro de um orçamento de
+tokens (EDA_LLM_CONTEXT_TOKENS). Em vez de esquema + amostra + describe() do
+DataFrame inteiro cortados às cegas em 4000 caracteres, as colunas são
+ordenadas pela relevância para a pergunta (citadas pelo nome, com valores
+citados, palavras em comum) e descritas com as estatísticas já calculadas no
+upload (índice de respostas, answer_index.py); a amostra lê só as colunas mais
+relevantes. Cada parte entra inteira ou não entra, em ordem de prioridade, e o
+tempo de cada etapa é medido.
+"""
+
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from answer_index import dataset_index
+from dataset_store import dataset_dtypes, load_dataset
+from llm_gateway import estimate_tokens
+from query_engine import (
+    STOPWORDS,
+    is_categorical,
+    is_numeric,
+    normalize,
+    python_value,
+    tokenize,
+)
+
+# Tokens (estimados) de contexto por pergunta
+LLM_CONTEXT_TOKENS = int(os.environ.get("EDA_LLM_CONTEXT_TOKENS", "1000"))
+# Linhas e colunas da amostra de dados
+LLM_CONTEXT_SAMPLE_ROWS = int(os.environ.get("EDA_LLM_CONTEXT_SAMPLE_ROWS", "20"))
+LLM_CONTEXT_SAMPLE_COLS = int(os.environ.get("EDA_LLM_CONTEXT_SAMPLE_COLS", "8"))
+
+# fração do orçamento reservada às descrições das colunas (o resto é da amostra)
+COLUMNS_SHARE = 0.7
+# categorias mais frequentes mostradas por coluna
+TOP_CATEGORIES = 5
+# caracteres por valor na amostra e nas categorias
+MAX_VALUE_CHARS = 40
+# categorias comparadas com a pergunta, por coluna
+MATCH_CATEGORIES = 200
+
+# estatísticas das colunas numéricas, na ordem mostrada
+NUMERIC_STATS = (
+    ("min", "min"),
+    ("max", "max"),
+    ("mean", "média"),
+    ("median", "mediana"),
+    ("std", "dp"),
+)
+# palavras sem "_", para "receita_total" casar com "receita"
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _short(value):
+    text = str(python_value(value))
+    return text if len(text) <= MAX_VALUE_CHARS else text[: MAX_VALUE_CHARS - 3] + "..."
+
+
+def _fmt(value):
+    value = python_value(value)
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return _short(value)
+
+
+def _words(text):
+    return {w for w in WORD_RE.findall(normalize(text)) if w not in STOPWORDS and len(w) > 2}
+
+
+def rank_columns(question, dtypes, index):
+    """
+    Colunas em ordem de relevância para a pergunta, com a pontuação:
+    citada pelo nome (3), com um valor citado (2), palavras do nome na
+    pergunta (até 1) e um pequeno peso pelo conteúdo (colunas constantes
+    ou com um valor distinto por linha, como ids, valem menos).
+    """
+    columns = list(dtypes.index)
+    mentioned = {v for kind, v in tokenize(question, columns) if kind == "col"}
+    text = " " + " ".join(WORD_RE.findall(normalize(question))) + " "
+    q_words = _words(question)
+    n_rows = index["n_rows"] if index else 0
+    scores = {}
+    for col in columns:
+        score = 3.0 if col in mentioned else 0.0
+        pairs = index["categories"].get(col) if index else None
+        if pairs:
+            for value, _ in pairs[:MATCH_CATEGORIES]:
+                value = " ".join(WORD_RE.findall(normalize(value)))
+                if len(value) > 2 and f" {value} " in text:
+                    score += 2.0
+                    break
+        name_words = _words(col)
+        if name_words:
+            score += len(name_words & q_words) / len(name_words)
+        info = index["columns"].get(col, {}) if index else {}
+        nunique = info.get("nunique")
+        if nunique is not None:
+            if nunique <= 1 or (n_rows > 1 and nunique >= n_rows and is_categorical(dtypes[col])):
+                score -= 0.5
+            elif is_numeric(dtypes[col]) or pairs:
+                score += 0.2
+        scores[col] = score
+    # empate: ordem original das colunas
+    order = sorted(range(len(columns)), key=lambda i: -scores[columns[i]])
+    return [(columns[i], round(scores[columns[i]], 3)) for i in order]
+
+
+def column_line(col, dtype, index):
+    """
+    Descrição de uma coluna em uma linha: tipo e estatísticas do índice.
+    """
+    info = index["columns"].get(col, {}) if index else {}
+    parts = [f"- {col} ({dtype})"]
+    stats = []
+    if "missing" in info:
+        stats.append(f"ausentes={info['missing']}")
+    if "nunique" in info:
+        stats.append(f"distintos={info['nunique']}")
+    if "mean" in info:
+        for key, label in NUMERIC_STATS:
+            if info.get(key) is not None:
+                stats.append(f"{label}={_fmt(info[key])}")
+    pairs = index["categories"].get(col) if index else None
+    if pairs:
+        top = ", ".join(f"{_short(v)} ({n})" for v, n in pairs[:TOP_CATEGORIES])
+        stats.append(f"mais comuns: {top}")
+    if stats:
+        parts.append(": " + "; ".join(stats))
+    return "".join(parts)
+
+
+def sample_lines(dataset_id, columns, n_rows):
+    """
+    Linhas sorteadas (semente fixa: a mesma pergunta gera o mesmo prompt e
+    acerta o cache do LLM) das colunas pedidas, como CSV sem aspas.
+    """
+    if not columns or n_rows <= 0:
+        return []
+    df = load_dataset(dataset_id, columns=columns)
+    if df is None or df.empty:
+        return []
+    rng = np.random.default_rng(0)
+    pos = np.sort(rng.choice(len(df), min(n_rows, len(df)), replace=False))
+    rows = df.iloc[pos]
+    lines = [",".join(columns)]
+    for row in rows.itertuples(index=False, name=None):
+        lines.append(",".join("" if pd.isna(v) else _fmt(v) for v in row))
+    return lines
+
+
+def build_context(dataset_id, question, budget=None):
+    """
+    Monta o contexto do dataset para a pergunta dentro do orçamento de tokens.
+    Retorna (texto, info); info traz tokens estimados, colunas descritas,
+    linhas de amostra, relevância das colunas e o tempo de cada etapa (ms).
+    """
+    budget = LLM_CONTEXT_TOKENS if budget is None else budget
+    timings = {}
+
+    def timed(name, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        timings[name] = round((time.perf_counter() - t0) * 1000, 2)
+        return result
+
+    dtypes = timed("schema", dataset_dtypes, dataset_id)
+    index = timed("index", dataset_index, dataset_id)
+    ranked = timed("rank", rank_columns, question, dtypes, index)
+
+    t0 = time.perf_counter()
+    n_rows = index["n_rows"] if index else "?"
+    header = (
+        f"Dataset: {n_rows} linhas x {len(dtypes)} colunas. "
+        "Colunas (mais relevantes primeiro):"
+    )
+    used = estimate_tokens(header)
+    lines = [header]
+    described = []
+    for col, _ in ranked:
+        line = column_line(col, dtypes[col], index)
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget * COLUMNS_SHARE:
+            break
+        lines.append(line)
+        described.append(col)
+        used += cost
+    # as colunas não descritas entram só pelo nome, no lugar das últimas descrições
+    while len(described) < len(ranked):
+        line = "Outras colunas: " + ", ".join(col for col, _ in ranked[len(described):])
+        cost = estimate_tokens(line) + 1
+        if used + cost <= budget * COLUMNS_SHARE:
+            lines.append(line)
+            used += cost
+            break
+        if not described:
+            break
+        described.pop()
+        used -= estimate_tokens(lines.pop()) + 1
+    timings["columns"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    sample_cols = described[:LLM_CONTEXT_SAMPLE_COLS]
+    sample = timed("sample", sample_lines, dataset_id, sample_cols, LLM_CONTEXT_SAMPLE_ROWS)
+
+    t0 = time.perf_counter()
+    n_sample = 0
+    if len(sample) > 1:
+        title = "Amostra:"
+        # cabeçalho da amostra sem linhas não ajuda: entra junto com a primeira
+        cost = estimate_tokens(title) + estimate_tokens(sample[0]) + 2
+        for line in sample[1:]:
+            cost += estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            if not n_sample:
+                lines += [title, sample[0]]
+            lines.append(line)
+            used += cost
+            cost = 0
+            n_sample += 1
+    text = "\n".join(lines)
+    timings["assemble"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    info = {
+        "tokens": estimate_tokens(text),
+        "budget": budget,
+        "columns": described,
+        "sample_rows": n_sample,
+        "relevance": dict(ranked[: len(described)]),
+        "timings_ms": timings,
+    }
+    return text, info
@@ -0,0 +1,424 @@
+"""
+llm_gateway.py
+
+Ponto único de saída para o LLM. O cliente do Gemini é configurado uma vez e
+o GenerativeModel reaproveitado entre chamadas; um semáforo limita quantas
+requisições ficam em voo ao mesmo tempo; cada chamada tem timeout e, em erros
+transitórios (timeout, 429, 5xx, conexão), é repetida com backoff exponencial
+com jitter. stream() entrega o texto em pedaços conforme o backend gera (só há
+nova tentativa se nada foi entregue ainda). Latência, tempo até o primeiro
+pedaço e tokens de cada chamada entram nas métricas (/api/llm/stats).
+
+Backends (EDA_LLM_BACKEND): "gemini", "stub" (resposta simulada offline) e
+"fake" (latência e falhas configuráveis, para medir vazão sem rede).
+Sem EDA_LLM_BACKEND, usa o Gemini se GEMINI_API_KEY estiver definida, senão o stub.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# Máximo de chamadas ao LLM em voo ao mesmo tempo
+LLM_MAX_CONCURRENCY = int(os.environ.get("EDA_LLM_MAX_CONCURRENCY", "4"))
+# Timeout por tentativa (segundos), incluindo a espera por uma vaga no semáforo
+LLM_TIMEOUT_S = float(os.environ.get("EDA_LLM_TIMEOUT_S", "30"))
+# Tentativas extras em erros transitórios e base/teto do backoff (segundos)
+LLM_RETRIES = int(os.environ.get("EDA_LLM_RETRIES", "2"))
+LLM_BACKOFF_S = float(os.environ.get("EDA_LLM_BACKOFF_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.environ.get("EDA_LLM_BACKOFF_MAX_S", "8"))
+# Backend fake: latência média (ms) e fração de chamadas que falham
+LLM_FAKE_LATENCY_MS = float(os.environ.get("EDA_LLM_FAKE_LATENCY_MS", "200"))
+LLM_FAKE_FAIL_RATE = float(os.environ.get("EDA_LLM_FAKE_FAIL_RATE", "0"))
+# Backend fake: intervalo (ms) entre os pedaços no modo streaming
+LLM_FAKE_TOKEN_MS = float(os.environ.get("EDA_LLM_FAKE_TOKEN_MS", "5"))
+
+# quantas latências recentes guardar para os percentis
+LATENCY_WINDOW = 1000
+# códigos HTTP que valem nova tentativa
+RETRY_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMTimeout(TimeoutError):
+    pass
+
+
+class TransientLLMError(RuntimeError):
+    """
+    Falha passageira do backend (vale nova tentativa).
+    """
+
+
+def estimate_tokens(text):
+    """
+    Estimativa grosseira (~4 caracteres por token) quando o backend não informa.
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_words(text):
+    """
+    Pedaços palavra a palavra (com o espaço seguinte), para simular streaming.
+    """
+    return re.findall(r"\s*\S+\s*", text)
+
+
+def is_retryable(exc):
+    """
+    Erros transitórios: timeout, conexão, 429/5xx (inclusive os do google.api_core,
+    reconhecidos pelo atributo code ou pelo nome da classe).
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError, TransientLLMError)):
+        return True
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)
+    if isinstance(code, int) and code in RETRY_CODES:
+        return True
+    return type(exc).__name__ in {
+        "DeadlineExceeded",
+        "ResourceExhausted",
+        "ServiceUnavailable",
+        "InternalServerError",
+        "TooManyRequests",
+    }
+
+
+class GeminiBackend:
+    """
+    Google Gemini: genai.configure e GenerativeModel feitos uma única vez.
+    """
+
+    def __init__(self, api_key, model=GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = model
+        self._client = genai.GenerativeModel(model)
+
+    def generate(self, prompt, timeout):
+        response = self._client.generate_content(
+            prompt, request_options={"timeout": timeout}
+        )
+        text = response.text.strip()
+        usage = getattr(response, "usage_metadata", None)
+        tokens_in = getattr(usage, "prompt_token_count", None)
+        tokens_out = getattr(usage, "candidates_token_count", None)
+        return text, tokens_in, tokens_out
+
+    def stream(self, prompt, timeout):
+        response = self._client.generate_content(
+            prompt, stream=True, request_options={"timeout": timeout}
+        )
+        usage = None
+        for chunk in response:
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            if chunk.text:
+                yield chunk.text
+        # o uso de tokens vem no último pedaço
+        return (
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None),
+        )
+
+
+class StubBackend:
+    """
+    Resposta simulada para desenvolvimento local (sem GEMINI_API_KEY).
+    """
+
+    model = "stub"
+
+    def generate(self, prompt, timeout):
+        text = f"[Stub LLM] Resposta simulada (modo offline) para o prompt: {prompt[:300]}..."
+        return text, None, None
+
+    def stream(self, prompt, timeout):
+        text, _, _ = self.generate(prompt, timeout)
+        yield from split_words(text)
+        return None, None
+
+
+class FakeBackend:
+    """
+    Backend local para testes de vazão: dorme ~latency_ms (±50%) e falha com
+    probabilidade fail_rate (erro transitório). Respeita o timeout.
+    """
+
+    model = "fake"
+
+    def __init__(
+        self,
+        latency_ms=LLM_FAKE_LATENCY_MS,
+        fail_rate=LLM_FAKE_FAIL_RATE,
+        seed=None,
+        token_ms=LLM_FAKE_TOKEN_MS,
+    ):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.token_ms = token_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _wait(self, timeout):
+        with self._lock:
+            delay = self.latency_ms / 1000 * self._rng.uniform(0.5, 1.5)
+            fail = self._rng.random() < self.fail_rate
+        if delay > timeout:
+            time.sleep(timeout)
+            raise LLMTimeout(f"fake: {delay:.2f}s > timeout {timeout:.2f}s")
+        time.sleep(delay)
+        if fail:
+            raise TransientLLMError("fake: falha simulada")
+
+    def generate(self, prompt, timeout):
+        self._wait(timeout)
+        text = f"[Fake LLM] resposta para: {prompt[:200]}"
+        return text, None, None
+
+    def stream(self, prompt, timeout):
+        # a latência simulada vale até o primeiro pedaço
+        self._wait(timeout)
+        for i, word in enumerate(split_words(f"[Fake LLM] resposta para: {prompt[:200]}")):
+            if i:
+                time.sleep(self.token_ms / 1000)
+            yield word
+        return None, None
+
+
+def backend_name():
+    name = os.environ.get("EDA_LLM_BACKEND", "").strip().lower()
+    if name:
+        return name
+    return "gemini" if os.getenv("GEMINI_API_KEY") else "stub"
+
+
+class LLMGateway:
+    """
+    Chamadas ao LLM com cliente reaproveitado, concorrência limitada,
+    timeout, retry com backoff e métricas.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        timeout_s=LLM_TIMEOUT_S,
+        retries=LLM_RETRIES,
+        backoff_s=LLM_BACKOFF_S,
+        backoff_max_s=LLM_BACKOFF_MAX_S,
+        backend=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self._fixed_backend = backend
+        self._backends = {}
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.wait_s = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.first_chunk = deque(maxlen=LATENCY_WINDOW)
+
+    def backend(self):
+        """
+        Backend atual (criado uma vez por nome e chave de API).
+        """
+        if self._fixed_backend is not None:
+            return self._fixed_backend
+        name = backend_name()
+        key = (name, os.getenv("GEMINI_API_KEY") if name == "gemini" else None)
+        with self._lock:
+            backend = self._backends.get(key)
+            if backend is None:
+                if name == "gemini":
+                    backend = GeminiBackend(key[1])
+                elif name == "fake":
+                    backend = FakeBackend()
+                elif name == "stub":
+                    backend = StubBackend()
+                else:
+                    raise ValueError(f"EDA_LLM_BACKEND inválido: {name}")
+                self._backends[key] = backend
+        return backend
+
+    def model_name(self):
+        """
+        Modelo que vai responder, sem criar o cliente (usado na chave do cache).
+        """
+        if self._fixed_backend is not None:
+            return self._fixed_backend.model
+        name = backend_name()
+        return GEMINI_MODEL if name == "gemini" else name
+
+    def _backoff(self, attempt):
+        # "full jitter": espera aleatória até o teto exponencial
+        cap = min(self.backoff_max_s, self.backoff_s * (2**attempt))
+        return self._rng.uniform(0, cap)
+
+    def _acquire(self, timeout):
+        """
+        Espera uma vaga no semáforo. Retorna o instante em que a conseguiu.
+        """
+        t0 = time.perf_counter()
+        if not self._semaphore.acquire(timeout=timeout):
+            raise LLMTimeout(f"sem vaga para chamar o LLM em {timeout:.1f}s")
+        t1 = time.perf_counter()
+        with self._lock:
+            self.wait_s += t1 - t0
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return t1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def _attempt(self, backend, prompt, timeout):
+        t1 = self._acquire(timeout)
+        try:
+            result = backend.generate(prompt, timeout)
+        finally:
+            self._release()
+        # latência do backend, sem a espera pela vaga
+        with self._lock:
+            self.latencies.append(time.perf_counter() - t1)
+        return result
+
+    def _attempt_stream(self, backend, prompt, timeout):
+        t1 = self._acquire(timeout)
+        try:
+            usage = yield from self._timed_first(backend.stream(prompt, timeout), t1)
+        finally:
+            # também quando o cliente desiste no meio (close() do gerador)
+            self._release()
+        with self._lock:
+            self.latencies.append(time.perf_counter() - t1)
+        return usage
+
+    def _timed_first(self, chunks, t1):
+        """
+        Repassa os pedaços, registrando o tempo até o primeiro.
+        """
+        first = True
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration as stop:
+                return stop.value
+            if first:
+                first = False
+                with self._lock:
+                    self.first_chunk.append(time.perf_counter() - t1)
+            yield chunk
+
+    def _failed(self, e, attempt, retryable=True):
+        """
+        Conta a falha e decide se vale nova tentativa (já esperando o backoff).
+        """
+        with self._lock:
+            self.errors += 1
+            if isinstance(e, TimeoutError) or type(e).__name__ == "DeadlineExceeded":
+                self.timeouts += 1
+        if not retryable or attempt >= self.retries or not is_retryable(e):
+            return False
+        with self._lock:
+            self.retried += 1
+        time.sleep(self._backoff(attempt))
+        return True
+
+    def _count_tokens(self, prompt, text, tokens_in, tokens_out):
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += tokens_in if tokens_in is not None else estimate_tokens(prompt)
+            self.tokens_out += tokens_out if tokens_out is not None else estimate_tokens(text)
+
+    def generate(self, prompt, timeout=None):
+        """
+        Texto gerado para o prompt. Levanta a última exceção se todas as
+        tentativas falharem.
+        """
+        timeout = self.timeout_s if timeout is None else timeout
+        backend = self.backend()
+        for attempt in range(self.retries + 1):
+            try:
+                text, tokens_in, tokens_out = self._attempt(backend, prompt, timeout)
+            except Exception as e:
+                if self._failed(e, attempt):
+                    continue
+                raise
+            self._count_tokens(prompt, text, tokens_in, tokens_out)
+            return text
+
+    def stream(self, prompt, timeout=None):
+        """
+        Gerador com os pedaços do texto à medida que chegam. Uma falha antes
+        do primeiro pedaço é repetida como em generate(); depois dele, é levantada.
+        """
+        timeout = self.timeout_s if timeout is None else timeout
+        backend = self.backend()
+        for attempt in range(self.retries + 1):
+            parts = []
+            chunks = self._attempt_stream(backend, prompt, timeout)
+            try:
+                while True:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration as stop:
+                        tokens_in, tokens_out = stop.value or (None, None)
+                        break
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if self._failed(e, attempt, retryable=not parts):
+                    continue
+                raise
+            finally:
+                # libera a vaga já, mesmo se quem consome parar no meio
+                chunks.close()
+            self._count_tokens(prompt, "".join(parts), tokens_in, tokens_out)
+            return
+
+    def stats(self):
+        with self._lock:
+            lat = sorted(self.latencies)
+            stats = {
+                "backend": self.model_name(),
+                "max_concurrency": self.max_concurrency,
+                "timeout_s": self.timeout_s,
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retried,
+                "timeouts": self.timeouts,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "wait_total_s": self.wait_s,
+            }
+            first = sorted(self.first_chunk)
+        for prefix, values in (("latency", lat), ("first_chunk", first)):
+            for q in (50, 95):
+                stats[f"{prefix}_p{q}_ms"] = (
+                    values[min(len(values) - 1, q * len(values) // 100)] * 1000
+                    if values
+                    else None
+                )
+        return stats
+
+
+GATEWAY = LLMGateway()
@@ -0,0 +1,213 @@
+"""
+persistence.py
+
+Acesso ao banco SQLite (metadados, histórico, insights) com segurança entre threads.
+Cada thread do servidor usa a sua própria conexão (threading.local), com o banco
+em modo WAL: leituras não bloqueiam escritas nem umas às outras.
+Todas as escritas passam por uma fila atendida por uma única thread escritora,
+que junta os comandos pendentes numa só transação (group commit) em vez de um
+commit por INSERT; quem escreve espera só o commit do lote em que entrou.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Caminho do banco de dados SQLite (persistência dos metadados e histórico)
+DB_PATH = os.environ.get("EDA_DB_PATH", "db/memory.db")
+# Espera máxima (ms) por um lock do banco antes de falhar com "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("EDA_DB_BUSY_TIMEOUT_MS", "5000"))
+# Máximo de comandos por transação da fila de escrita e quanto esperar (ms)
+# por mais comandos antes de fazer o commit do lote
+DB_BATCH_MAX = int(os.environ.get("EDA_DB_BATCH_MAX", "500"))
+DB_BATCH_WAIT_MS = float(os.environ.get("EDA_DB_BATCH_WAIT_MS", "2"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    # com WAL, NORMAL é seguro contra corrupção e evita um fsync por commit
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def connect(path):
+    """
+    Abre uma conexão com os pragmas do projeto aplicados.
+    """
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class WriteQueue:
+    """
+    Fila de escrita: uma thread dedicada executa os comandos em lotes,
+    um commit por lote. Se o lote falhar, os comandos são refeitos um a um,
+    para que só o comando com erro receba a exceção.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.statements = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="eda-db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, sql, params=(), many=False):
+        """
+        Enfileira um comando de escrita. Retorna um Future com o rowcount.
+        """
+        fut = Future()
+        self._ensure_thread()
+        self._queue.put((sql, params, many, fut))
+        return fut
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            # junta o que chegar enquanto o primeiro comando espera
+            try:
+                while len(batch) < DB_BATCH_MAX:
+                    batch.append(self._queue.get(timeout=DB_BATCH_WAIT_MS / 1000))
+            except queue.Empty:
+                pass
+            self._execute(conn, batch)
+
+    def _execute(self, conn, batch):
+        try:
+            with conn:
+                counts = [self._apply(conn, item) for item in batch]
+        except Exception:
+            for item in batch:
+                try:
+                    with conn:
+                        count = self._apply(conn, item)
+                    item[3].set_result(count)
+                except Exception as e:
+                    item[3].set_exception(e)
+        else:
+            for item, count in zip(batch, counts):
+                item[3].set_result(count)
+        self.batches += 1
+        self.statements += len(batch)
+
+    @staticmethod
+    def _apply(conn, item):
+        sql, params, many, _ = item
+        if sql is None:
+            return 0
+        cur = conn.executemany(sql, params) if many else conn.execute(sql, params)
+        return cur.rowcount
+
+
+class Database:
+    """
+    Ponto único de acesso ao banco: conexões por thread para leitura e
+    fila de escrita com commits agrupados.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self.writes = WriteQueue(path)
+
+    def connection(self):
+        """
+        Conexão da thread atual (criada na primeira chamada).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql, params=()):
+        """
+        Executa uma leitura e retorna todas as linhas.
+        """
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """
+        Executa uma leitura e retorna a primeira linha (ou None).
+        """
+        return self.connection().execute(sql, params).fetchone()
+
+    def write(self, sql, params=(), wait=True):
+        """
+        Escreve pela fila. Com wait=True, retorna o rowcount após o commit.
+        """
+        fut = self.writes.submit(sql, params)
+        return fut.result() if wait else fut
+
+    def write_many(self, sql, rows, wait=True):
+        """
+        executemany pela fila (um único comando do lote).
+        """
+        fut = self.writes.submit(sql, list(rows), many=True)
+        return fut.result() if wait else fut
+
+    def flush(self):
+        """
+        Espera até que todas as escritas enfileiradas até aqui estejam gravadas.
+        """
+        self.writes.submit(None).result()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Transação explícita na conexão da thread (para DDL e migrações).
+        Com immediate=True, o lock de escrita é tomado já no início
+        (BEGIN IMMEDIATE), o que também inclui os comandos DDL na transação.
+        Escritas normais devem usar write()/write_many().
+        """
+        conn = self.connection()
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            yield conn
+
+    def user_version(self):
+        return self.query_one("PRAGMA user_version")[0]
+
+    def migrate(self, migrations):
+        """
+        Aplica, numa única transação, as migrações [(versão, função(conn)), ...]
+        com versão maior que o PRAGMA user_version do banco, e o atualiza.
+        Retorna as versões aplicadas.
+        """
+        applied = []
+        with self.transaction(immediate=True) as conn:
+            # relido dentro do lock: outro processo pode ter migrado antes
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, step in migrations:
+                if version > current:
+                    step(conn)
+                    conn.execute(f"PRAGMA user_version={int(version)}")
+                    applied.append(version)
+        return applied
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "write_batches": self.writes.batches,
+            "write_statements": self.writes.statements,
+        }
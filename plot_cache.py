@@ -0,0 +1,97 @@
+"""
+plot_cache.py
+
+Cache em disco dos gráficos renderizados (PNG).
+Cada gráfico é endereçado pelo hash de (dataset_id, tipo, colunas, parâmetros) e
+servido por GET /api/plots/<hash>.png, então requisições repetidas não
+re-renderizam a figura nem trafegam base64 no JSON.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from dataset_store import DATA_DIR
+
+PLOT_DIR = os.environ.get("EDA_PLOT_DIR", os.path.join(DATA_DIR, "plots"))
+os.makedirs(PLOT_DIR, exist_ok=True)
+
+# Incrementar quando a forma de renderizar mudar, para invalidar o cache
+PLOT_VERSION = 1
+
+PLOT_URL_PREFIX = "/api/plots/"
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def plot_key(dataset_id, kind, cols, params=None):
+    """
+    Hash (sha256) que identifica um gráfico.
+    """
+    payload = json.dumps(
+        [PLOT_VERSION, dataset_id, kind, list(cols), params or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_valid_key(key):
+    return bool(_KEY_RE.match(key or ""))
+
+
+def plot_file(key):
+    return os.path.join(PLOT_DIR, f"{key}.png")
+
+
+def plot_url(key):
+    return f"{PLOT_URL_PREFIX}{key}.png"
+
+
+def url_exists(url):
+    """
+    Indica se a URL aponta para um gráfico presente no cache.
+    """
+    if not url.startswith(PLOT_URL_PREFIX):
+        return False
+    key = url[len(PLOT_URL_PREFIX) :].rsplit(".", 1)[0]
+    return is_valid_key(key) and os.path.exists(plot_file(key))
+
+
+def fig_to_png(fig):
+    """
+    Renderiza um matplotlib figure em bytes PNG e fecha a figura.
+    """
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def store_png(key, png_bytes):
+    """
+    Grava o PNG no cache (escrita atômica) e retorna a URL.
+    """
+    path = plot_file(key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(png_bytes)
+    os.replace(tmp, path)
+    return plot_url(key)
+
+
+def cached_plot(dataset_id, kind, cols, params, render):
+    """
+    Retorna a URL do gráfico, chamando render() (que devolve um figure)
+    apenas se ele ainda não estiver no cache.
+    """
+    key = plot_key(dataset_id, kind, cols, params)
+    if os.path.exists(plot_file(key)):
+        return plot_url(key)
+    return store_png(key, fig_to_png(render()))
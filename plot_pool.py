@@ -0,0 +1,155 @@
+"""
+plot_pool.py
+
+Renderização de gráficos do resumo em um pool de processos.
+O matplotlib é CPU-bound e segura o GIL, então os gráficos de quick_summary são
+desenhados em paralelo em processos separados. Cada tarefa recebe apenas os
+arrays NumPy das colunas necessárias e devolve o PNG e o tempo de renderização.
+
+EDA_PLOT_WORKERS define o número de processos (0 ou 1 = renderização serial).
+Este módulo não importa eda_agent, para que os workers subam rápido; o servidor
+sobe por server.py, que os workers reimportam sem carregar o backend.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from plot_cache import fig_to_png
+
+PLOT_WORKERS = int(
+    os.environ.get("EDA_PLOT_WORKERS", str(min(8, os.cpu_count() or 1)))
+)
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def histogram_figure(values, col):
+    """
+    Histograma de um array numérico (sem NaN).
+    """
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.hist(values, bins=30)
+    ax.set_ylabel("Frequency")
+    ax.set_title(f"Histograma: {col}")
+    return fig
+
+
+def boxplot_figure(values, col):
+    """
+    Boxplot de um array numérico (sem NaN).
+    """
+    fig, ax = plt.subplots(figsize=(4, 3))
+    ax.boxplot(values)
+    ax.set_xticks([1], [col])
+    ax.set_title(f"Boxplot: {col}")
+    return fig
+
+
+def correlation_figure(corr, numeric_cols):
+    """
+    Heatmap a partir de uma matriz de correlação.
+    """
+    fig, ax = plt.subplots(figsize=(6, 5))
+    cax = ax.matshow(corr)
+    fig.colorbar(cax)
+    ax.set_xticks(range(len(numeric_cols)))
+    ax.set_xticklabels(numeric_cols, rotation=90)
+    ax.set_yticks(range(len(numeric_cols)))
+    ax.set_yticklabels(numeric_cols)
+    ax.set_title("Matriz de Correlação")
+    return fig
+
+
+RENDERERS = {
+    "hist": histogram_figure,
+    "box": boxplot_figure,
+    "corr_heatmap": correlation_figure,
+}
+
+
+def render_task(kind, args):
+    """
+    Executa uma tarefa de renderização. Retorna (png_bytes, segundos).
+    """
+    t0 = time.perf_counter()
+    png = fig_to_png(RENDERERS[kind](*args))
+    return png, time.perf_counter() - t0
+
+
+def _get_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # forkserver/spawn: não herda threads nem conexões do servidor Flask
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("forkserver")
+                # o servidor já importa matplotlib uma vez; os workers nascem prontos
+                ctx.set_forkserver_preload(["plot_pool"])
+            else:
+                ctx = multiprocessing.get_context("spawn")
+            _POOL = ProcessPoolExecutor(max_workers=PLOT_WORKERS, mp_context=ctx)
+        return _POOL
+
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def warm_up():
+    """
+    Sobe o pool e faz um gráfico descartável em cada worker, para que o
+    primeiro upload não pague a inicialização do matplotlib nos processos.
+    """
+    if PLOT_WORKERS <= 1:
+        return
+    values = [0.0, 1.0, 2.0]
+    tasks = {f"warmup_{i}": ("hist", (values, "warmup")) for i in range(PLOT_WORKERS)}
+    render_many(tasks)
+
+
+def render_many(tasks):
+    """
+    Renderiza várias tarefas {nome: (tipo, args)}.
+    Retorna {nome: (png_bytes, segundos)}, na ordem das tarefas.
+    Tarefas que falham ficam de fora do resultado.
+    """
+    results = {}
+    if PLOT_WORKERS > 1 and len(tasks) > 1:
+        try:
+            pool = _get_pool()
+            futures = {
+                name: pool.submit(render_task, kind, args)
+                for name, (kind, args) in tasks.items()
+            }
+            for name, fut in futures.items():
+                try:
+                    results[name] = fut.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    continue
+            return results
+        except BrokenProcessPool:
+            # um worker morreu: recria o pool na próxima vez e segue em série
+            _reset_pool()
+            results = {}
+    for name, (kind, args) in tasks.items():
+        try:
+            results[name] = render_task(kind, args)
+        except Exception:
+            continue
+    return results
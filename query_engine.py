@@ -0,0 +1,652 @@
+"""
+query_engine.py
+
+Respostas locais (sem LLM) para perguntas de agregação em português ou inglês.
+A pergunta é normalizada (minúsculas, sem acentos), as expressões conhecidas
+viram marcadores (agregações, comparações, "por", top-n, quantis) e as colunas
+citadas são reconhecidas pelo nome, exato ou aproximado (difflib). O resultado
+é um plano pequeno (QueryPlan): agregação, filtros, agrupamento e top-n, que
+execute() roda vetorizado no DataFrame. Se a pergunta não couber na gramática,
+parse_question() retorna None e ela segue para o LLM.
+
+Exemplos: "média de valor por cidade", "quantos registros com idade > 30",
+"top 5 cidades por valor", "percentil 90 do peso em Recife",
+"how many distinct cidade", "qual cidade tem a maior média de valor".
+"""
+
+import difflib
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+# Similaridade mínima (0-1) para aceitar um nome de coluna aproximado
+QUERY_FUZZY_CUTOFF = float(os.environ.get("EDA_QUERY_FUZZY_CUTOFF", "0.8"))
+# Máximo de categorias de uma coluna para reconhecer os seus valores na pergunta
+QUERY_MAX_CATEGORIES = int(os.environ.get("EDA_QUERY_MAX_CATEGORIES", "1000"))
+# Linhas mostradas em respostas agrupadas sem top-n
+QUERY_GROUP_ROWS = 20
+# Palavras seguidas que podem formar um valor de categoria ("sao paulo")
+MAX_VALUE_WORDS = 4
+
+# palavras que não devem casar (aproximadamente) com nomes de colunas ou categorias
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "no", "na",
+    "nos", "nas", "um", "uma", "que", "qual", "quais", "com", "para", "se", "ou",
+    "tem", "ha", "sao", "the", "of", "in", "on", "is", "are", "what", "which",
+    "and", "or", "for", "with", "where", "to", "coluna", "colunas", "column",
+    "columns", "campo", "field", "registro", "registros", "linha", "linhas",
+    "row", "rows", "record", "records", "valores", "values", "dataset", "dados",
+    "data", "onde", "quando", "cujo", "cuja", "me", "diga", "mostre", "show",
+}
+
+# palavras da pergunta que não pedem nada ao plano ("calcule", "por favor");
+# qualquer outra palavra que sobrar manda a pergunta para o LLM
+FILLER_WORDS = {
+    "quanto", "quanta", "foi", "foram", "sera", "existe",
+    "existem", "temos", "possui", "possuem", "calcule", "calcular", "informe",
+    "liste", "listar", "retorne", "encontre", "favor", "mim", "pra", "geral",
+    "todo", "toda", "todos", "todas", "valor", "tabela", "arquivo", "base",
+    "was", "were", "does", "we", "there", "have", "has", "s", "i",
+    "give", "get", "find", "list", "tell", "please", "compute", "calculate",
+    "return", "all", "overall", "value", "table", "file", "an",
+}
+
+# perguntas que pedem explicação, não um número: vão direto ao LLM
+EXPLAIN_RE = re.compile(
+    r"^\W*(?:por\s*que|pq|por qual motivo|explique|explica|explicar|justifique|"
+    r"interprete|o que explica|como se explica|why|explain|what explains)\b"
+)
+
+# conectivos de nomes próprios: "rio de janeiro" não é o valor "rio"
+NAME_CONNECTORS = {"de", "da", "do", "das", "dos", "del", "of"}
+
+# (regex, marcador), aplicados em ordem sobre o texto normalizado
+PHRASES = [
+    # quantis e top-n primeiro: consomem os números que os acompanham
+    (r"\b(?:percentil|percentile)\s*(\d+(?:[.,]\d+)?)", lambda m: f" @q:{_num(m[1]) / 100} "),
+    (r"\b(\d+(?:[.,]\d+)?)\s*(?:o|º|th|st|nd|rd)?\s*(?:percentil|percentile)\b", lambda m: f" @q:{_num(m[1]) / 100} "),
+    (r"\bp(\d{1,2})\b", lambda m: f" @q:{int(m[1]) / 100} "),
+    (r"\b(?:quantil|quantile)\s*(0?[.,]\d+)", lambda m: f" @q:{_num(m[1])} "),
+    (r"\b(?:primeiro|1o|first)\s+quartil|\bfirst\s+quartile\b|\bq1\b", " @q:0.25 "),
+    (r"\b(?:terceiro|3o|third)\s+quartil|\bthird\s+quartile\b|\bq3\b", " @q:0.75 "),
+    (r"\btop\s*(\d+)\b", lambda m: f" @top:{m[1]} "),
+    (r"\b(\d+)\s+(?:maiores|primeir[oa]s|mais|largest|highest|biggest|top)\b", lambda m: f" @top:{m[1]} "),
+    (r"\b(\d+)\s+(?:menores|ultim[oa]s|smallest|lowest|bottom)\b", lambda m: f" @bottom:{m[1]} "),
+    # comparações (as compostas antes das simples)
+    (r">=|\bmaior ou igual (?:a|que)\b|\bgreater than or equal to\b|\bat least\b|\bpelo menos\b", " @ge "),
+    (r"<=|\bmenor ou igual (?:a|que)\b|\bless than or equal to\b|\bat most\b", " @le "),
+    (r"!=|<>|\bdiferente de\b|\bdifferent from\b|\bnot equal to\b", " @ne "),
+    (r">|\bmaior (?:do )?que\b|\bacima de\b|\bsuperior a\b|\bmais (?:do )?que\b|\bmais de\b|\bgreater than\b|\bmore than\b|\babove\b|\bover\b", " @gt "),
+    (r"<|\bmenor (?:do )?que\b|\babaixo de\b|\binferior a\b|\bmenos (?:do )?que\b|\bmenos de\b|\bless than\b|\bfewer than\b|\bbelow\b|\bunder\b", " @lt "),
+    (r"==|=|\bigual a\b|\bequal to\b|\bequals\b", " @eq "),
+    (r"\bentre\b|\bbetween\b", " @between "),
+    # agregações
+    (r"\bdesvio[ -]padrao\b|\bstandard deviation\b|\bstd\b|\bstdev\b", " @std "),
+    (r"\bmediana\b|\bmedian\b", " @median "),
+    (r"\bmedi[ao]s?\b|\baverage\b|\bmean\b|\bavg\b", " @mean "),
+    (r"\b(?:ausentes|faltantes|nulos|vazios|missing|nulls?|nan)\b", " @missing "),
+    (r"\b(?:distint[oa]s?|unic[oa]s?|diferentes|distinct|unique)\b", " @nunique "),
+    (r"\b(?:quant[oa]s|quantidade|contagem|numero de|count|how many|number of)\b", " @count "),
+    (r"\b(?:soma|somatorio|total|sum)\b", " @sum "),
+    (r"\b(?:minim[oa]s?|menor|min|minimum|lowest|smallest)\b", " @min "),
+    (r"\b(?:maxim[oa]s?|maior|max|maximum|highest|largest|biggest)\b", " @max "),
+    # agrupamento
+    (r"\b(?:agrupad[oa]s? por|para cada|em cada|for each|grouped by|por|by|per)\b", " @by "),
+]
+PHRASES = [(re.compile(p), r) for p, r in PHRASES]
+
+TOKEN_RE = re.compile(r"@\w+(?::[\d.]+)?|'[^']*'|\"[^\"]*\"|-?\d+(?:[.,]\d+)?|\w+")
+
+CMP_OPS = {"@ge": ">=", "@le": "<=", "@ne": "!=", "@gt": ">", "@lt": "<", "@eq": "="}
+AGG_OPS = ("missing", "nunique", "std", "median", "mean", "sum", "count")
+# agregações que exigem coluna numérica
+NUMERIC_OPS = {"std", "median", "mean", "sum", "min", "max", "quantile"}
+
+OP_NAMES = {
+    "mean": "média",
+    "median": "mediana",
+    "sum": "soma",
+    "min": "mínimo",
+    "max": "máximo",
+    "std": "desvio padrão",
+    "count": "contagem",
+    "nunique": "valores distintos",
+    "missing": "valores ausentes",
+    "quantile": "quantil",
+    "top": "maiores valores",
+    "bottom": "menores valores",
+    "value_counts": "mais frequentes",
+}
+
+
+def normalize(text):
+    """
+    Minúsculas e sem acentos, para comparar perguntas, colunas e categorias.
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def _num(text):
+    return float(text.replace(",", "."))
+
+
+def is_numeric(dtype):
+    """
+    Numérica para agregações (booleanas contam como categorias).
+    """
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def is_categorical(dtype):
+    """
+    Categórica: nem numérica nem data.
+    """
+    return not is_numeric(dtype) and not pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+class QueryPlan:
+    """
+    Plano de uma pergunta: op sobre column, com filtros [(coluna, operador, valor)],
+    agrupamento opcional e top-n (n, ascending).
+    """
+
+    def __init__(self, op, column=None, group_by=None, filters=None, q=None, top=None, ascending=False, pick=False):
+        self.op = op
+        self.column = column
+        self.group_by = group_by
+        self.filters = filters or []
+        self.q = q
+        self.top = top
+        self.ascending = ascending
+        # em perguntas "qual X tem a maior ...": só a melhor categoria
+        self.pick = pick
+
+    def columns(self):
+        cols = [self.column, self.group_by] + [f[0] for f in self.filters]
+        return list(dict.fromkeys(c for c in cols if c is not None))
+
+    def to_dict(self):
+        return {
+            "op": self.op,
+            "column": self.column,
+            "group_by": self.group_by,
+            "filters": [list(f) for f in self.filters],
+            "q": self.q,
+            "top": self.top,
+            "ascending": self.ascending,
+            "pick": self.pick,
+        }
+
+    def describe(self):
+        """
+        Descrição curta do plano, em português.
+        """
+        name = OP_NAMES.get(self.op, self.op)
+        if self.op == "quantile":
+            name = f"percentil {self.q * 100:g}"
+        text = f"{name} de {self.column}" if self.column else name
+        if self.op == "count" and not self.column:
+            text = "número de registros"
+        if self.group_by:
+            text += f" por {self.group_by}"
+        if self.top and self.op not in ("top", "bottom", "value_counts"):
+            text = f"top {self.top} ({'menores' if self.ascending else 'maiores'}): {text}"
+        if self.filters:
+            conds = " e ".join(
+                f"{c} {op} {v:g}" if isinstance(v, float) else f"{c} {op} {v}"
+                for c, op, v in self.filters
+            )
+            text += f" onde {conds}"
+        return text
+
+
+def frame_categories(df, max_categories=QUERY_MAX_CATEGORIES):
+    """
+    Função coluna -> valores distintos (None se a coluna tiver categorias
+    demais), calculados sob demanda a partir do DataFrame.
+    """
+    cache = {}
+
+    def categories(col):
+        if col not in cache:
+            values = df[col].dropna().unique()
+            cache[col] = list(values) if len(values) <= max_categories else None
+        return cache[col]
+
+    return categories
+
+
+class _Matcher:
+    """
+    Reconhece nomes de colunas em sequências de palavras.
+    """
+
+    def __init__(self, columns):
+        self.by_name = {}
+        for col in columns:
+            name = " ".join(re.split(r"[\s_\-.]+", normalize(col))).strip()
+            self.by_name.setdefault(name, col)
+        self.by_len = {}
+        for name in self.by_name:
+            self.by_len.setdefault(len(name.split()), []).append(name)
+        self.max_words = max(self.by_len, default=1)
+
+    def match(self, words):
+        phrase = " ".join(words)
+        if phrase in self.by_name:
+            return self.by_name[phrase]
+        if len(words) == 1 and (words[0] in STOPWORDS or len(words[0]) < 3):
+            return None
+        close = difflib.get_close_matches(
+            phrase, self.by_len.get(len(words), []), n=1, cutoff=QUERY_FUZZY_CUTOFF
+        )
+        return self.by_name[close[0]] if close else None
+
+
+def tokenize(question, columns):
+    """
+    Lista de itens (tipo, valor): col, op, cmp, by, between, q, top, num, str, word.
+    """
+    matcher = _Matcher(columns)
+    text = normalize(question)
+    # nomes exatos antes dos marcadores: "valor total" não vira "valor @sum"
+    names = sorted(
+        (n for n in matcher.by_name if n not in STOPWORDS), key=len, reverse=True
+    )
+    index = {}
+    for name in names:
+        pattern = r"(?<![\w@:])" + r"[\s_\-.]+".join(map(re.escape, name.split())) + r"(?!\w)"
+        text, count = re.subn(pattern, f" @col:{len(index)} ", text)
+        if count:
+            index[len(index)] = matcher.by_name[name]
+    for pattern, repl in PHRASES:
+        text = pattern.sub(repl, text)
+    raw = TOKEN_RE.findall(text)
+
+    items = []
+    for tok in raw:
+        if tok.startswith("@col:"):
+            items.append(("col", index[int(tok[5:])]))
+        elif tok.startswith("@q:"):
+            items.append(("q", float(tok[3:])))
+        elif tok.startswith("@top:"):
+            items.append(("top", (int(tok[5:]), False)))
+        elif tok.startswith("@bottom:"):
+            items.append(("top", (int(tok[8:]), True)))
+        elif tok in CMP_OPS:
+            items.append(("cmp", CMP_OPS[tok]))
+        elif tok == "@by":
+            items.append(("by", None))
+        elif tok == "@between":
+            items.append(("between", None))
+        elif tok.startswith("@"):
+            items.append(("op", tok[1:]))
+        elif tok[0] in "'\"":
+            items.append(("str", tok[1:-1]))
+        elif re.fullmatch(r"-?\d+(?:[.,]\d+)?", tok):
+            items.append(("num", _num(tok)))
+        else:
+            items.append(("word", tok))
+
+    # nomes aproximados: as sequências de palavras mais longas primeiro
+    i = 0
+    out = []
+    while i < len(items):
+        found = None
+        for size in range(min(matcher.max_words, len(items) - i), 0, -1):
+            span = items[i : i + size]
+            if all(kind == "word" for kind, _ in span):
+                col = matcher.match([w for _, w in span])
+                if col is not None:
+                    found = (col, size)
+                    break
+        if found:
+            out.append(("col", found[0]))
+            i += found[1]
+        else:
+            out.append(items[i])
+            i += 1
+    return out
+
+
+def _match_value(items, start, values):
+    """
+    Casa as palavras a partir de items[start] com um dos valores de categoria,
+    inteiro: "rio de janeiro" não casa com o valor "rio".
+    Retorna (valor, itens consumidos) ou (None, 0).
+    """
+    if not values:
+        return None, 0
+    lookup = {normalize(v): v for v in values}
+    if items[start][0] in ("str", "num"):
+        key = normalize(items[start][1])
+        if items[start][0] == "num":
+            key = f"{items[start][1]:g}"
+        return (lookup[key], 1) if key in lookup else (None, 0)
+    for size in range(MAX_VALUE_WORDS, 0, -1):
+        span = items[start : start + size]
+        if len(span) < size or any(kind != "word" for kind, _ in span):
+            continue
+        key = " ".join(w for _, w in span)
+        if key in lookup:
+            if _continues_name(items, start + size):
+                return None, 0
+            return lookup[key], size
+    return None, 0
+
+
+def _continues_name(items, i):
+    """
+    Se as palavras em items[i:] continuam o nome citado antes delas
+    ("janeiro" ou "de janeiro" depois de "rio").
+    """
+    words = []
+    for kind, value in items[i : i + 2]:
+        if kind != "word":
+            break
+        words.append(value)
+    if words and words[0] not in STOPWORDS and words[0] not in FILLER_WORDS:
+        return True
+    return (
+        len(words) == 2
+        and words[0] in NAME_CONNECTORS
+        and words[1] not in STOPWORDS
+        and words[1] not in FILLER_WORDS
+    )
+
+
+def parse_question(question, dtypes, categories):
+    """
+    Plano (QueryPlan) para a pergunta, ou None se ela não couber na gramática.
+    `dtypes` é uma Series coluna -> dtype e `categories(col)` devolve os valores
+    distintos de uma coluna categórica (ou None), como em frame_categories().
+    Palavras, números ou colunas que o plano não usaria deixam a pergunta
+    para o LLM, que não responde pela metade.
+    """
+    if EXPLAIN_RE.match(normalize(question)):
+        return None
+    items = tokenize(question, list(dtypes.index))
+    used = [False] * len(items)
+    filters = []
+
+    # filtros explícitos: coluna <comparação> valor, coluna entre a e b
+    for i, (kind, col) in enumerate(items):
+        if kind != "col" or used[i] or i + 2 >= len(items):
+            continue
+        nxt = items[i + 1][0]
+        if nxt == "cmp":
+            op = items[i + 1][1]
+            if is_numeric(dtypes[col]):
+                if items[i + 2][0] != "num":
+                    return None
+                filters.append((col, op, items[i + 2][1]))
+                size = 3
+            else:
+                val, n = _match_value(items, i + 2, categories(col))
+                if val is None or op not in ("=", "!="):
+                    return None
+                filters.append((col, op, val))
+                size = 2 + n
+            used[i : i + size] = [True] * size
+        elif nxt == "between" and i + 4 < len(items) and is_numeric(dtypes[col]):
+            lo, conj, hi = items[i + 2 : i + 5]
+            if lo[0] == "num" and hi[0] == "num" and conj in (("word", "e"), ("word", "and")):
+                lo, hi = sorted((lo[1], hi[1]))
+                filters += [(col, ">=", lo), (col, "<=", hi)]
+                used[i : i + 5] = [True] * 5
+    # comparação que não foi entendida: melhor deixar para o LLM
+    if any(k in ("cmp", "between") and not u for (k, _), u in zip(items, used)):
+        return None
+
+    # agrupamento: "por <coluna>"
+    group_by = None
+    for i, (kind, _) in enumerate(items):
+        if kind == "by" and i + 1 < len(items) and items[i + 1][0] == "col" and not used[i + 1]:
+            group_by = items[i + 1][1]
+            used[i] = used[i + 1] = True
+            break
+
+    # filtros implícitos: valor de uma categoria citado na pergunta ("em Recife")
+    cat_cols = [c for c in dtypes.index if is_categorical(dtypes[c]) and c != group_by]
+    i = 0
+    while i < len(items):
+        kind, value = items[i]
+        if used[i] or kind not in ("word", "str"):
+            i += 1
+            continue
+        hit = None
+        for col in cat_cols:
+            val, n = _match_value(items, i, categories(col))
+            # uma palavra comum sozinha não conta ("a", "e"); "sao paulo" sim
+            if val is not None and not (n == 1 and kind == "word" and value in STOPWORDS):
+                hit = (col, val, n)
+                break
+        if hit:
+            # "em Recife e Olinda" é um "ou", que a gramática não tem
+            if any(f[0] == hit[0] and f[1] == "=" for f in filters):
+                return None
+            filters.append((hit[0], "=", hit[1]))
+            used[i : i + hit[2]] = [True] * hit[2]
+            i += hit[2]
+        else:
+            i += 1
+
+    # conteúdo sem lugar no plano: "média de valor em 2023" não é a média geral
+    for (kind, value), u in zip(items, used):
+        if u:
+            continue
+        if kind in ("num", "str"):
+            return None
+        if kind == "word" and value not in STOPWORDS and value not in FILLER_WORDS:
+            return None
+
+    plan = _choose_plan(items, used, dtypes, filters, group_by)
+    if plan is None:
+        return None
+    # colunas e agregações citadas que o plano ignoraria ("média e mediana de valor")
+    cols = {v for (k, v), u in zip(items, used) if k == "col" and not u}
+    if cols - set(plan.columns()):
+        return None
+    bound = {plan.op, "count"}
+    if plan.top:
+        bound |= {"max", "min"}
+    if any(k == "op" and not u and v not in bound for (k, v), u in zip(items, used)):
+        return None
+    return plan
+
+
+def _choose_plan(items, used, dtypes, filters, group_by):
+    """
+    Plano para os itens que sobraram depois dos filtros e do agrupamento.
+    """
+    ops = {v for (k, v), u in zip(items, used) if k == "op" and not u}
+    q = next((v for k, v in items if k == "q"), None)
+    top = next((v for k, v in items if k == "top"), None)
+    filter_cols = {f[0] for f in filters}
+    targets = [
+        v for (k, v), u in zip(items, used) if k == "col" and not u and v != group_by
+    ]
+    targets = list(dict.fromkeys(targets))
+    numeric = [c for c in targets if is_numeric(dtypes[c])]
+    categorical = [c for c in targets if is_categorical(dtypes[c])]
+    agg = next((op for op in AGG_OPS if op in ops), None)
+    extreme = "max" if "max" in ops else "min" if "min" in ops else None
+
+    # "top 5 cidades por valor": o "por" aponta a métrica, não o grupo
+    if group_by and is_numeric(dtypes[group_by]) and categorical and not numeric:
+        group_by, numeric, categorical = categorical[0], [group_by], categorical[1:]
+
+    if q is not None:
+        if not numeric or not 0 <= q <= 1:
+            return None
+        return QueryPlan("quantile", numeric[0], group_by, filters, q=q)
+
+    if top is not None:
+        n, ascending = top
+        if group_by:
+            col = numeric[0] if numeric else None
+            op = agg or extreme or ("mean" if col else "count")
+            if op in NUMERIC_OPS and not col:
+                return None
+            return QueryPlan(op, col, group_by, filters, top=n, ascending=ascending)
+        if numeric:
+            return QueryPlan("bottom" if ascending else "top", numeric[0], None, filters, top=n, ascending=ascending)
+        if categorical:
+            return QueryPlan("value_counts", categorical[0], None, filters, top=n, ascending=ascending)
+        return None
+
+    # "qual cidade tem a maior média de valor": agrupa pela categoria e escolhe
+    if extreme and not group_by and numeric and categorical:
+        op = agg if agg in ("mean", "sum", "median", "std", "count") else extreme
+        return QueryPlan(op, numeric[0], categorical[0], filters, top=1, ascending=extreme == "min", pick=True)
+
+    if group_by:
+        if agg == "count" or (agg is None and extreme is None):
+            col = numeric[0] if numeric else (categorical[0] if categorical else None)
+            return QueryPlan("count", col if agg == "count" else None, group_by, filters)
+        op = agg or extreme
+        col = numeric[0] if numeric else (categorical[0] if categorical else None)
+        if col is None or (op in NUMERIC_OPS and col not in numeric):
+            return None
+        return QueryPlan(op, col, group_by, filters)
+
+    if agg in ("missing", "nunique"):
+        col = (targets or [None])[0]
+        if col is None and agg == "nunique":
+            return None
+        return QueryPlan(agg, col, None, filters)
+    if agg == "count":
+        col = next((c for c in targets if c not in filter_cols), None)
+        return QueryPlan("count", col, None, filters)
+    if agg or extreme:
+        if not numeric:
+            return None
+        return QueryPlan(agg or extreme, numeric[0], None, filters)
+    return None
+
+
+def apply_filters(df, filters):
+    """
+    Máscara booleana (vetorizada) das linhas que atendem a todos os filtros.
+    """
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        s = df[col]
+        if op == "=":
+            mask &= s == value
+        elif op == "!=":
+            mask &= s != value
+        elif op == ">":
+            mask &= s > value
+        elif op == ">=":
+            mask &= s >= value
+        elif op == "<":
+            mask &= s < value
+        elif op == "<=":
+            mask &= s <= value
+    return mask
+
+
+def python_value(value):
+    """
+    Escalar numpy -> tipo Python (para JSON).
+    """
+    return value.item() if hasattr(value, "item") else value
+
+
+def group_result(result, plan):
+    """
+    Series categoria -> valor de um agrupamento no formato da resposta:
+    ordenada, cortada no top-n (ou em QUERY_GROUP_ROWS) e, em "pick", só a primeira.
+    """
+    result = result.dropna().sort_values(ascending=plan.ascending, kind="stable")
+    result = result.head(plan.top or QUERY_GROUP_ROWS)
+    if plan.pick:
+        if result.empty:
+            return None
+        return {str(result.index[0]): python_value(result.iloc[0])}
+    return {str(k): python_value(v) for k, v in result.items()}
+
+
+def value_counts_result(counts, plan):
+    """
+    Contagens por valor (mais frequentes primeiro) cortadas no top-n.
+    """
+    counts = counts.nsmallest(plan.top) if plan.ascending else counts.head(plan.top)
+    return {str(k): int(v) for k, v in counts.items()}
+
+
+def execute(plan, df):
+    """
+    Roda o plano no DataFrame. Retorna um escalar, uma lista ou um dict
+    categoria -> valor (agrupamentos e contagens por categoria).
+    """
+    if plan.filters:
+        # contagem de ausentes sem coluna olha todas as colunas
+        cols = plan.columns() if plan.column or plan.op != "missing" else df.columns
+        df = df.loc[apply_filters(df, plan.filters), cols]
+    col = plan.column
+
+    if plan.group_by:
+        groups = df.groupby(plan.group_by, observed=True, sort=False)
+        if plan.op == "count" and col is None:
+            result = groups.size()
+        elif plan.op == "missing":
+            result = df[col].isna().groupby(df[plan.group_by], observed=True).sum()
+        elif plan.op == "quantile":
+            result = groups[col].quantile(plan.q)
+        else:
+            result = groups[col].agg(plan.op)
+        return group_result(result, plan)
+
+    if plan.op == "count":
+        return int(df[col].count()) if col else int(len(df))
+    if plan.op == "missing":
+        if col:
+            return int(df[col].isna().sum())
+        missing = df.isna().sum()
+        return {str(k): int(v) for k, v in missing[missing > 0].items()}
+    s = df[col]
+    if plan.op == "nunique":
+        return int(s.nunique())
+    if plan.op == "quantile":
+        return python_value(s.quantile(plan.q))
+    if plan.op in ("top", "bottom"):
+        values = s.nsmallest(plan.top) if plan.ascending else s.nlargest(plan.top)
+        return [python_value(v) for v in values]
+    if plan.op == "value_counts":
+        return value_counts_result(s.value_counts(), plan)
+    return python_value(s.agg(plan.op))
+
+
+def format_result(value):
+    """
+    Texto da resposta: escalares como estão; listas e dicts em uma linha.
+    """
+    def fmt(v):
+        return f"{v:.6g}" if isinstance(v, float) else str(v)
+
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {fmt(v)}" for k, v in value.items()) or "(nenhum resultado)"
+    if isinstance(value, list):
+        return ", ".join(fmt(v) for v in value) or "(nenhum resultado)"
+    return str(value)
+
+
+def answer_question(df, question, categories=None):
+    """
+    Resposta local para a pergunta: (valor, plano), ou None para seguir ao LLM.
+    """
+    plan = parse_question(question, df.dtypes, categories or frame_categories(df))
+    if plan is None:
+        return None
+    try:
+        value = execute(plan, df)
+    except (TypeError, ValueError, KeyError):
+        return None
+    if value is None:
+        return None
+    return value, plan
@@ -0,0 +1,14 @@
+"""
+server.py
+
+Ponto de entrada do backend: `python server.py` (CMD do Dockerfile.backend).
+Os workers do pool de gráficos (plot_pool, forkserver/spawn) reexecutam o
+módulo principal do processo como __mp_main__; este não importa nada fora do
+guard abaixo, então os workers não carregam Flask, sklearn e reportlab nem
+abrem o banco (init_db e migrações ficam só no servidor).
+"""
+
+if __name__ == "__main__":
+    from agente_mvp import main
+
+    main()
@@ -0,0 +1,152 @@
+"""
+sketches.py
+
+Sketch de quantis mesclável (estilo KLL) para colunas numéricas.
+Guarda O(k log(n/k)) valores em vez da coluna inteira: os limites do IQR
+saem do sketch em tempo constante em relação ao número de linhas, com erro
+de posto (rank) da ordem de 1.7/k. Pode ser construído em blocos, mesclado
+com outro sketch e serializado em JSON para persistência.
+"""
+
+import os
+
+import numpy as np
+
+SKETCH_K = int(os.environ.get("EDA_SKETCH_K", "200"))
+
+
+class QuantileSketch:
+    """
+    Sketch KLL: níveis de compactadores, onde cada item do nível h pesa 2**h.
+    Quando um nível passa da capacidade, é ordenado e metade dos itens
+    (posições pares ou ímpares, ao acaso) sobe para o nível seguinte.
+    """
+
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = int(k)
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values):
+        """
+        Adiciona um bloco de valores (NaN são ignorados). Retorna o próprio sketch.
+        """
+        v = np.asarray(values, dtype="float64").ravel()
+        v = v[~np.isnan(v)]
+        if v.size == 0:
+            return self
+        self.n += int(v.size)
+        vmin, vmax = float(v.min()), float(v.max())
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+        self.levels[0] = np.concatenate([self.levels[0], v])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Incorpora outro sketch (por exemplo, de outro bloco de linhas).
+        """
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            for h, items in enumerate(self.levels):
+                if items.size > self._capacity(h):
+                    break
+            else:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # com quantidade ímpar, o maior item fica no nível atual
+            rest = items[items.size - (items.size % 2) :]
+            items = items[: items.size - (items.size % 2)]
+            offset = int(self._rng.integers(0, 2))
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+            self.levels[h] = rest
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(level.size, 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Quantil(is) aproximado(s). Aceita um número ou uma lista de q em [0, 1].
+        """
+        scalar = np.isscalar(q)
+        qs = np.atleast_1d(np.asarray(q, dtype="float64"))
+        if self.n == 0:
+            out = np.full(qs.shape, np.nan)
+        else:
+            items, cum = self._weighted()
+            idx = np.searchsorted(cum, qs * cum[-1], side="left")
+            out = items[np.clip(idx, 0, items.size - 1)]
+            out = np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, out))
+        return float(out[0]) if scalar else out.tolist()
+
+    def rank(self, x):
+        """
+        Fração aproximada de valores <= x.
+        """
+        if self.n == 0:
+            return float("nan")
+        items, cum = self._weighted()
+        idx = np.searchsorted(items, x, side="right")
+        return float(cum[idx - 1] / cum[-1]) if idx else 0.0
+
+    def size(self):
+        """
+        Quantidade de valores guardados no sketch.
+        """
+        return int(sum(level.size for level in self.levels))
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "n": self.n,
+            "min": self.min,
+            "max": self.max,
+            "levels": [level.tolist() for level in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"])
+        sketch.n = data["n"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.levels = [np.asarray(level, dtype="float64") for level in data["levels"]]
+        return sketch
+
+
+def build_sketch(values, k=SKETCH_K, block=1_000_000):
+    """
+    Constrói o sketch de um array percorrendo-o em blocos.
+    """
+    sketch = QuantileSketch(k=k)
+    values = np.asarray(values, dtype="float64")
+    for start in range(0, values.size, block):
+        sketch.update(values[start : start + block])
+    return sketch
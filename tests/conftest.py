@@ -0,0 +1,17 @@
+"""
+conftest.py
+
+Banco, dados e LLM de teste: os módulos do backend leem essas variáveis ao
+serem importados, então elas são definidas antes de qualquer import.
+"""
+
+import os
+import sys
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="eda-tests-")
+os.environ.setdefault("EDA_DB_PATH", os.path.join(TEST_DIR, "memory.db"))
+os.environ.setdefault("EDA_DATA_DIR", os.path.join(TEST_DIR, "data"))
+os.environ["EDA_LLM_BACKEND"] = "stub"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
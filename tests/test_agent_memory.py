@@ -0,0 +1,75 @@
+"""
+test_agent_memory.py
+
+Busca de perguntas anteriores (search_memory) e o atalho de perguntas
+repetidas (find_duplicate).
+"""
+
+import pandas as pd
+
+from agent_memory import find_duplicate, save_memory, search_memory
+from dataset_store import save_dataset
+from eda_agent import save_query
+
+
+def test_search_tells_numbers_apart():
+    save_memory("mem-numbers", "Quais são os 5 clientes mais velhos?", "cinco")
+    save_memory("mem-numbers", "Quais são os 3 clientes mais velhos?", "três")
+    save_memory("mem-numbers", "Vendas do mês 1", "janeiro")
+    save_memory("mem-numbers", "Vendas do mês 9", "setembro")
+
+    results = search_memory("mem-numbers", "os 3 clientes mais velhos", k=2)
+    assert results[0]["answer"] == "três"
+    assert results[0]["score"] > results[1]["score"]
+
+    results = search_memory("mem-numbers", "vendas do mês 9", k=2)
+    assert results[0]["answer"] == "setembro"
+    assert results[1]["score"] < 1.0
+
+
+def test_search_single_letter_tokens():
+    save_memory("mem-letters", "média da coluna y", "y")
+    # num empate, a mais recente viria primeiro
+    save_memory("mem-letters", "média da coluna x", "x")
+    assert search_memory("mem-letters", "média da coluna y", k=1)[0]["answer"] == "y"
+
+
+def test_exact_duplicate():
+    save_memory("mem-exact", "Qual a tendência de valor?", "sobe")
+    hit = find_duplicate("mem-exact", "qual a tendência de valor")
+    assert hit["match"] == "exact" and hit["answer"] == "sobe"
+
+
+def test_similar_needs_the_same_numbers():
+    save_query("mem-dedup", "Quais são os 5 clientes mais velhos e por quê?", "cinco", "cinco", "llm")
+    # a similaridade sozinha passaria do limite
+    assert search_memory("mem-dedup", "Quais são os 3 clientes mais velhos e por quê?")[0]["score"] >= 0.5
+    assert find_duplicate("mem-dedup", "Quais são os 3 clientes mais velhos e por quê?", threshold=0.5) is None
+    hit = find_duplicate("mem-dedup", "quais os 5 clientes mais velhos e por quê", threshold=0.5)
+    assert hit["match"] == "similar" and hit["answer"] == "cinco"
+
+
+def test_similar_needs_the_same_columns():
+    save_dataset("mem-cols", pd.DataFrame({"idade": [1, 2], "salario": [3.0, 4.0], "cidade": ["a", "b"]}))
+    save_query("mem-cols", "como a idade varia entre as cidades?", "idade", "idade", "llm")
+    assert find_duplicate("mem-cols", "como o salario varia entre as cidades?", threshold=0.3) is None
+    hit = find_duplicate("mem-cols", "como a idade varia entre cidades?", threshold=0.3)
+    assert hit["answer"] == "idade"
+
+
+def test_query_endpoint_does_not_replay_other_numbers():
+    import agente_mvp
+
+    save_dataset("mem-api", pd.DataFrame({"cliente": ["a", "b", "c"], "idade": [30, 40, 50]}))
+    client = agente_mvp.app.test_client()
+    first = client.post(
+        "/api/query",
+        json={"dataset_id": "mem-api", "question": "Quais são os 5 clientes mais velhos e por quê?"},
+    ).get_json()
+    assert first["source"] == "llm"
+    second = client.post(
+        "/api/query",
+        json={"dataset_id": "mem-api", "question": "Quais são os 3 clientes mais velhos e por quê?"},
+    ).get_json()
+    assert second["source"] == "llm"
+    assert "3 clientes" in second["answer"]
@@ -0,0 +1,115 @@
+"""
+test_llm_cache.py
+
+Cache de respostas do LLM (llm_cache.py) com o backend stub, sem rede:
+acerto/erro, expiração, remoção por tamanho, versão do dataset e as
+entradas compartilhadas entre call() e stream().
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from call_gemini import generate_text, shorten_answer, stream_gemini
+from dataset_store import save_dataset
+from eda_agent import MIGRATIONS, create_tables
+from llm_cache import LLMCache, cache_key, dataset_version
+from persistence import Database
+
+
+@pytest.fixture
+def cache(tmp_path):
+    db = Database(str(tmp_path / "cache.db"))
+    create_tables(db)
+    db.migrate(MIGRATIONS)
+    return LLMCache(db, ttl_s=3600, max_bytes=1024 * 1024)
+
+
+class Counter:
+    """
+    generate_text contando as chamadas ao LLM.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        return generate_text(prompt)
+
+
+def test_hit_and_miss(cache):
+    llm = Counter()
+    first, cached = cache.call("qual a média de valor?", llm)
+    assert not cached and first.startswith("[Stub LLM]")
+    # prompt igual a menos de caixa e espaços: mesma entrada
+    again, cached = cache.call("  Qual a  média de valor? ", llm)
+    assert cached and again == first
+    other, cached = cache.call("qual o total de valor?", llm)
+    assert not cached
+    assert llm.calls == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_errors_are_not_cached(cache):
+    response, cached = cache.call("p", lambda prompt: "[Stub Fallback] Erro ao chamar LLM real: x")
+    assert not cached
+    assert cache.stats()["entries"] == 0 and cache.skipped == 1
+
+
+def test_ttl_expiry(cache):
+    llm = Counter()
+    cache.call("pergunta", llm)
+    cache.db.write("UPDATE llm_cache SET created_ts = created_ts - ?", (cache.ttl_s + 1,))
+    _, cached = cache.call("pergunta", llm)
+    assert not cached and llm.calls == 2
+    assert cache.expired == 1
+
+
+def test_size_eviction_drops_least_recently_used(cache):
+    cache.max_bytes = 250
+    for prompt in ("a", "b", "c"):
+        key = cache_key(prompt, "stub", "")
+        cache.put(key, "x" * 100, "stub")
+    assert cache.evictions == 1
+    keys = {row[0] for row in cache.db.query("SELECT key FROM llm_cache")}
+    assert cache_key("a", "stub", "") not in keys
+    assert {cache_key("b", "stub", ""), cache_key("c", "stub", "")} == keys
+
+
+def test_dataset_version_bump_invalidates(cache):
+    df = pd.DataFrame({"valor": [1, 2, 3]})
+    path = save_dataset("cache-test", df)
+    llm = Counter()
+    cache.call("média de valor", llm, dataset_id="cache-test")
+    _, cached = cache.call("média de valor", llm, dataset_id="cache-test")
+    assert cached
+    # dataset regravado: outro mtime, outra chave
+    old = dataset_version("cache-test")
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    assert dataset_version("cache-test") != old
+    _, cached = cache.call("média de valor", llm, dataset_id="cache-test")
+    assert not cached and llm.calls == 2
+
+
+def test_call_and_stream_share_the_full_text(cache):
+    # o stub repete o prompt: espaços e quebras de linha chegam à resposta
+    prompt = "resuma   os dados\n\n- valor\n- idade"
+    full, cached = cache.call(prompt, generate_text)
+    assert not cached and "\n\n" in full
+    chunks, cached = cache.stream(prompt, stream_gemini)
+    assert cached and "".join(chunks) == full
+    # o corte fica para quem responde /api/query
+    assert shorten_answer(full) != full
+
+
+def test_stream_then_call(cache):
+    prompt = "descreva   a coluna\nvalor"
+    chunks, cached = cache.stream(prompt, stream_gemini)
+    streamed = "".join(chunks)
+    assert not cached
+    full, cached = cache.call(prompt, generate_text)
+    assert cached and full == streamed
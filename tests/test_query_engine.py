@@ -0,0 +1,69 @@
+"""
+test_query_engine.py
+
+Perguntas que o query_engine responde localmente e as que devem seguir
+para o LLM (parse_question() retorna None).
+"""
+
+import pandas as pd
+import pytest
+
+from query_engine import frame_categories, parse_question
+
+DF = pd.DataFrame(
+    {
+        "cidade": ["Recife", "Rio", "Rio de Janeiro", "Sao Paulo"] * 5,
+        "valor": range(20),
+        "idade": range(20, 40),
+        "data": pd.date_range("2023-01-01", periods=20),
+    }
+)
+
+
+def parse(question):
+    return parse_question(question, DF.dtypes, frame_categories(DF))
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("média de valor por cidade", "média de valor por cidade"),
+        ("Qual a média da coluna valor?", "média de valor"),
+        ("Por favor, calcule a média de valor", "média de valor"),
+        ("quantos registros com idade > 30", "número de registros onde idade > 30"),
+        ("idade máxima em Rio", "máximo de idade onde cidade = Rio"),
+        ("idade máxima em Rio de Janeiro", "máximo de idade onde cidade = Rio de Janeiro"),
+        ("qual cidade tem a maior média de valor", "top 1 (maiores): média de valor por cidade"),
+    ],
+)
+def test_local_plans(question, expected):
+    plan = parse(question)
+    assert plan is not None
+    assert plan.describe() == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # números e palavras sem lugar no plano
+        "média de valor em 2023",
+        "média de valor por mês",
+        "média de valor em Rio Branco",
+        # colunas e agregações que o plano ignoraria
+        "média de valor e idade",
+        "média e mediana de valor",
+        "média de valor em Recife e Rio",
+        # pedidos de explicação
+        "Por que a média de valor é alta?",
+        "Explique a média de valor",
+        "Why is the average valor so high?",
+    ],
+)
+def test_goes_to_llm(question):
+    assert parse(question) is None
+
+
+def test_category_must_match_whole_value():
+    df = DF[DF["cidade"] != "Rio de Janeiro"]
+    plan = parse_question("idade máxima em Rio de Janeiro", df.dtypes, frame_categories(df))
+    assert plan is None